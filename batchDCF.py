@@ -0,0 +1,88 @@
+import argparse
+
+from src.batch import make_batch, read_ticker_file
+from src.cli import add_fetch_args, close_tracer, configure, fill_market_values, report_cache
+from src.fetch import outcomes
+from src.makeTemplate import get_risk_free_rate
+from src.output import FORMATS
+from src.stream import make_stream, peak_rss_mb
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('tickers', type=str, nargs='*', help='The stock tickers to create DCFs for')
+    parser.add_argument('--file', '-f', help='Read the tickers from a file with one ticker per line. A ticker may be followed by its own list of peers, e.g. "AAPL MSFT GOOG".', type=str)
+    parser.add_argument('--generate_peers', '-gp', help='Set this flag to automatically create a list of peers for every ticker.', action='store_true')
+    parser.add_argument('--peers', '-p', help='Set a list of peers to compare every ticker to, in addition to any peers given in the ticker file.', type=str, nargs='+')
+    parser.add_argument('--risk_free_rate', '-rfr', help='Set the risk-free rate for cost of capital calculations. Defaults to the current 10Y American Treasury yield, which is downloaded at most once an hour and shared by every run.', type=float)
+    parser.add_argument('--market_risk_premium', '-mrp', help='Set the market risk premium for cost of capital calculations as a decimal. Defaults to the most recent American average MRP as given by Statista ~0.055 (the "mrp" value of the market data, see --market_data).', type=float)
+    parser.add_argument('--terminal_growth', '-tg', help='Set the terminal growth rate in the DCF model as a decimal. Defaults to PricewaterhouseCoopers 50Y projected American GDP annual growth rate ~0.0181 (the "terminal_growth" value of the market data, see --market_data).', type=float)
+    parser.add_argument('--forecast_years', '-fy', help='Set how many years to make projections for in the DCF mode as a decimal. Defaults to 5 years.', type=int, default=5)
+    parser.add_argument('--min_tax_rate', '-tr', help='Set the minimum tax rate for a company as a decimal. Tax rate is typically calculated by the program, but the calculated value will not be used if it is below the minimum. Defaults to 0.2.', type=float, default=0.2)
+    parser.add_argument('--output_dir', '-o', help='Set the directory to save the DCFs in. Defaults to the current directory.', type=str, default='.')
+    parser.add_argument('--simulations', '-s', help='Set how many Monte Carlo paths of the DCF model to run. The distribution of the equity value per share is written to a "Simulation" sheet. Defaults to 0 (no simulation).', type=int, default=0)
+    parser.add_argument('--statement_backend', '-sb', help='Set how financial statements are retrieved. "http" reads the data embedded in the statement pages and only launches a browser if that fails, "selenium" always renders the pages in a browser. Defaults to "http".', type=str, choices=['http', 'selenium'], default='http')
+    parser.add_argument('--format', help='Set the format to save the DCFs in. "xlsx" makes a workbook of formulas, while "json", "csv" (one row per value) and "npz" (NumPy arrays of float64 columns) save the parsed statements, the peer table, the inputs of the DCF, its cost of capital and its computed values without making a workbook. Defaults to "xlsx".', type=str, choices=list(FORMATS), default='xlsx')
+    parser.add_argument('--constant_memory', help='Set this flag to write the workbook one row at a time instead of keeping every cell in memory until it is saved. The workbook is somewhat larger, since text is stored in each cell instead of once per workbook.', action='store_true')
+    parser.add_argument('--workers', '-w', help='Set how many peers are scraped at the same time. Defaults to 4.', type=int, default=4)
+    parser.add_argument('--peer_fan_out', help='Set the most peers that are generated from any one ticker when --generate_peers is set. Defaults to 10.', type=int, default=10)
+    parser.add_argument('--max_peers', help='Set the most peers that are generated in total when --generate_peers is set. Defaults to 30.', type=int, default=30)
+    add_fetch_args(parser)
+    parser.add_argument('--stream', help='Set this flag to make the DCFs as a stream: the pages of the next tickers are downloaded while the ones before them are parsed, valued and saved, and each ticker is dropped from memory as soon as it is saved, so memory stays flat however many tickers are made.', action='store_true')
+    parser.add_argument('--queue_size', help='Set how many tickers may wait between one stage of the stream and the next. Defaults to 2.', type=int, default=2)
+    parser.add_argument('--memory_budget', help='Set a number of MB of memory the run should stay under. Once the process uses more, the next ticker only starts when the ones in flight are saved. Implies --stream.', type=float)
+
+    args = parser.parse_args().__dict__
+
+    jobs = [(t, []) for t in args['tickers']]
+    if args['file'] is not None:
+        jobs += read_ticker_file(args['file'])
+    if not jobs:
+        raise ValueError('Please pass at least one ticker, either as an argument or using the --file flag (pass the -h flag for help).')
+    if args['peers'] is not None:
+        jobs = [(t, peers + [p for p in args['peers'] if p not in peers]) for t, peers in jobs]
+    if not args['generate_peers'] and any(not peers for _, peers in jobs):
+        raise ValueError('Every ticker needs peers. Either set the --generate_peers flag, pass a list of peers using the --peers flag or list peers in the ticker file (pass the -h flag for help).')
+
+    configure(args)
+
+    if args['risk_free_rate'] is None:
+        args['risk_free_rate'] = get_risk_free_rate()
+    fill_market_values(args)
+
+    stream = args['stream'] or args['memory_budget'] is not None
+    summary = (make_stream if stream else make_batch)(
+        jobs,
+        args['risk_free_rate'],
+        args['market_risk_premium'],
+        args['terminal_growth'],
+        args['forecast_years'],
+        args['min_tax_rate'],
+        0 if not args['generate_peers'] else 2,
+        args['output_dir'],
+        args['workers'],
+        simulations=args['simulations'],
+        statement_backend=args['statement_backend'],
+        peer_fan_out=args['peer_fan_out'],
+        max_peers=args['max_peers'],
+        snapshot=args['snapshot'],
+        constant_memory=args['constant_memory'],
+        output_format=args['format'],
+        **({'queue_size': args['queue_size'], 'memory_budget': args['memory_budget']} if stream else {})
+    )
+
+    print(f"Made {len(summary['done'])} of {len(jobs)} DCFs in {summary['seconds']:.1f}s ({summary['tickers_per_minute']:.1f} tickers/minute)")
+    for ticker, value in sorted(summary['values'].items(), key=lambda v: -v[1]):
+        print(f'  {ticker}: DCF equity value per share {value:,.2f}')
+    if summary['failed']:
+        print(f"Failed: {' '.join(summary['failed'])}")
+    print(f"Peer scrapes: {summary['peer_fetches']} made, {summary['peer_fetches_avoided']} avoided by sharing between tickers")
+    print(f"Peak memory: {peak_rss_mb():.0f} MB" + (f" ({summary['start_rss_mb']:.0f} MB at the start, {summary['end_rss_mb']:.0f} MB at the end, "
+                                                     f"{summary['throttled_seconds']:.1f}s held back by the memory budget)" if stream else ''))
+    report_cache()
+    if outcomes.stats():
+        print('Pages downloaded from each site:')
+        print(outcomes.format_stats())
+
+    close_tracer(args)
@@ -0,0 +1,110 @@
+import argparse
+import datetime as dt
+import os
+import tempfile
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+import src.fetch
+from benchmarks.fixtures import serve, write_fixtures
+from src.bonds import BUCKETS, BondIndex, bucket_spreads, set_bond_index
+from src.makeTemplate import get_peer_data
+from src.ratelimit import HostRateLimiter
+from src.store import set_store
+from src.trace import Tracer, set_tracer
+
+# measures the bond index (see src.bonds): scraping peers whose bonds are not indexed yet, then again once they are,
+# against fixture pages served from a local http server. checks the indexed spreads are the ones the bond pages give,
+# and compares computing every maturity bucket of many issuers in one pass with filtering each issuer's table once
+# per bucket, as get_peer_data did. run from the repository root with "python -m benchmarks.bonds"
+
+
+# the spreads of one bond table, filtered once for each bucket like get_peer_data did for the 10Y and 30Y buckets
+def filtered_spreads(debt_frame, buckets=BUCKETS):
+    return {tenor: debt_frame.loc[(debt_frame['Length'] >= dt.timedelta(days=low * 365)) & (debt_frame['Length'] <= dt.timedelta(days=high * 365))]['Spread'].mean() / 100
+            for tenor, (low, high) in buckets.items()}
+
+
+# "issuers" random bond tables of up to "bonds" bonds each, as one frame with the issuer of every bond
+def random_bonds(issuers, bonds, seed=0):
+    rng = np.random.default_rng(seed)
+    counts = rng.integers(0, bonds + 1, issuers)
+    n = counts.sum()
+    issued = pd.Timestamp(1990, 1, 1) + pd.to_timedelta(rng.integers(0, 12000, n), unit='D')
+    coupon = rng.uniform(1, 8, n)
+    return pd.DataFrame({'Issuer': np.repeat(np.arange(issuers), counts), 'Coupon': coupon, 'Ref Coupon': coupon - rng.uniform(0, 3, n),
+                         'Issue Date': issued, 'Maturity': issued + pd.to_timedelta(rng.choice([2, 5, 7, 10, 20, 30], n) * 365, unit='D')})
+
+
+def same(a, b):
+    return a == b or isinstance(a, float) and isinstance(b, float) and np.isnan(a) and np.isnan(b)
+
+
+def scrape(tickers):
+    tracer = Tracer()
+    set_tracer(tracer)
+    start = time.perf_counter()
+    try:
+        data = [get_peer_data(t) for t in tickers]
+    finally:
+        set_tracer(None)
+    return time.perf_counter() - start, sum(s.name == 'fetch' and s.attrs['page_type'] == 'bonds' for s in tracer.spans), data
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--peers', '-p', type=int, default=30)
+    parser.add_argument('--latency', '-l', type=float, default=0.02, help='Seconds added to every response of the local server')
+    parser.add_argument('--issuers', '-i', type=int, default=2000)
+    parser.add_argument('--bonds', '-b', type=int, default=20, help='The most bonds of a random issuer')
+    args = parser.parse_args()
+
+    # the scrapers use arguments newer versions of beautifulsoup warn about on every call
+    warnings.simplefilter('ignore', DeprecationWarning)
+
+    tickers = [f'T{i:03d}' for i in range(args.peers)]
+    write_fixtures(tickers)
+    src.fetch.set_cache(None)
+    set_store(None)
+    src.fetch.limiter = HostRateLimiter(default_rate=(1e9, 10 ** 9))
+
+    with serve(latency=args.latency), tempfile.TemporaryDirectory() as directory:
+        index = BondIndex(os.path.join(directory, 'bonds.sqlite'))
+        set_bond_index(index)
+        get_peer_data(tickers[0])
+        index.invalidate(tickers[0])
+
+        cold, cold_fetches, scraped = scrape(tickers)
+        warm, warm_fetches, indexed = scrape(tickers)
+        assert cold_fetches == len(tickers) and warm_fetches == 0, (cold_fetches, warm_fetches)
+        for a, b in zip(scraped, indexed):
+            assert all(same(a.get(k), b.get(k)) for k in ['Bond Spread (10Y)', 'Bond Spread (30Y)', 'Bond Rating (S&P)']), (a, b)
+
+        # the spreads of every peer in every bucket, in one lookup
+        start = time.perf_counter()
+        table = index.spreads(tickers)
+        lookup = time.perf_counter() - start
+        for t, data in zip(tickers, scraped):
+            for tenor in ['10Y', '30Y']:
+                assert np.allclose(table.loc[t, tenor], data.get(f'Bond Spread ({tenor})', np.nan), equal_nan=True, rtol=0, atol=1e-15)
+        set_bond_index(None)
+
+    print(f'{args.peers} peers with {args.latency * 1000:.0f} ms a request: {cold:.2f}s reading bond pages, {warm:.2f}s from the index, '
+          f'{lookup * 1000:.1f} ms to look up every bucket of every peer')
+
+    bonds = random_bonds(args.issuers, args.bonds)
+    bonds['Spread'] = bonds['Coupon'] - bonds['Ref Coupon']
+    bonds['Length'] = bonds['Maturity'] - bonds['Issue Date']
+    start = time.perf_counter()
+    filtered = [filtered_spreads(table) for _, table in bonds.groupby('Issuer')]
+    before = time.perf_counter() - start
+    start = time.perf_counter()
+    one_pass = bucket_spreads(bonds['Length'] / pd.Timedelta(days=1), bonds['Spread'], BUCKETS, bonds['Issuer'], args.issuers) / 100
+    after = time.perf_counter() - start
+    issuers = sorted(bonds['Issuer'].unique())
+    assert np.allclose(np.array([list(f.values()) for f in filtered]), one_pass[issuers], equal_nan=True, rtol=1e-12)
+    print(f'{len(BUCKETS)} buckets of {args.issuers} issuers ({len(bonds)} bonds): filtered per issuer {before * 1000:.0f} ms, '
+          f'one pass {after * 1000:.1f} ms ({before / after:.0f}x faster)')
@@ -0,0 +1,135 @@
+import argparse
+import collections
+import contextlib
+import io
+import os
+import tempfile
+import time
+import warnings
+
+import src.fetch
+from benchmarks.fixtures import serve, write_fixtures
+from src.bonds import set_bond_index
+from src.fetch import PAGES, TickerBundle, page_url, set_policy
+from src.makeTemplate import LazyChrome, get_dcf_inputs, get_peer_data, get_summary, make_financials, make_peers, make_template
+from src.ratelimit import HostRateLimiter
+from src.resilience import HostCircuitBreaker, RetryPolicy
+from src.store import set_store
+from src.trace import Tracer, set_tracer
+
+# compares scraping everything about the main ticker one page after another, as each part of a template gets to it,
+# with fetching its pages together up front in a TickerBundle (see src.fetch), against fixture pages served from a
+# local http server with some latency. checks both read the same values and that a template requests each of the
+# main ticker's pages once, and that a page which failed in the bundle is downloaded again when its row is retried. run from the repository root with "python -m benchmarks.bundle"
+
+RFR, MRP, TERMINAL_GROWTH, FORECAST_YEARS, MIN_TAX_RATE = 0.04, 0.055, 0.018050372, 5, 0.2
+
+
+# the statements, peer data, summary and DCF inputs of "ticker", read the way "make_template" reads them
+def scrape(ticker):
+    driver = LazyChrome()
+    try:
+        dfs, tax_rate = make_financials(ticker, None, driver, MIN_TAX_RATE)
+        return dfs, tax_rate, get_peer_data(ticker), get_summary(ticker), get_dcf_inputs(dfs, ticker)
+    finally:
+        driver.close()
+
+
+def scrape_bundled(ticker, workers):
+    bundle = TickerBundle(ticker, workers=workers).start()
+    try:
+        return scrape(ticker)
+    finally:
+        bundle.close()
+
+
+# runs "func", returning how long it took, the urls it downloaded and its result
+def traced_run(func, *args, **kwargs):
+    tracer = Tracer()
+    set_tracer(tracer)
+    start = time.perf_counter()
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        set_tracer(None)
+    return time.perf_counter() - start, [s.attrs['url'] for s in tracer.spans if s.name == 'fetch'], result
+
+
+# the main ticker's key statistics fail in the bundle, and are downloaded again (rather than read from the bundle and
+# failing again) when its row is retried, so the row isn't left blank
+def check_failed_page(ticker, peers, workers):
+    driver = LazyChrome()
+    dfs, tax_rate = make_financials(ticker, None, driver, MIN_TAX_RATE)
+    expected, _ = make_peers(ticker, list(peers), tax_rate, dfs, None)
+    set_policy(RetryPolicy(timeout=(1., 0.5), retries=1, backoff=0.01, max_backoff=0.05))
+    src.fetch.breakers = HostCircuitBreaker(threshold=100)
+    try:
+        with serve(faults={f'/{ticker}/key-statistics': [503] * 2}):
+            bundle = TickerBundle(ticker, ['key-statistics'], workers).start()
+            out = io.StringIO()
+            try:
+                with contextlib.redirect_stdout(out):
+                    table, _ = make_peers(ticker, list(peers), tax_rate, dfs, None)
+            finally:
+                bundle.close()
+    finally:
+        set_policy(RetryPolicy())
+        src.fetch.breakers = HostCircuitBreaker()
+        driver.close()
+    assert table.frame().equals(expected.frame()) and not out.getvalue(), out.getvalue()
+
+
+def same(a, b):
+    if isinstance(a, dict):
+        return a.keys() == b.keys() and all(same(a[k], b[k]) for k in a)
+    if hasattr(a, 'equals'):
+        return a.equals(b)
+    return a == b or a != a and b != b
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', '-w', type=int, default=4)
+    parser.add_argument('--latency', '-l', type=float, default=0.05, help='Seconds added to every response of the local server')
+    parser.add_argument('--runs', '-n', type=int, default=3)
+    args = parser.parse_args()
+
+    # the scrapers use arguments newer versions of beautifulsoup warn about on every call
+    warnings.simplefilter('ignore', DeprecationWarning)
+
+    tickers = [f'T{i:03d}' for i in range(3 + args.runs * 2)]
+    write_fixtures(tickers)
+
+    # every page is downloaded, so the requests can be counted
+    src.fetch.set_cache(None)
+    set_store(None)
+    set_bond_index(None)
+    src.fetch.limiter = HostRateLimiter(default_rate=(1e9, 10 ** 9))
+
+    with serve(latency=args.latency), tempfile.TemporaryDirectory() as directory:
+        # the first run imports the heavy dependencies (see src.lazy), which shouldn't count against either
+        scrape(tickers[0])
+
+        one_by_one, bundled = [], []
+        for i in range(args.runs):
+            a, b = tickers[3 + 2 * i: 5 + 2 * i]
+            seconds, urls, expected = traced_run(scrape, a)
+            one_by_one.append(seconds)
+            assert len(urls) == len(PAGES), urls
+            seconds, urls, result = traced_run(scrape_bundled, a, args.workers)
+            bundled.append(seconds)
+            assert len(urls) == len(set(urls)) == len(PAGES), urls
+            assert all(same(x, y) for x, y in zip(expected, result))
+
+        # a template requests each of the main ticker's pages once, all of them at the start
+        _, urls, _ = traced_run(make_template, tickers[0], tickers[1:3], RFR, MRP, TERMINAL_GROWTH, FORECAST_YEARS, MIN_TAX_RATE,
+                                outfile=os.path.join(directory, f'{tickers[0]}.json'), workers=args.workers, keep_inputs=False,
+                                output_format='json')
+        main = collections.Counter(u for u in urls if u in {page_url(tickers[0], p) for p in PAGES})
+        assert len(main) == len(PAGES) and set(main.values()) == {1}, main
+        check_failed_page(tickers[0], tickers[1:3], args.workers)
+
+    one_by_one, bundled = min(one_by_one), min(bundled)
+    print(f'{len(PAGES)} pages of one ticker at {args.latency * 1000:.0f} ms a request')
+    print(f'one after another   {one_by_one * 1000:>8.0f} ms')
+    print(f'bundled             {bundled * 1000:>8.0f} ms   ({one_by_one / bundled:.1f}x faster)')
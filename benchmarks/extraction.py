@@ -0,0 +1,141 @@
+import argparse
+import time
+import tracemalloc
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.fixtures import write_fixtures
+from src.makeTemplate import read_bonds, read_key_statistics, read_profile
+from src.parsing import parse_table, parse_value
+
+# compares reading the key statistics, bond and profile pages by searching a BeautifulSoup tree once for every label
+# (as get_peer_data and get_summary did) with the lxml label maps of src.extract, on saved fixture pages. checks both
+# read the same values, then measures the time and the peak memory allocated by python to read each page. run from the
+# repository root with "python -m benchmarks.extraction"
+
+
+def _soup(page):
+    import bs4
+    return bs4.BeautifulSoup(page, features='lxml')
+
+
+# the previous readers, a "soup.find(text=...)" walk of the whole document for every value
+def soup_key_statistics(page, data):
+    soup = _soup(page)
+    try:
+        data['Peer'] = soup.find('h1').text
+        data['Share Price'] = parse_value(soup.find('fin-streamer', {'data-test': 'qsp-price'}).text)
+        data['Equity Beta'] = parse_value(soup.find(text='Beta (5Y Monthly)').parent.parent.next_sibling.text)
+        if data['Equity Beta'] == 'N/A':
+            data['Equity Beta'] = 0.
+        data['Shares Outstanding'] = parse_value(soup.find(text='Shares Outstanding').parent.parent.next_sibling.text) / 1000
+        data['Profit Margin'] = parse_value(soup.find(text='Profit Margin').parent.parent.next_sibling.text)
+        data['Operating Margin'] = parse_value(soup.find(text='Operating Margin').parent.parent.next_sibling.text)
+        data['Return on Assets'] = parse_value(soup.find(text='Return on Assets').parent.parent.next_sibling.text)
+        data['Return on Equity'] = parse_value(soup.find(text='Return on Equity').parent.parent.next_sibling.text)
+        data['Revenue Growth (1Y)'] = parse_value(soup.find(text='Quarterly Revenue Growth').parent.parent.next_sibling.text)
+        data['Earnings Growth (1Y)'] = parse_value(soup.find(text='Quarterly Earnings Growth').parent.parent.next_sibling.text)
+        data['LTM Sales'] = parse_value(soup.find(text='Revenue').parent.parent.next_sibling.text) / 1000
+        try:
+            data['LTM EBITDA'] = parse_value(soup.find(text='EBITDA').parent.parent.next_sibling.text) / 1000
+        except (TypeError, AttributeError):
+            data['LTM EBITDA'] = None
+        data['LTM Earnings'] = parse_value(soup.find(text='Net Income Avi to Common').parent.parent.next_sibling.text) / 1000
+        data['Cash and Equivalents'] = parse_value(soup.find(text='Total Cash').parent.parent.next_sibling.text) / 1000
+        data['Total Debt'] = parse_value(soup.find(text='Total Debt').parent.parent.next_sibling.text) / 1000
+    except (TypeError, AttributeError):
+        pass
+    return data
+
+
+def soup_bonds(page):
+    soup = _soup(page)
+    debt_frame = rating = None
+    try:
+        headings = [header.text.strip() for header in soup.find(text='Issue Date').parent.parent.children]
+        rows = [[datum.text.strip() for _, datum in zip(headings, row.children)]
+                for row in soup.find(text='Issue Date').parent.parent.next_siblings]
+        debt_frame = parse_table(headings, rows).set_index('')
+        debt_frame['Spread'] = debt_frame['Coupon'] - debt_frame['Ref Coupon']
+        debt_frame['Length'] = debt_frame['Maturity'] - debt_frame['Issue Date']
+    except AttributeError:
+        pass
+    try:
+        rating = soup.find(text='Average S&P Rating').parent.next_sibling.text
+    except AttributeError:
+        pass
+    return debt_frame, rating
+
+
+def soup_profile(page, df):
+    soup = _soup(page)
+    try:
+        df.loc['Peer'] = soup.find('h1').text
+        df.loc['Summary'] = soup.find(text='Description').parent.parent.next_sibling.text
+        df.loc['Employees'] = soup.find(text='Full Time Employees').parent.next_sibling.next_sibling.next_sibling.next_sibling.text
+        df.loc['Sector'] = soup.find(text='Sector(s)').parent.next_sibling.next_sibling.next_sibling.next_sibling.text
+        df.loc['Industry'] = soup.find(text='Industry').parent.next_sibling.next_sibling.next_sibling.next_sibling.text
+    except (TypeError, AttributeError):
+        pass
+    return df
+
+
+def summary_frame():
+    return pd.DataFrame({'Data': [''] * 6}, index=['Peer', 'Sector', 'Industry', 'Employees', 'Summary', 'Link'])
+
+
+READERS = {
+    'key-statistics': (lambda p: soup_key_statistics(p, {}), lambda p: read_key_statistics(p, {})),
+    'bonds': (soup_bonds, read_bonds),
+    'profile': (lambda p: soup_profile(p, summary_frame()), lambda p: read_profile(p, summary_frame())),
+}
+
+
+def same(a, b):
+    if isinstance(a, tuple):
+        return all(same(x, y) for x, y in zip(a, b))
+    if isinstance(a, pd.DataFrame) or isinstance(b, pd.DataFrame):
+        return a is not None and b is not None and a.equals(b[a.columns])
+    if isinstance(a, dict):
+        return a.keys() == b.keys() and all(same(v, b[k]) for k, v in a.items())
+    return a == b or (isinstance(a, float) and np.isnan(a) and np.isnan(b))
+
+
+def measure(reader, pages):
+    start = time.perf_counter()
+    for page in pages:
+        reader(page)
+    seconds = (time.perf_counter() - start) / len(pages)
+    tracemalloc.start()
+    reader(pages[0])
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tickers', '-t', type=int, default=50)
+    args = parser.parse_args()
+
+    # the previous readers use an argument newer versions of beautifulsoup warn about on every call
+    warnings.simplefilter('ignore', DeprecationWarning)
+
+    paths = write_fixtures([f'T{i:03d}' for i in range(args.tickers)])
+    print(f'{"page":<16}{"soup ms":>10}{"lxml ms":>10}{"speedup":>9}{"soup KiB":>11}{"lxml KiB":>11}')
+    for page_type, (old, new) in READERS.items():
+        pages = []
+        for (_, page), path in paths.items():
+            if page == page_type:
+                with open(path) as f:
+                    pages.append(f.read())
+        for page in pages:
+            assert same(old(page), new(page)), (page_type, old(page), new(page))
+        # warm up the lazy imports and the compiled XPaths
+        old(pages[0]), new(pages[0])
+        (old_seconds, old_peak), (new_seconds, new_peak) = measure(old, pages), measure(new, pages)
+        print(f'{page_type:<16}{old_seconds * 1000:>10.2f}{new_seconds * 1000:>10.2f}{old_seconds / new_seconds:>8.1f}x'
+              f'{old_peak / 1024:>11.0f}{new_peak / 1024:>11.0f}')
+    print('(the memory is what python allocates; the tree lxml builds is kept by libxml2, outside of it)')
@@ -0,0 +1,215 @@
+import argparse
+import contextlib
+import io
+import tempfile
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+import src.fetch
+from benchmarks.fixtures import serve, write_fixtures
+from src.bonds import set_bond_index
+from src.cache import ResponseCache
+from src.fetch import fetch, outcomes, page_url, set_cache, set_policy
+from src.makeTemplate import LazyChrome, get_peer_data, make_financials, make_peers
+from src.ratelimit import HostRateLimiter
+from src.resilience import CircuitOpen, FetchError, HostCircuitBreaker, RetryPolicy
+from src.store import set_store
+from src.trace import Tracer, set_tracer
+
+# checks how the fetcher (see src.fetch.download) copes with a misbehaving server: 429 and 5xx responses and stalled
+# requests are retried, a page that keeps failing raises a FetchError instead of being read as an empty page, a host
+# that keeps failing has its circuit opened and then closed again once it recovers, and peers whose pages failed are
+# scraped again instead of being left blank. then measures how much of the time lost to a few stalled responses is won
+# back by timing them out and by hedging them, against fixture pages served from a local http server. run from the
+# repository root with "python -m benchmarks.fetch"
+
+# retries without waiting long, so the checks run quickly
+FAST = dict(timeout=(1., 0.5), retries=3, backoff=0.01, max_backoff=0.05)
+
+
+# fetches a page, returning it along with the span of the request
+def traced_fetch(url, page_type):
+    tracer = Tracer()
+    set_tracer(tracer)
+    try:
+        html = fetch(url, page_type)
+    finally:
+        set_tracer(None)
+    return html, [s for s in tracer.spans if s.name == 'fetch'][-1]
+
+
+def check_retries(ticker, directory):
+    set_policy(RetryPolicy(**FAST))
+    src.fetch.breakers = HostCircuitBreaker(threshold=100)
+    faults = {f'/{ticker}/key-statistics': [503, 429, 502], f'/{ticker}/profile': [2.], f'/{ticker}/analysis': [500] * 4}
+
+    with serve(faults=faults):
+        key_statistics, profile = page_url(ticker, 'key-statistics'), page_url(ticker, 'profile')
+        cache = ResponseCache(directory)
+        set_cache(cache)
+        try:
+            # overloaded and broken responses are retried until the page arrives
+            html, s = traced_fetch(key_statistics, 'key-statistics')
+            assert 'Beta (5Y Monthly)' in html and s.attrs['attempts'] == 4 and s.attrs['status'] == 200, s.attrs
+
+            # a stalled response is given up on after the read timeout and sent again
+            start = time.perf_counter()
+            html, s = traced_fetch(profile, 'profile')
+            assert 'Full Time Employees' in html and s.attrs['attempts'] == 2, s.attrs
+            assert time.perf_counter() - start < 1.5
+
+            # a page that keeps failing raises instead of being read as an empty page, and isn't cached
+            try:
+                fetch(page_url(ticker, 'analysis'), 'analysis')
+                raise AssertionError('the failing page was returned')
+            except FetchError as e:
+                assert e.attempts == FAST['retries'] + 1 and e.reason == 'HTTP 500', e
+            assert cache.get(page_url(ticker, 'analysis'), 'analysis') is None
+
+            # a page that doesn't exist is returned as it is, like before, but isn't cached either
+            html, s = traced_fetch(page_url('NOPE', 'profile'), 'profile')
+            assert s.attrs['status'] == 404 and s.attrs['attempts'] == 1 and s.error is None, s.attrs
+            assert cache.get(page_url('NOPE', 'profile'), 'profile') is None
+            assert cache.get(key_statistics, 'key-statistics') is not None and cache.get(profile, 'profile') is not None
+        finally:
+            set_cache(None)
+
+    stats, = outcomes.stats().values()
+    assert (stats['ok'], stats['error'], stats['failed'], stats['retries']) == (2, 1, 1, 3 + 1 + 3), stats
+
+
+def check_circuit(ticker):
+    set_policy(RetryPolicy(**dict(FAST, retries=1)))
+    src.fetch.breakers = HostCircuitBreaker(threshold=2, reset_after=0.3)
+    with serve(faults={f'/{ticker}/': [503] * 4 + ['truncated']}):
+        url = page_url(ticker, 'key-statistics')
+        breaker = src.fetch.breakers(url)
+        # a page counts as one failure, however many requests it took
+        with contextlib.suppress(FetchError):
+            fetch(url, 'key-statistics')
+        assert breaker.state == 'closed' and breaker.failures == 1, (breaker.state, breaker.failures)
+        with contextlib.suppress(FetchError):
+            fetch(url, 'key-statistics')
+        assert breaker.state == 'open', breaker.state
+
+        # while it is open, requests are refused without being sent
+        start = time.perf_counter()
+        try:
+            fetch(page_url(ticker, 'profile'), 'profile')
+            raise AssertionError('the request was sent while the circuit was open')
+        except CircuitOpen as e:
+            assert e.attempts == 0
+        assert time.perf_counter() - start < 0.05
+
+        # once it has been open for a while, one page is let through, and the circuit closes when it arrives, even if
+        # its first request was cut off
+        time.sleep(0.3)
+        assert breaker.state == 'half-open'
+        assert 'Full Time Employees' in fetch(page_url(ticker, 'profile'), 'profile')
+        assert breaker.state == 'closed'
+
+
+# request errors other than timeouts and lost connections are FetchErrors too, so a bad page fails its own row
+# instead of the whole scrape, and the circuit still hears about them
+def check_request_errors(ticker):
+    set_policy(RetryPolicy(**FAST))
+    src.fetch.breakers = HostCircuitBreaker(threshold=100)
+    with serve(faults={f'/{ticker}/profile': ['truncated'] * (FAST['retries'] + 1)}):
+        url = page_url(ticker, 'profile')
+        try:
+            fetch(url, 'profile')
+            raise AssertionError('the truncated page was returned')
+        except FetchError as e:
+            assert e.reason == 'ChunkedEncodingError' and e.attempts == FAST['retries'] + 1, e
+        # a url that can't be requested isn't asked for again
+        try:
+            fetch('http://', 'profile')
+            raise AssertionError('the invalid url was returned')
+        except FetchError as e:
+            assert e.attempts == 1, e
+        assert src.fetch.breakers(url).failures == 1
+
+
+def check_failed_rows(ticker, peers):
+    set_policy(RetryPolicy(**FAST))
+    src.fetch.breakers = HostCircuitBreaker(threshold=100)
+    with serve():
+        driver = LazyChrome()
+        dfs, tax_rate = make_financials(ticker, None, driver, 0.2)
+        expected = make_peers(ticker, list(peers), tax_rate, dfs, None)
+
+    # the first peer fails every request of the first pass and recovers by the second, while the second peer never does
+    faults = {f'/{peers[0]}/key-statistics': [503] * (FAST['retries'] + 1), f'/{peers[1]}/profile': [503] * 100}
+    with serve(faults=faults):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            table, summary_dfs = make_peers(ticker, list(peers), tax_rate, dfs, None)
+        driver.close()
+
+    assert table.frame().equals(expected[0].frame())
+    assert all(a.equals(b) for i, (a, b) in enumerate(zip(summary_dfs, expected[1])) if i != 2)
+    # the summary that could not be scraped is left blank, but not silently
+    assert summary_dfs[2].loc['Sector', 'Data'] == '' and summary_dfs[2].loc['Link', 'Data'].endswith(peers[1])
+    assert f'summary of {peers[1]}' in out.getvalue() and peers[0] not in out.getvalue(), out.getvalue()
+
+
+# scrapes the peers on "workers" threads while the pages in "stalled" take "stall" seconds to be answered, returning
+# how long it took and what was scraped
+def scrape(tickers, stalled, stall, workers, latency):
+    outcomes.clear()
+    src.fetch.breakers = HostCircuitBreaker()
+    with serve(latency=latency, faults={page: [stall] for page in stalled}), ThreadPoolExecutor(max_workers=workers) as executor:
+        start = time.perf_counter()
+        data = list(executor.map(get_peer_data, tickers))
+        seconds = time.perf_counter() - start
+    stats, = outcomes.stats().values()
+    return seconds, stats, data
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--peers', '-p', type=int, default=40)
+    parser.add_argument('--stall', type=float, default=2., help='Seconds a stalled response takes')
+    parser.add_argument('--stalled', type=float, default=0.05, help='The share of responses that stall')
+    parser.add_argument('--latency', '-l', type=float, default=0.02, help='Seconds added to every response of the local server')
+    parser.add_argument('--workers', '-w', type=int, default=4)
+    args = parser.parse_args()
+
+    # the scrapers use arguments newer versions of beautifulsoup warn about on every call
+    warnings.simplefilter('ignore', DeprecationWarning)
+
+    tickers = [f'T{i:03d}' for i in range(args.peers)]
+    write_fixtures(tickers)
+    set_cache(None)
+    set_store(None)
+    set_bond_index(None)
+    src.fetch.limiter = HostRateLimiter(default_rate=(1e9, 10 ** 9))
+
+    with tempfile.TemporaryDirectory() as directory:
+        check_retries(tickers[0], directory)
+    check_circuit(tickers[1])
+    check_request_errors(tickers[1])
+    check_failed_rows(tickers[2], tickers[3:8])
+    print('retries, timeouts, circuit breaking and retrying failed rows: ok')
+
+    # every n-th page stalls
+    pages = [p for t in tickers for p in [f'/{t}/key-statistics', f'/bond/{t}']]
+    stalled = pages[::max(1, round(1 / args.stalled))]
+    policies = {
+        'no timeout (before)': RetryPolicy(timeout=None, retries=0),
+        'timeout 0.25s': RetryPolicy(timeout=(1., 0.25), backoff=0.01),
+        'hedge after 0.1s': RetryPolicy(timeout=(1., 0.25), backoff=0.01, hedge_after=0.1),
+    }
+    print(f'{args.peers} peers ({len(pages)} pages, {len(stalled)} stalled for {args.stall:.1f}s) on {args.workers} threads '
+          f'at {args.latency * 1000:.0f} ms a request')
+    print(f'{"":<22}{"total s":>9}{"p50 ms":>9}{"p99 ms":>9}{"max ms":>9}{"retries":>9}{"hedged":>8}')
+    expected = None
+    for name, policy in policies.items():
+        set_policy(policy)
+        seconds, stats, data = scrape(tickers, stalled, args.stall, args.workers, args.latency)
+        expected = expected or str(data)
+        assert str(data) == expected
+        assert stats['failed'] == 0, stats
+        print(f"{name:<22}{seconds:>9.2f}{stats['p50_s'] * 1000:>9.0f}{stats['p99_s'] * 1000:>9.0f}{stats['max_s'] * 1000:>9.0f}"
+              f"{stats['retries']:>9}{stats['hedged']:>8}")
@@ -0,0 +1,317 @@
+import contextlib
+import datetime as dt
+import http.server
+import json
+import os
+import threading
+import zlib
+from urllib.parse import unquote, urlparse
+
+import numpy as np
+
+# builds fixture pages laid out like the yahoo finance and macroaxis pages the scrapers read, so the scrapers can be
+# benchmarked without a network, and serves them from a local http server. the numbers are random but deterministic
+# for every ticker
+
+DIRECTORY = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+# the line items of every statement, in the order yahoo shows them
+STATEMENTS = {
+    'financials': ['TotalRevenue', 'CostOfRevenue', 'GrossProfit', 'OperatingExpense', 'OperatingIncome', 'PretaxIncome',
+                   'TaxProvision', 'NetIncomeCommonStockholders', 'DilutedEPS', 'DilutedAverageShares', 'TotalExpenses',
+                   'NormalizedIncome', 'InterestIncome', 'InterestExpense', 'NetInterestIncome', 'EBIT', 'EBITDA',
+                   'ReconciledDepreciation', 'NormalizedEBITDA', 'TaxRateForCalcs'],
+    'balance-sheet': ['TotalAssets', 'CurrentAssets', 'CashAndCashEquivalents', 'Receivables', 'Inventory', 'TotalNonCurrentAssets',
+                      'NetPPE', 'Goodwill', 'TotalLiabilitiesNetMinorityInterest', 'CurrentLiabilities', 'AccountsPayable',
+                      'CurrentDebt', 'LongTermDebt', 'TotalEquityGrossMinorityInterest', 'RetainedEarnings', 'CommonStockEquity',
+                      'TangibleBookValue', 'TotalDebt', 'NetDebt'],
+    'cash-flow': ['OperatingCashFlow', 'ChangeInWorkingCapital', 'ChangeInOtherWorkingCapital', 'InvestingCashFlow',
+                  'CapitalExpenditure', 'PurchaseOfBusiness', 'FinancingCashFlow', 'RepaymentOfDebt', 'EndCashPosition',
+                  'FreeCashFlow'],
+}
+
+YEARS = 4
+
+
+def _rng(ticker, salt=''):
+    return np.random.default_rng(zlib.crc32(f'{ticker}{salt}'.encode()))
+
+
+def fiscal_year_ends():
+    year = dt.date.today().year
+    return [dt.date(year - 1 - i, 9, 30) for i in range(YEARS)]
+
+
+# random statement values in dollars for every line item, as {name: [ttm, most recent year, ..., oldest year]}.
+# the balance sheet has no ttm column, and a few values are missing like they often are on yahoo
+def statement_values(ticker, statement):
+    rng = _rng(ticker, statement)
+    revenue = rng.lognormal(23, 1.5)
+    growth = np.cumprod(np.r_[1, 1 / (1 + rng.normal(0.06, 0.05, YEARS))])
+    periods = YEARS + (statement != 'balance-sheet')
+    values = {}
+    for name in STATEMENTS[statement]:
+        if name == 'TaxRateForCalcs':
+            row = rng.uniform(0.1, 0.25, periods)
+        elif name == 'DilutedEPS':
+            row = rng.uniform(0.5, 10, periods)
+        elif name == 'TotalRevenue':
+            row = revenue * growth[:periods]
+        elif name in ('CapitalExpenditure', 'ChangeInWorkingCapital', 'InterestExpense'):
+            row = -revenue * rng.uniform(0.01, 0.08) * growth[:periods]
+        else:
+            row = revenue * rng.uniform(0.02, 0.6) * growth[:periods]
+        row = list(np.round(row, 2 if name in ('TaxRateForCalcs', 'DilutedEPS') else -3))
+        if name not in ('TotalRevenue', 'NetIncomeCommonStockholders', 'TaxRateForCalcs') and rng.random() < 0.1:
+            row[rng.integers(periods)] = None
+        values[name] = row
+    return values
+
+
+def _periods(statement):
+    return (['ttm'] if statement != 'balance-sheet' else []) + [d.strftime('%-m/%-d/%Y') for d in fiscal_year_ends()]
+
+
+def _shown(name, value):
+    if value is None:
+        return '-'
+    if name in ('TaxRateForCalcs', 'DilutedEPS'):
+        return f'{value:,.2f}'
+    return f'{value / 1000:,.0f}'
+
+
+# the statement page as it looks after being rendered by a browser and having every row expanded
+def rendered_statement_page(ticker, statement):
+    from src.statements import to_label
+
+    values = statement_values(ticker, statement)
+    header = ''.join(f'<div class="Ta(c) Py(6px) Bxz(bb) BdB Bdc($seperatorColor) Miw(120px) Miw(140px)--pnclg D(tbc)"><span>{p}</span></div>'
+                     for p in _periods(statement))
+    rows = ''.join(
+        f'<div data-test="fin-row"><div class="D(tbr) fi-row Bgc($hoverBgColor):h"><div class="D(tbc) Ta(start) Pend(15px)--mv2 Pend(10px)"'
+        f' title="{to_label(name)}"><span class="Va(m)">{to_label(name)}</span></div>'
+        + ''.join(f'<div class="Ta(c) Py(6px) Bxz(bb) BdB Bdc($seperatorColor) Miw(120px) Miw(140px)--pnclg D(tbc)" data-test="fin-col">'
+                  f'<span>{_shown(name, v)}</span></div>' for v in row)
+        + '</div></div>'
+        for name, row in values.items()
+    )
+    return (f'<html><head><title>{ticker} Financials</title></head><body><div id="Main">'
+            f'<button class="expandPf"><span>Expand All</span></button>'
+            f'<section data-test="qsp-financial"><div class="D(tbhg)"><div class="D(tbr)"><div class="D(ib) Fw(b) Ta(start)"><span>Breakdown</span></div>'
+            f'{header}</div></div><div class="D(tbrg)">{rows}</div></section></div></body></html>')
+
+
+# the statement page as it is downloaded, with the data behind the table embedded as json
+def statement_page(ticker, statement):
+    values = statement_values(ticker, statement)
+    dates = [d.isoformat() for d in fiscal_year_ends()]
+    series = {}
+    for name, row in values.items():
+        has_ttm = statement != 'balance-sheet'
+        annual = row[1:] if has_ttm else row
+        # yahoo lists annual values from oldest to most recent
+        series['annual' + name] = [None if v is None else {'asOfDate': d, 'periodType': '12M', 'reportedValue': {'raw': v, 'fmt': _shown(name, v)}}
+                                   for d, v in reversed(list(zip(dates, annual)))]
+        if has_ttm:
+            series['trailing' + name] = [None if row[0] is None else {'asOfDate': dates[0], 'periodType': 'TTM', 'reportedValue': {'raw': row[0], 'fmt': _shown(name, row[0])}}]
+    # yahoo doesn't embed the series in the order its table shows them
+    data = {'context': {'dispatcher': {'stores': {'QuoteTimeSeriesStore': {'timeSeries': dict(sorted(series.items()), timestamp=[])}}}}}
+    # pad the page like the real one, whose markup and scripts dwarf the embedded data
+    padding = '<div class="Pos(r)"><span>' + 'x' * 200 + '</span></div>'
+    return (f'<html><head><title>{ticker} Financials</title></head><body>{padding * 200}'
+            f'<script>root.App.main = {json.dumps(data)};\n(function(root) {{}}(this));</script></body></html>')
+
+
+def _key_statistics_rows(ticker):
+    rng = _rng(ticker, 'key-statistics')
+    revenue = statement_values(ticker, 'financials')['TotalRevenue'][0]
+    return {
+        'Beta (5Y Monthly)': f'{rng.uniform(0.3, 2):.2f}',
+        'Shares Outstanding': f'{rng.lognormal(20, 1) / 1e9:.2f}B',
+        'Profit Margin': f'{rng.normal(12, 8):.2f}%',
+        'Operating Margin': f'{rng.normal(18, 8):.2f}%',
+        'Return on Assets': f'{rng.normal(8, 5):.2f}%',
+        'Return on Equity': f'{rng.normal(15, 10):.2f}%',
+        'Quarterly Revenue Growth': f'{rng.normal(6, 5):.2f}%',
+        'Quarterly Earnings Growth': f'{rng.normal(8, 10):.2f}%',
+        'Revenue': f'{revenue / 1e9:.2f}B',
+        # a few companies have no ebitda line, which is then constructed from their statements
+        'EBITDA': 'N/A' if rng.random() < 0.1 else f'{revenue * rng.uniform(0.1, 0.4) / 1e9:.2f}B',
+        'Net Income Avi to Common': f'{revenue * rng.uniform(0.05, 0.25) / 1e9:.2f}B',
+        'Total Cash': f'{revenue * rng.uniform(0.05, 0.5) / 1e9:.2f}B',
+        'Total Debt': f'{revenue * rng.uniform(0, 1) / 1e9:.2f}B',
+    }
+
+
+def _quote_header(ticker, price):
+    return f'<div id="quote-header-info"><h1>{ticker} Inc. ({ticker})</h1><fin-streamer data-test="qsp-price" value="{price}">{price:,.2f}</fin-streamer></div>'
+
+
+# the quote page, only used for the yield of a treasury index like ^TNX
+def quote_page(ticker):
+    return f'<html><body>{_quote_header(ticker, _rng(ticker, "quote").uniform(1, 5))}</body></html>'
+
+
+def key_statistics_page(ticker):
+    rows = ''.join(f'<tr><td><span>{label}</span><sup>1</sup></td><td class="Fw(500)">{value}</td></tr>'
+                   for label, value in _key_statistics_rows(ticker).items())
+    return (f'<html><body>{_quote_header(ticker, _rng(ticker, "price").uniform(5, 500))}'
+            f'<section data-test="qsp-statistics"><table><tbody>{rows}</tbody></table></section></body></html>')
+
+
+def profile_page(ticker):
+    rng = _rng(ticker, 'profile')
+    sector, industry = [('Technology', 'Consumer Electronics'), ('Healthcare', 'Biotechnology'), ('Industrials', 'Aerospace & Defense'),
+                        ('Energy', 'Oil & Gas Integrated')][rng.integers(4)]
+    employees = f'{rng.integers(100, 200000):,}'
+    # laid out like yahoo's markup, where react leaves empty comments around the ": " between each label and its value
+    details = '<br/>'.join(f'<span>{label}</span><!-- -->: <!-- --><span class="Fw(600)">{value}</span>'
+                           for label, value in [('Sector(s)', sector), ('Industry', industry), ('Full Time Employees', f'<span>{employees}</span>')])
+    return (f'<html><body><div id="quote-header-info"><h1 class="D(ib) Fz(18px)">{ticker} Inc. ({ticker})</h1></div>'
+            f'<div class="asset-profile-container"><div class="Mb(25px)"><h3 class="Fz(m) Mb(10px)">{ticker} Inc.</h3>'
+            f'<div class="Mb(25px)"><p class="D(ib) W(47.727%) Pend(40px)">1 Main Street<br/>Springfield<br/>United States</p>'
+            f'<p class="D(ib) Va(t)">{details}</p></div></div></div>'
+            f'<section class="quote-sub-section Mt(30px)"><h2 class="Fz(m) Lh(1) Fw(b) Mt(0) Mb(18px)"><span>Description</span></h2>'
+            f'<p class="Mt(15px) Lh(1.6)">{ticker} Inc. designs, makes and sells things.</p></section></body></html>')
+
+
+def analysis_page(ticker):
+    rng = _rng(ticker, 'analysis')
+    growth = ''.join(f'<td>{v:.1f}%</td>' for v in rng.normal(6, 4, 4))
+    return (f'<html><body><table><thead><tr><th>Revenue Estimate</th><th>Current Qtr.</th><th>Next Qtr.</th><th>Current Year</th>'
+            f'<th>Next Year</th></tr></thead><tbody><tr><td>Sales Growth (year/est)</td>{growth}</tr></tbody></table></body></html>')
+
+
+# the macroaxis bond page, with a few bonds of about 10 and 30 years to maturity
+def bonds_page(ticker):
+    rng = _rng(ticker, 'bonds')
+    headings = ['', 'Coupon', 'Ref Coupon', 'Issue Date', 'Maturity', 'Rating']
+    rows = []
+    for i in range(rng.integers(0, 8)):
+        issued = dt.date(int(rng.integers(2000, 2020)), int(rng.integers(1, 13)), int(rng.integers(1, 29)))
+        years = int(rng.choice([10, 10, 30, 5]))
+        coupon = rng.uniform(2, 7)
+        cells = [f'{ticker}{i:02d}', f'{coupon:.3f}', f'{coupon - rng.uniform(0.2, 2):.3f}', issued.strftime('%m/%d/%Y'),
+                 issued.replace(year=issued.year + years).strftime('%m/%d/%Y'), 'A']
+        rows.append('<tr>' + ''.join(f'<td>{c}</td>' for c in cells) + '</tr>')
+    rating = ['AAA', 'AA', 'A+', 'A', 'BBB', 'BB'][rng.integers(6)]
+    # companies without bonds have no table at all
+    table = f'<table><thead><tr>{"".join(f"<th>{h}</th>" for h in headings)}</tr>{"".join(rows)}</thead></table>' if rows else ''
+    return f'<html><body><div><span>Average S&amp;P Rating</span><span>{rating}</span></div>{table}</body></html>'
+
+
+# the chart data of the last trading day, whose price has moved a little since the key statistics were read
+def chart(ticker):
+    price = _rng(ticker, 'price').uniform(5, 500) * _rng(ticker, 'chart').uniform(0.95, 1.05)
+    return json.dumps({'chart': {'result': [{'meta': {'symbol': ticker, 'currency': 'USD', 'regularMarketPrice': round(price, 2)}}], 'error': None}})
+
+
+# the data behind "People Also Watch", listing other fixture tickers out of "universe"
+def recommendations(ticker, universe=None, width=5):
+    universe = universe or [ticker]
+    rng = _rng(ticker, 'recommendations')
+    symbols = [universe[i] for i in rng.permutation(len(universe))[:width + 1] if universe[i] != ticker][:width]
+    return json.dumps({'finance': {'result': [{'symbol': ticker, 'recommendedSymbols': [{'symbol': s, 'score': 0.1} for s in symbols]}],
+                                   'error': None}})
+
+
+# writes every fixture page for the given tickers to "directory", returning the paths by (ticker, page)
+def write_fixtures(tickers, directory=DIRECTORY):
+    paths = {}
+    for ticker in tickers:
+        os.makedirs(os.path.join(directory, ticker), exist_ok=True)
+        pages = [(f'{statement}.rendered.html', lambda t, s=statement: rendered_statement_page(t, s)) for statement in STATEMENTS]
+        pages += [(f'{statement}.html', lambda t, s=statement: statement_page(t, s)) for statement in STATEMENTS]
+        pages += [('quote.html', quote_page), ('key-statistics.html', key_statistics_page), ('profile.html', profile_page),
+                  ('analysis.html', analysis_page), ('bonds.html', bonds_page), ('chart.json', chart),
+                  ('recommendations.json', lambda t: recommendations(t, list(tickers)))]
+        for page, make in pages:
+            path = os.path.join(directory, ticker, page)
+            with open(path, 'w') as f:
+                f.write(make(ticker))
+            paths[(ticker, page.rsplit('.', 1)[0])] = path
+    return paths
+
+
+# the fixture file for a request to one of the scraped sites, by the path the site serves it under
+def fixture_path(path, directory=DIRECTORY):
+    parts = unquote(urlparse(path).path).strip('/').split('/')
+    if parts[:2] == ['v6', 'finance'] and len(parts) == 4:
+        return os.path.join(directory, parts[3], 'recommendations.json')
+    if parts[:2] == ['v8', 'finance'] and len(parts) == 4:
+        return os.path.join(directory, parts[3], 'chart.json')
+    if parts[:2] == ['invest', 'bond'] and len(parts) == 3:
+        return os.path.join(directory, parts[2], 'bonds.html')
+    if parts[0] == 'quote' and len(parts) in (2, 3):
+        return os.path.join(directory, parts[1], (parts[2] if len(parts) == 3 else 'quote') + '.html')
+    return None
+
+
+# serves the fixture pages in "directory" from a local http server for as long as the context is open, with every
+# scraped site pointed at it (see src.fetch.BASE_URLS). "latency" seconds are added to every response, like a network.
+# "faults" makes requests misbehave: it maps a part of a path to a list of what the next requests for paths containing it
+# get, one item per request, where an int is a status to answer with (a 429 comes with "Retry-After: 0"), a float is
+# a number of seconds to stall before answering as usual and "truncated" answers with only part of the page before
+# closing the connection. the lists are used up as requests arrive
+@contextlib.contextmanager
+def serve(directory=DIRECTORY, latency=0., faults=None):
+    from src.fetch import BASE_URLS
+
+    faults = {part: list(responses) for part, responses in (faults or {}).items()}
+    lock = threading.Lock()
+
+    def fault(path):
+        with lock:
+            for part, responses in faults.items():
+                if part in path and responses:
+                    return responses.pop(0)
+        return None
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            if latency:
+                threading.Event().wait(latency)
+            if isinstance(response := fault(self.path), int):
+                self.send_response(response)
+                if response == 429:
+                    self.send_header('Retry-After', '0')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            if isinstance(response, float):
+                threading.Event().wait(response)
+            path = fixture_path(self.path, directory)
+            if path is None or not os.path.exists(path):
+                self.send_error(404)
+                return
+            with open(path, 'rb') as f:
+                body = f.read()
+            try:
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json' if path.endswith('.json') else 'text/html')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                if response == 'truncated':
+                    self.wfile.write(body[:len(body) // 2])
+                    self.close_connection = True
+                    return
+                self.wfile.write(body)
+            except ConnectionError:
+                # the client stopped waiting (a stalled request that timed out, or the slower copy of a hedged one)
+                pass
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base = f'http://127.0.0.1:{server.server_port}'
+    previous = dict(BASE_URLS)
+    BASE_URLS.update({site: base for site in BASE_URLS})
+    try:
+        yield base
+    finally:
+        BASE_URLS.update(previous)
+        server.shutdown()
+        server.server_close()
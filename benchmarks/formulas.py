@@ -0,0 +1,80 @@
+import argparse
+import os
+import tempfile
+import time
+import warnings
+
+import src.fetch
+from benchmarks.fixtures import serve, write_fixtures
+from src.bonds import set_bond_index
+from src.lazy import lazy_import
+from src.makeTemplate import LazyChrome, get_dcf_inputs, get_peer, get_peer_data, get_summary, make_dcf, make_financials, write_peers
+from src.peertable import PeerTable
+from src.ratelimit import HostRateLimiter
+from src.store import set_store
+from src.workbook import open_workbook
+
+pd = lazy_import('pandas')
+
+# times writing the DCF sheet of a company made from fixture pages served from a local http server, with and without
+# the results of its formulas cached, and shows what a reader that doesn't recalculate (pandas) gets from each.
+# tests/test_formulas.py checks the cached results against an evaluation of the formulas. run from the repository root
+# with "python -m benchmarks.formulas"
+
+RFR, MRP, TERMINAL_GROWTH, FORECAST_YEARS, MIN_TAX_RATE = 0.04, 0.055, 0.018050372, 5, 0.2
+
+
+# writes the peers and DCF sheets of a company, with the formulas' results cached unless "cached" is False
+def write_dcf(path, ticker, peers, dfs, inputs, tax_rate, table, summary_dfs, forecast_years=FORECAST_YEARS, cached=True):
+    book = open_workbook(path)
+    write_peers(tax_rate, table, summary_dfs, book)
+    start = time.perf_counter()
+    make_dcf(dfs, ticker, peers, tax_rate, RFR, MRP, TERMINAL_GROWTH, forecast_years, book, inputs, table if cached else None)
+    seconds = time.perf_counter() - start
+    book.close()
+    return seconds
+
+
+# the peers sheet made from the scraped data of the company and its peers, with "company" and "peer" replacing some
+# of the company's values and some of every "every"-th peer's
+def peer_table(data, dfs, tax_rate, company=None, peer=None, every=1):
+    (ticker, company_data), *peers = data.items()
+    records = [get_peer(ticker, dfs, dict(company_data, **(company or {})))]
+    records += [get_peer(t, dfs, dict(d, **(peer or {})) if i % every == 0 else d) for i, (t, d) in enumerate(peers)]
+    return PeerTable(records, tax_rate)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--peers', '-p', type=int, default=10)
+    parser.add_argument('--runs', '-r', type=int, default=50)
+    args = parser.parse_args()
+
+    # the scrapers use arguments newer versions of beautifulsoup warn about on every call
+    warnings.simplefilter('ignore', DeprecationWarning)
+
+    ticker, *peers = [f'T{i:03d}' for i in range(args.peers + 1)]
+    write_fixtures([ticker] + peers)
+    src.fetch.set_cache(None)
+    set_store(None)
+    set_bond_index(None)
+    src.fetch.limiter = HostRateLimiter(default_rate=(1e9, 10 ** 9))
+
+    with serve(), tempfile.TemporaryDirectory() as directory:
+        driver = LazyChrome()
+        dfs, tax_rate = make_financials(ticker, None, driver, MIN_TAX_RATE)
+        data = {t: get_peer_data(t) for t in [ticker] + peers}
+        summary_dfs = [get_summary(t) for t in [ticker] + peers]
+        driver.close()
+        inputs = get_dcf_inputs(dfs, ticker)
+        table = peer_table(data, dfs, tax_rate)
+
+        # without cached results, a reader that doesn't recalculate gets 0 for every formula
+        path = os.path.join(directory, f'{ticker}.xlsx')
+        timings = {}
+        for cached in [False, True]:
+            timings[cached] = min(write_dcf(path, ticker, peers, dfs, inputs, tax_rate, table, summary_dfs, cached=cached)
+                                  for _ in range(args.runs))
+            read = pd.read_excel(path, 'DCF', header=None).iloc[43, 1]
+            print(f'{"cached results" if cached else "formulas only (before)":<24}make_dcf {timings[cached] * 1000:>6.2f} ms   '
+                  f'pandas reads the value per share as {read:.4f}')
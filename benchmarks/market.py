@@ -0,0 +1,100 @@
+import argparse
+import contextlib
+import io
+import multiprocessing
+import os
+import re
+import tempfile
+import time
+
+import src.fetch
+from benchmarks.fixtures import quote_page, serve, write_fixtures
+from src.market import MarketData, load_config, read_yield
+from src.ratelimit import HostRateLimiter
+
+# compares every run downloading the risk-free rate from the quote page of ^TNX (as makeDCF.py and batchDCF.py did on
+# every invocation) with reading it from the market data store (see src.market), shared by several processes each
+# making many runs, against fixture quote pages served from a local http server. checks the stored yields are the ones
+# on the quote pages, that overrides and the fixed values are used without downloading anything, and that a stale yield
+# is still used when it can't be downloaded. run from the repository root with "python -m benchmarks.market"
+
+
+# the yield a fixture quote page shows, as a decimal
+def quoted(symbol):
+    return float(re.search(r'>([\d.,]+)</fin-streamer>', quote_page(symbol)).group(1).replace(',', '')) / 100
+
+
+def setup():
+    src.fetch.set_cache(None)
+    src.fetch.limiter = HostRateLimiter(default_rate=(1e9, 10 ** 9))
+
+
+# "runs" runs that each read the risk-free rate, returning how many downloads they made
+def runs_before(runs, symbol):
+    setup()
+    for _ in range(runs):
+        read_yield(symbol)
+    return runs
+
+
+def runs_after(runs, path):
+    setup()
+    fetches = 0
+    for _ in range(runs):
+        # every run (every invocation of makeDCF.py) opens the store anew
+        market = MarketData(path)
+        market.risk_free_rate()
+        fetches += market.fetches
+    return fetches
+
+
+def in_processes(func, processes, *args):
+    start = time.perf_counter()
+    with multiprocessing.get_context('fork').Pool(processes) as pool:
+        fetches = sum(pool.starmap(func, [args] * processes))
+    return time.perf_counter() - start, fetches
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--processes', '-p', type=int, default=4)
+    parser.add_argument('--runs', '-n', type=int, default=50, help='The runs made by each process')
+    parser.add_argument('--latency', '-l', type=float, default=0.05, help='Seconds added to every response of the local server')
+    args = parser.parse_args()
+
+    config = load_config()
+    symbols = list(config['yields'].values())
+    write_fixtures(symbols)
+    setup()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'market.sqlite')
+        with serve(latency=args.latency):
+            market = MarketData(path)
+            curve = market.curve()
+            assert curve == {tenor: quoted(symbol) for tenor, symbol in config['yields'].items()}, curve
+            assert market.fetches == len(symbols) and market.risk_free_rate() == curve[config['risk_free_tenor']]
+            assert market.get('mrp') == config['values']['mrp'] and market.get('terminal_growth') == config['values']['terminal_growth']
+            assert market.fetches == len(symbols)
+
+            # a yield read longer than "max_age" ago is downloaded again
+            stale = MarketData(path, dict(config, max_age=0))
+            assert stale.get('30Y', now=time.time() + 1) == curve['30Y'] and stale.fetches == 1
+
+            before, before_fetches = in_processes(runs_before, args.processes, args.runs, config['yields'][config['risk_free_tenor']])
+            # the processes start from an empty store. the first to ask downloads the yield while the others wait for it
+            after, after_fetches = in_processes(runs_after, args.processes, args.runs, os.path.join(directory, 'shared.sqlite'))
+
+        # once the server is gone, overrides and stored yields (however old) are still used
+        offline = MarketData(path, dict(config, max_age=0, overrides={'rfr': 0.04, '5Y': 0.035}))
+        assert offline.risk_free_rate() == 0.04 and offline.get('5Y') == 0.035 and offline.fetches == 0
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            assert offline.get('3M', now=time.time() + 1) == curve['3M']
+        assert 'Could not download the 3M yield' in out.getvalue()
+
+    runs = args.processes * args.runs
+    print(f'{runs} runs in {args.processes} processes at {args.latency * 1000:.0f} ms a request')
+    print(f'downloaded every run    {before:>7.2f}s  {before_fetches:>5} downloads')
+    print(f'market data store       {after:>7.2f}s  {after_fetches:>5} downloads   ({before / after:.1f}x faster)')
+    assert after_fetches == 1, after_fetches
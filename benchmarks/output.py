@@ -0,0 +1,99 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import tempfile
+import time
+import warnings
+
+import src.fetch
+from benchmarks.fixtures import serve, write_fixtures
+from src.bonds import set_bond_index
+from src.cache import ResponseCache
+from src.lazy import lazy_import
+from src.makeTemplate import make_template
+from src.output import FORMATS
+from src.ratelimit import HostRateLimiter
+from src.store import set_store
+from src.trace import Tracer, set_tracer
+
+np = lazy_import('numpy')
+
+# compares how long a DCF takes to save as a workbook and in each of the plain data formats (see src.output), against
+# fixture pages served from a local http server and kept in a page cache so every run parses the same pages, and
+# checks that the plain formats hold the same valuation without importing xlsxwriter. run from the repository root
+# with "python -m benchmarks.output"
+
+RFR, MRP, TERMINAL_GROWTH, FORECAST_YEARS, MIN_TAX_RATE = 0.04, 0.055, 0.018050372, 5, 0.2
+
+# the spans that save the results, rather than getting and valuing them
+SAVE_SPANS = ['write_financials', 'write_peers', 'make_dcf', 'make_simulation', 'workbook_close', 'write_results']
+
+
+# the equity value per share saved in "path"
+def saved_value(path, output_format):
+    if output_format == 'json':
+        with open(path) as f:
+            return json.load(f)['outputs']['value_per_share']
+    if output_format == 'csv':
+        with open(path, newline='') as f:
+            return next(float(r['value']) for r in csv.DictReader(f) if r['table'] == 'outputs' and r['row'] == 'value_per_share')
+    with np.load(path) as arrays:
+        return float(arrays['outputs/values'][list(arrays['outputs/keys']).index('value_per_share')])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--peers', '-p', type=int, default=30)
+    parser.add_argument('--runs', '-r', type=int, default=5)
+    parser.add_argument('--workers', '-w', type=int, default=4)
+    args = parser.parse_args()
+
+    # the scrapers use arguments newer versions of beautifulsoup warn about on every call
+    warnings.simplefilter('ignore', DeprecationWarning)
+
+    tickers = [f'T{i:03d}' for i in range(args.peers + 1)]
+    write_fixtures(tickers)
+
+    set_store(None)
+    set_bond_index(None)
+    src.fetch.limiter = HostRateLimiter(default_rate=(1e9, 10 ** 9))
+
+    with serve(), tempfile.TemporaryDirectory() as directory:
+        src.fetch.set_cache(ResponseCache(os.path.join(directory, 'cache')))
+
+        def run(output_format, name):
+            outfile = os.path.join(directory, name + FORMATS[output_format])
+            tracer = Tracer()
+            set_tracer(tracer)
+            start = time.perf_counter()
+            try:
+                valuation = make_template(tickers[0], tickers[1:], RFR, MRP, TERMINAL_GROWTH, FORECAST_YEARS, MIN_TAX_RATE, outfile=outfile,
+                                          workers=args.workers, keep_inputs=False, output_format=output_format)
+            finally:
+                set_tracer(None)
+            saving = sum(s.duration for s in tracer.spans if s.name in SAVE_SPANS)
+            return time.perf_counter() - start, saving, outfile, float(valuation['value_per_share'][0])
+
+        # the first run fills the page cache. nothing asks for a workbook before it, so xlsxwriter must not have been imported
+        _, _, outfile, value = run('json', 'warm-up')
+        assert 'xlsxwriter' not in sys.modules, 'xlsxwriter was imported without making a workbook'
+        assert saved_value(outfile, 'json') == value
+
+        print(f"{'format':<8}{'seconds':>10}{'saving s':>10}{'KB':>10}")
+        seconds, saving = {}, {}
+        for output_format in FORMATS:
+            runs = [run(output_format, f'{tickers[0]}-{output_format}') for _ in range(max(1, args.runs))]
+            seconds[output_format], _, outfile, made = min(runs)
+            saving[output_format] = min(r[1] for r in runs)
+            assert made == value, f'the {output_format} run valued the company at {made}, not {value}'
+            if output_format != 'xlsx':
+                assert abs(saved_value(outfile, output_format) - value) <= 1e-9 * abs(value), f'the {output_format} file holds another value'
+            print(f"{output_format:<8}{seconds[output_format]:>10.3f}{saving[output_format]:>10.3f}{os.path.getsize(outfile) / 1000:>10.1f}")
+
+    # only saving differs between the formats. the rest of a run, mostly scraping and parsing the pages, is the same work
+    # in every format, and varies more from run to run than saving takes
+    fastest = min((f for f in FORMATS if f != 'xlsx'), key=saving.get)
+    print(f"{fastest} is saved {saving['xlsx'] / saving[fastest]:.1f}x faster than a workbook for a DCF with {args.peers} peers, "
+          f"{(saving['xlsx'] - saving[fastest]) * 1000:.0f} ms of a {seconds['xlsx']:.2f} s run")
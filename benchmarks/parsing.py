@@ -0,0 +1,170 @@
+import argparse
+import datetime as dt
+import math
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.parsing import parse_column, parse_dates, parse_numbers, parse_table, parse_value
+
+# checks the parsers of src.parsing against a matrix of scraped values, and compares their throughput with the
+# cell-by-cell "to_datatype" they replaced on large bond tables. run from the repository root with
+# "python -m benchmarks.parsing"
+
+
+# the previous parser. note the "%M" (minutes) in its date formats, which read every month as January
+def to_datatype(s: str, parse_dates: bool = False):
+    s = s.replace(',', '')
+    if s.endswith('%'):
+        try:
+            return float(s.replace('%', '')) / 100
+        except ValueError:
+            pass
+    elif s.endswith('T'):
+        try:
+            return float(s.replace('T', '')) * 1e12
+        except ValueError:
+            pass
+    elif s.endswith('B'):
+        try:
+            return float(s.replace('B', '')) * 1e9
+        except ValueError:
+            pass
+    elif s.endswith('M'):
+        try:
+            return float(s.replace('M', '')) * 1e6
+        except ValueError:
+            pass
+    elif s.endswith('k'):
+        try:
+            return float(s.replace('k', '')) * 1e3
+        except ValueError:
+            pass
+    try:
+        return float(s)
+    except ValueError:
+        pass
+
+    if parse_dates:
+        try:
+            return dt.datetime.strptime(s, '%M/%d/%Y')
+        except ValueError:
+            pass
+        try:
+            return dt.datetime.strptime(s, '%M-%d-%Y')
+        except ValueError:
+            pass
+
+    return s
+
+
+# (scraped text, value). None means the text is not a number and is kept as it is
+NUMBERS = [
+    ('0', 0.), ('42', 42.), ('-7', -7.), ('+3', 3.), ('1,234,567', 1234567.), ('1,234.5', 1234.5), ('.5', .5), ('5.', 5.),
+    ('1e3', 1000.), ('-2.5E-2', -0.025), (' 12.5 ', 12.5),
+    ('2.41T', 2.41e12), ('-1.2T', -1.2e12), ('315.5B', 315.5e9), ('1,024.75B', 1024.75e9), ('88.6M', 88.6e6), ('12k', 12e3),
+    ('15.3%', 15.3 / 100), ('-0.8%', -0.8 / 100), ('1,250%', 12.5), ('0.00%', 0.),
+    ('N/A', None), ('', None), ('-', None), ('--', None), ('AAPL', None), ('A+', None), ('T', None), ('%', None), ('1.2.3', None),
+    ('12 months', None),
+]
+
+# (scraped text, date). None means the text is not a date
+DATES = [
+    ('05/15/2030', dt.datetime(2030, 5, 15)), ('5/3/2020', dt.datetime(2020, 5, 3)), ('12/31/1999', dt.datetime(1999, 12, 31)),
+    ('02/29/2024', dt.datetime(2024, 2, 29)), ('11-09-2041', dt.datetime(2041, 11, 9)), ('1-1-2001', dt.datetime(2001, 1, 1)),
+    ('13/01/2020', None), ('02/30/2021', None), ('02/29/2023', None), ('05/15-2030', None), ('2030/05/15', None), ('N/A', None),
+    ('', None),
+]
+
+
+def same(a, b):
+    return (isinstance(a, float) and isinstance(b, float) and math.isnan(a) and math.isnan(b)) or a == b
+
+
+def check():
+    for text, value in NUMBERS:
+        assert same(parse_value(text), text if value is None else value), f'parse_value({text!r}) = {parse_value(text)!r}'
+        # the numbers the previous parser read are read the same
+        if value is not None:
+            assert same(parse_value(text), to_datatype(text)), text
+    numbers = parse_numbers([t for t, _ in NUMBERS])
+    expected = np.array([np.nan if v is None else v for _, v in NUMBERS])
+    assert np.array_equal(numbers, expected, equal_nan=True), list(zip([t for t, _ in NUMBERS], numbers))
+    # the fast path (every cell a number) gives the same values as the slow one
+    present = [t for t, v in NUMBERS if v is not None]
+    assert np.array_equal(parse_numbers(present), expected[~np.isnan(expected)])
+    assert np.array_equal(parse_numbers(pd.Series(present)), parse_numbers(present))
+    assert np.array_equal(parse_numbers([1, 2.5, None, 'N/A', '3k']), [1., 2.5, np.nan, np.nan, 3000.], equal_nan=True)
+
+    for text, date in DATES:
+        assert same(parse_value(text, parse_dates=True), text if date is None else date), f'parse_value({text!r}) = {parse_value(text, True)!r}'
+    dates = parse_dates([t for t, _ in DATES])
+    assert [None if pd.isna(d) else pd.Timestamp(d).to_pydatetime() for d in dates] == [d for _, d in DATES]
+    # the previous parser read the month as minutes
+    assert to_datatype('05/15/2030', parse_dates=True) == dt.datetime(2030, 1, 15, 0, 5)
+    assert parse_value('05/15/2030', parse_dates=True) == dt.datetime(2030, 5, 15)
+
+    assert parse_column(['1.5', 'N/A', '', '2B']).dtype == np.float64
+    assert parse_column(['05/15/2030', '-', '1/2/2003']).dtype.kind == 'M'
+    assert parse_column(['AAA', 'N/A', '3']).dtype == object
+    assert parse_column(['N/A', '']).dtype == object
+
+    table = parse_table(['', 'Coupon', 'Issue Date', 'Rating'], [['X01', '4.250', '05/01/2010', 'A'], ['X02', 'N/A', '06/15/2012']])
+    assert list(table.dtypes.map(lambda d: d.kind)) == ['O', 'f', 'M', 'O']
+    assert np.isnan(table.loc[1, 'Coupon']) and table.loc[1, 'Rating'] == ''
+    assert table.loc[1, 'Issue Date'] == pd.Timestamp(2012, 6, 15)
+
+
+# the cells of a bond table with "n" bonds, as scraped
+def bond_rows(n, seed=0):
+    rng = np.random.default_rng(seed)
+    issued = pd.Timestamp(2000, 1, 1) + pd.to_timedelta(rng.integers(0, 7300, n), unit='D')
+    maturity = issued + pd.to_timedelta(rng.choice([5, 10, 10, 30], n) * 365, unit='D')
+    coupon = rng.uniform(2, 7, n)
+    ref = coupon - rng.uniform(0.2, 2, n)
+    return [[f'X{i:06d}', f'{c:.3f}', f'{r:.3f}', i_.strftime('%m/%d/%Y'), m.strftime('%m/%d/%Y'), 'A']
+            for i, (c, r, i_, m) in enumerate(zip(coupon, ref, issued, maturity))]
+
+
+HEADINGS = ['', 'Coupon', 'Ref Coupon', 'Issue Date', 'Maturity', 'Rating']
+
+
+# how the bond table was parsed before, a cell at a time into a list of dicts
+def parse_bonds_cellwise(rows):
+    return pd.DataFrame([{h: to_datatype(c, parse_dates=True) for h, c in zip(HEADINGS, row)} for row in rows]).set_index('')
+
+
+def best(func, *args, runs=3):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func(*args)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--bonds', '-b', type=int, nargs='+', default=[1_000, 100_000])
+    parser.add_argument('--values', '-v', type=int, default=200_000)
+    args = parser.parse_args()
+
+    check()
+    print(f'{len(NUMBERS)} numbers and {len(DATES)} dates parsed as expected')
+
+    for n in args.bonds:
+        rows = bond_rows(n)
+        before = best(parse_bonds_cellwise, rows)
+        after = best(lambda r: parse_table(HEADINGS, r).set_index(''), rows)
+        cells = n * len(HEADINGS)
+        print(f'bond table of {n:>7} rows: cell by cell {before:7.3f}s ({cells / before / 1e6:5.2f}M cells/s), '
+              f'by column {after:7.3f}s ({cells / after / 1e6:5.2f}M cells/s), {before / after:4.1f}x faster')
+
+    rng = np.random.default_rng(1)
+    values = [f'{v:,.2f}{s}' for v, s in zip(rng.uniform(-1e4, 1e4, args.values), rng.choice(['', 'B', 'M', '%', 'k'], args.values))]
+    before = best(lambda v: [to_datatype(x) for x in v], values)
+    scalar = best(lambda v: [parse_value(x) for x in v], values)
+    column = best(parse_numbers, values)
+    print(f'{args.values} scalars: to_datatype {before:.3f}s, parse_value {scalar:.3f}s, parse_numbers {column:.3f}s '
+          f'({before / column:.1f}x faster)')
@@ -0,0 +1,83 @@
+import argparse
+import os
+import tempfile
+import time
+import zlib
+
+from src.peers import PeerIndex, discover_peers
+
+# run from the repository root with "python -m benchmarks.peers"
+
+
+# a random but deterministic "People Also Watch" graph, where every ticker lists "width" others out of "universe"
+def peers_of(ticker, width=6, universe=500):
+    seed = zlib.crc32(ticker.encode())
+    return [f'T{(seed * (i + 7) + i * 7919) % universe:03d}' for i in range(width)]
+
+
+# a scraper that takes as long as "latency" seconds, like a page download, and counts its calls
+def make_scraper(latency):
+    calls = []
+
+    def scrape(ticker, driver=None):
+        calls.append(ticker)
+        time.sleep(latency)
+        return peers_of(ticker)
+
+    return scrape, calls
+
+
+# the depth-first crawl "make_peers" used to do, one page at a time
+def depth_first(ticker, depth, scrape):
+    peers = []
+
+    def generate_peers(t, depth):
+        if depth == 0:
+            return
+        for p in scrape(t):
+            if p not in peers and p != t:
+                peers.append(p)
+                generate_peers(p, depth - 1)
+
+    generate_peers(ticker, depth)
+    return peers
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--depth', '-d', type=int, default=2)
+    parser.add_argument('--latency', '-l', type=float, default=0.05, help='Seconds taken by every simulated page download')
+    parser.add_argument('--workers', '-w', type=int, default=4)
+    parser.add_argument('--fan_out', type=int, default=10)
+    parser.add_argument('--max_peers', type=int, default=30)
+    args = parser.parse_args()
+
+    scrape, calls = make_scraper(args.latency)
+    start = time.perf_counter()
+    found = depth_first('T000', args.depth, scrape)
+    print(f'depth-first, sequential:  {len(calls):>3} pages, {len(found):>3} peers in {time.perf_counter() - start:.2f}s')
+
+    with tempfile.TemporaryDirectory() as directory:
+        index = PeerIndex(os.path.join(directory, 'peers.sqlite'))
+
+        scrape, calls = make_scraper(args.latency)
+        start = time.perf_counter()
+        found = discover_peers('T000', args.depth, None, args.workers, args.fan_out, args.max_peers, index, scrape)
+        print(f'breadth-first, {args.workers} workers: {len(calls):>3} pages, {len(found):>3} peers in {time.perf_counter() - start:.2f}s')
+        assert len(found) <= args.max_peers and len(set(found)) == len(found) and 'T000' not in found
+        # the ticker's own peers come first
+        assert found[:len(peers_of('T000'))] == [p for p in dict.fromkeys(peers_of('T000')) if p != 'T000'][:args.max_peers]
+
+        scrape, calls = make_scraper(args.latency)
+        start = time.perf_counter()
+        again = discover_peers('T000', args.depth, None, args.workers, args.fan_out, args.max_peers, index, scrape)
+        print(f'breadth-first, indexed:   {len(calls):>3} pages, {len(again):>3} peers in {time.perf_counter() - start:.2f}s')
+        assert again == found and not calls
+        assert index.peers('T000', args.depth, args.fan_out, args.max_peers) == found
+
+        # a stale node is crawled again on its own, without recrawling the rest of the graph
+        index.invalidate(found[0])
+        scrape, calls = make_scraper(args.latency)
+        discover_peers('T000', args.depth, None, args.workers, args.fan_out, args.max_peers, index, scrape)
+        assert calls == [found[0]], calls
+        print(f"refreshing one stale node crawled only that node; the index holds {index.stats()['nodes']} nodes and {index.stats()['edges']} edges")
@@ -0,0 +1,153 @@
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.fixtures import STATEMENTS, statement_page
+from benchmarks.writer import SyntheticPeerData
+from src.makeTemplate import get_peer, statement_value
+from src.peertable import LABELS, PeerTable
+from src.statements import parse_statement_data
+from src.valuation import to_array, value, value_company
+
+# compares building the rows of the peers sheet as a one-column data frame per peer, filled a label at a time (as
+# "get_peer" used to), with collecting them as records and putting them together in one PeerTable with the derived
+# columns calculated for every peer at once (see src.peertable). measures building the rows, reading the cells the
+# sheet is written from, and reading the columns the valuation uses, along with the memory allocated to build the rows
+# and kept by them. tests/test_peertable.py checks both give the same values. run from the repository root with
+# "python -m benchmarks.peertable"
+
+TAX_RATE = 0.21
+INPUTS = {'revenue_actual': 1e6, 'ebit_actual': 1.5e5, 'ebit_margin': 0.15, 'depr_amort_pct': 0.03, 'capex_pct': 0.04, 'nwc_pct': 0.01,
+          'growth_rate_1': 0.08, 'growth_rate_2': 0.06, 'growth_rate_f': 0.04}
+
+
+# "get_peer" as it was, building a data frame for every peer
+def peer_frame(ticker, tax_rate, dfs, data):
+    statements = ['financials', 'balance-sheet', 'cash-flow']
+    df = pd.DataFrame(columns=['Data'])
+    for l in LABELS:
+        df.loc[l] = data.get(l, '')
+
+    if 'Total Debt' not in data:
+        return df
+
+    try:
+        if data['LTM EBITDA'] is None:
+            ebit_actual = dfs[statements[0]].loc['Net Income Common Stockholders', 'TTM']
+            for item, sign in [('Tax Provision', 1), ('Interest Expense', 1), ('Interest Income', -1), ('Reconciled Depreciation', 1)]:
+                try:
+                    ebit_actual += sign * statement_value(dfs[statements[0]], item, 'TTM')
+                except (KeyError, TypeError):
+                    pass
+            df.loc['LTM EBITDA'] = ebit_actual
+
+        df.loc['Market Cap'] = df.loc['Share Price'] * df.loc['Shares Outstanding']
+        df.loc['Enterprise Value'] = df.loc['Market Cap'] + df.loc['Total Debt'] - df.loc['Cash and Equivalents']
+
+        df.loc['Debt/Equity'] = df.loc['Total Debt'] / df.loc['Market Cap']
+        df.loc['Unlevered Beta'] = df.loc['Equity Beta'] / (1 + (1 - tax_rate) * df.loc['Debt/Equity'])
+        df.loc['Unlevered Beta'] = df.loc['Unlevered Beta'].apply(lambda x: x or '')
+
+        df.loc['P/E Ratio'] = max(df.loc['Market Cap', 'Data'] / df.loc['LTM Earnings', 'Data'], 0.)
+        df.loc['EV/Sales'] = max(df.loc['Enterprise Value', 'Data'] / df.loc['LTM Sales', 'Data'], 0.)
+        df.loc['EV/EBITDA'] = max(df.loc['Enterprise Value', 'Data'] / df.loc['LTM EBITDA', 'Data'], 0.)
+    except (TypeError, AttributeError):
+        pass
+
+    return df
+
+
+# scraped values for every peer, some of them without an EBITDA (constructed from the statements), a beta or a
+# complete key statistics page
+def peer_data(peers):
+    synthetic = SyntheticPeerData()
+    data = {}
+    for i in range(peers + 1):
+        ticker = f'T{i:04d}'
+        d = synthetic.peer(ticker)
+        if i % 5 == 4:
+            d['LTM EBITDA'] = None
+        if i % 11 == 10:
+            d['Equity Beta'] = 0.
+        if i % 13 == 12:
+            del d['Total Debt']
+        data[ticker] = d
+    return data
+
+
+def before(data, dfs):
+    return [peer_frame(t, TAX_RATE, dfs, d) for t, d in data.items()]
+
+
+def after(data, dfs):
+    return PeerTable([get_peer(t, dfs, d) for t, d in data.items()], TAX_RATE)
+
+
+# the cells of the peers sheet, read the way each version writes them. values that can't be written (NaN and None)
+# end up as blank cells
+def cells_before(frames):
+    return [['' if v is None or (isinstance(v, float) and not np.isfinite(v)) else v for v in (df.loc[item, 'Data'] for item in df.index)]
+            for df in frames]
+
+
+def cells_after(table):
+    return table.values.tolist()
+
+
+# the valuation, reading the peers' columns the way each version does
+def value_before(frames):
+    company_df, *peer_dfs = frames
+    labels = ['Debt/Equity', 'Bond Spread (10Y)', 'Bond Spread (30Y)', 'Market Cap', 'Total Debt', 'Cash and Equivalents',
+              'Shares Outstanding', 'LTM Earnings', 'LTM Sales', 'LTM EBITDA']
+    company = {l: to_array([company_df.loc[l, 'Data']]) for l in labels}
+    peers = {l: to_array([df.loc[l, 'Data'] for df in peer_dfs])[None, :] for l in ['Unlevered Beta', 'P/E Ratio', 'EV/Sales', 'EV/EBITDA']}
+    return value({k: to_array([v]) for k, v in INPUTS.items()}, company, peers, TAX_RATE, 0.04, 0.055, 0.018, 5)
+
+
+def value_after(table):
+    return value_company(INPUTS, table, TAX_RATE, 0.04, 0.055, 0.018, 5)
+
+
+def timed(func, *args, runs=3):
+    best, result = float('inf'), None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+# the memory allocated while building the rows, at its peak and what is still held once they are built
+def memory(build, *args):
+    tracemalloc.start()
+    rows = build(*args)
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del rows
+    return peak, held
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--peers', '-p', type=int, nargs='+', default=[30, 300])
+    args = parser.parse_args()
+
+    dfs = {s: parse_statement_data(statement_page('T0000', s)) for s in STATEMENTS}
+    print(f"{'peers':>6}  {'rows':<22}{'build ms':>10}{'cells ms':>10}{'value ms':>10}{'peak MB':>9}{'held MB':>9}")
+    for peers in args.peers:
+        data = peer_data(peers)
+        results = {}
+        for name, build, cells, valuation in [('data frame per peer', before, cells_before, value_before),
+                                              ('peer table', after, cells_after, value_after)]:
+            build_s, rows = timed(build, data, dfs)
+            cells_s, _ = timed(cells, rows)
+            value_s, _ = timed(valuation, rows)
+            peak, held = memory(build, data, dfs)
+            results[name] = build_s
+            print(f'{peers:>6}  {name:<22}{build_s * 1000:>10.1f}{cells_s * 1000:>10.2f}{value_s * 1000:>10.2f}{peak / 1e6:>9.2f}{held / 1e6:>9.2f}')
+
+        before_s, after_s = results.values()
+        print(f'{"":>8}{before_s / after_s:.0f}x faster to build')
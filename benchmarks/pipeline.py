@@ -0,0 +1,175 @@
+import argparse
+import datetime as dt
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+import warnings
+
+import numpy as np
+import xlsxwriter as xls
+
+import src.fetch
+from benchmarks.fixtures import serve, write_fixtures
+from src.bonds import set_bond_index
+from src.batch import PeerData
+from src.makeTemplate import LazyChrome, get_dcf_inputs, get_peer, get_peer_data, get_statement, get_summary, make_dcf, make_financials, \
+    make_peers, make_template
+from src.ratelimit import HostRateLimiter
+from src.store import set_store
+
+# times "make_template" and each of its stages against fixture pages served from a local http server, for a company
+# with 1, 10 and 100 peers. run from the repository root with "python -m benchmarks.pipeline", and compare two runs
+# with "python -m benchmarks.pipeline --compare old.json new.json"
+
+RESULTS = os.path.join(os.path.dirname(__file__), 'results')
+PERCENTILES = [50, 90, 99]
+RFR, MRP, TERMINAL_GROWTH, FORECAST_YEARS, MIN_TAX_RATE = 0.04, 0.055, 0.018050372, 5, 0.2
+
+
+# latency percentiles (in ms) and throughput (per second) of a list of timings in seconds
+def summarize(times):
+    times = np.asarray(times)
+    return {
+        'n': int(times.size),
+        **{f'p{p}_ms': float(np.percentile(times, p) * 1000) for p in PERCENTILES},
+        'mean_ms': float(times.mean() * 1000),
+        'per_second': float(times.size / times.sum()),
+    }
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+# the peak memory (in MB) allocated by python while running "func"
+def peak_memory(func, *args, **kwargs):
+    tracemalloc.start()
+    try:
+        func(*args, **kwargs)
+        return tracemalloc.get_traced_memory()[1] / 1e6
+    finally:
+        tracemalloc.stop()
+
+
+def run_scenario(ticker, peers, repeat, workers, directory):
+    driver = LazyChrome()
+    times = {stage: [] for stage in ['make_template', 'get_statement', 'get_peer', 'get_summary', 'make_dcf', 'workbook_close']}
+
+    def outfile(i):
+        return os.path.join(directory, f'{ticker}-{len(peers)}-{i}.xlsx')
+
+    for i in range(repeat):
+        elapsed, _ = timed(make_template, ticker, list(peers), RFR, MRP, TERMINAL_GROWTH, FORECAST_YEARS, MIN_TAX_RATE,
+                           outfile=outfile(i), workers=workers, driver=driver)
+        times['make_template'].append(elapsed)
+
+        # each stage on its own
+        dfs = {}
+        for statement in ['financials', 'balance-sheet', 'cash-flow']:
+            elapsed, dfs[statement] = timed(get_statement, ticker, statement, driver)
+            times['get_statement'].append(elapsed)
+        for peer in peers:
+            elapsed, _ = timed(lambda p: get_peer(p, dfs, get_peer_data(p)), peer)
+            times['get_peer'].append(elapsed)
+            elapsed, _ = timed(get_summary, peer)
+            times['get_summary'].append(elapsed)
+
+        # the sheets of a full workbook, so closing it writes as much as "make_template" does
+        book = xls.Workbook(outfile(i))
+        dfs, tax_rate = make_financials(ticker, book, driver, MIN_TAX_RATE)
+        make_peers(ticker, list(peers), tax_rate, dfs, book, workers=workers, peer_data=PeerData())
+        inputs = get_dcf_inputs(dfs, ticker)
+        elapsed, _ = timed(make_dcf, dfs, ticker, list(peers), tax_rate, RFR, MRP, TERMINAL_GROWTH, FORECAST_YEARS, book, inputs)
+        times['make_dcf'].append(elapsed)
+        elapsed, _ = timed(book.close)
+        times['workbook_close'].append(elapsed)
+
+    result = {stage: summarize(t) for stage, t in times.items()}
+    result['make_template']['peak_mb'] = peak_memory(make_template, ticker, list(peers), RFR, MRP, TERMINAL_GROWTH, FORECAST_YEARS,
+                                                     MIN_TAX_RATE, outfile=outfile(0), workers=workers, driver=driver)
+    result['make_template']['peers_per_second'] = len(peers) * result['make_template']['per_second']
+    driver.close()
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results):
+    print(f"{'scenario':<10}{'stage':<16}{'p50':>10}{'p90':>10}{'p99':>10}{'per second':>12}{'peak MB':>9}")
+    for scenario, stages in results['scenarios'].items():
+        for stage, r in stages.items():
+            peak = f"{r['peak_mb']:>9.1f}" if 'peak_mb' in r else ''
+            print(f"{scenario:<10}{stage:<16}{r['p50_ms']:>7.1f} ms{r['p90_ms']:>7.1f} ms{r['p99_ms']:>7.1f} ms{r['per_second']:>12.1f}{peak}")
+
+
+# prints how the median latency and peak memory of every stage changed between two saved runs
+def compare(old, new):
+    print(f"{'scenario':<10}{'stage':<16}{'old p50':>10}{'new p50':>10}{'change':>9}{'old MB':>8}{'new MB':>8}")
+    for scenario, stages in new['scenarios'].items():
+        for stage, r in stages.items():
+            before = old['scenarios'].get(scenario, {}).get(stage)
+            if before is None:
+                continue
+            memory = f"{before['peak_mb']:>8.1f}{r['peak_mb']:>8.1f}" if 'peak_mb' in r and 'peak_mb' in before else ''
+            print(f"{scenario:<10}{stage:<16}{before['p50_ms']:>7.1f} ms{r['p50_ms']:>7.1f} ms{r['p50_ms'] / before['p50_ms'] - 1:>+9.1%}{memory}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--peers', '-p', type=int, nargs='+', default=[1, 10, 100], help='The number of peers in each scenario')
+    parser.add_argument('--repeat', '-r', type=int, default=3)
+    parser.add_argument('--workers', '-w', type=int, default=4)
+    parser.add_argument('--latency', '-l', type=float, default=0., help='Seconds added to every response of the local server')
+    parser.add_argument('--output', '-o', type=str, help='Where to save the results. Defaults to benchmarks/results/pipeline-<time>.json')
+    parser.add_argument('--compare', '-c', type=str, nargs=2, metavar=('OLD', 'NEW'), help='Compare two saved runs instead of running')
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as old, open(args.compare[1]) as new:
+            compare(json.load(old), json.load(new))
+        raise SystemExit
+
+    # the scrapers use arguments newer versions of beautifulsoup warn about on every call
+    warnings.simplefilter('ignore', DeprecationWarning)
+
+    tickers = [f'T{i:03d}' for i in range(max(args.peers) + 1)]
+    write_fixtures(tickers)
+    write_fixtures(['^TNX'])
+
+    # only the pipeline is measured, so every page is downloaded and nothing is throttled
+    src.fetch.set_cache(None)
+    set_store(None)
+    set_bond_index(None)
+    src.fetch.limiter = HostRateLimiter(default_rate=(1e9, 10 ** 9))
+
+    results = {
+        'date': dt.datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'cpus': os.cpu_count(),
+        'args': {k: v for k, v in vars(args).items() if k != 'compare'},
+        'scenarios': {},
+    }
+    with serve(latency=args.latency), tempfile.TemporaryDirectory() as directory:
+        # the first run imports the heavy dependencies (see src.lazy), which shouldn't count against any scenario
+        make_template(tickers[0], tickers[1:2], RFR, MRP, TERMINAL_GROWTH, FORECAST_YEARS, MIN_TAX_RATE, outfile=os.path.join(directory, 'warm-up.xlsx'))
+        for n in args.peers:
+            results['scenarios'][f'{n} peers'] = run_scenario(tickers[0], tickers[1:n + 1], args.repeat, args.workers, directory)
+
+    print_results(results)
+    output = args.output or os.path.join(RESULTS, f"pipeline-{results['date'].replace(':', '')}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'saved the results to {output}')
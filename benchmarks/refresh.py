@@ -0,0 +1,98 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+import warnings
+
+import src.fetch
+from benchmarks.fixtures import chart, serve, write_fixtures
+from src.bonds import set_bond_index
+from src.inputs import load_inputs
+from src.makeTemplate import make_template
+from src.ratelimit import HostRateLimiter
+from src.store import set_store
+from src.refresh import refresh_template, refresh_watchlist
+from src.trace import Tracer, set_tracer
+
+# compares making a DCF from scratch with refreshing it with new share prices (see src.refresh), against fixture pages
+# served from a local http server, and checks that a refresh downloads one small document per ticker. run from the
+# repository root with "python -m benchmarks.refresh"
+
+RFR, MRP, TERMINAL_GROWTH, FORECAST_YEARS, MIN_TAX_RATE = 0.04, 0.055, 0.018050372, 5, 0.2
+
+
+# runs "func", returning how long it took, the pages it downloaded and its result
+def traced_run(func, *args, **kwargs):
+    tracer = Tracer()
+    set_tracer(tracer)
+    start = time.perf_counter()
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        set_tracer(None)
+    fetches = [s for s in tracer.spans if s.name == 'fetch']
+    return time.perf_counter() - start, fetches, result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--peers', '-p', type=int, default=10)
+    parser.add_argument('--workers', '-w', type=int, default=4)
+    parser.add_argument('--latency', '-l', type=float, default=0.05, help='Seconds added to every response of the local server')
+    args = parser.parse_args()
+
+    # the scrapers use arguments newer versions of beautifulsoup warn about on every call
+    warnings.simplefilter('ignore', DeprecationWarning)
+
+    tickers = [f'T{i:03d}' for i in range(args.peers + 1)]
+    write_fixtures(tickers)
+    write_fixtures(['^TNX'])
+
+    # every page is downloaded, so the requests can be counted
+    src.fetch.set_cache(None)
+    set_store(None)
+    set_bond_index(None)
+    src.fetch.limiter = HostRateLimiter(default_rate=(1e9, 10 ** 9))
+
+    with serve(latency=args.latency), tempfile.TemporaryDirectory() as directory:
+        outfile = os.path.join(directory, f'{tickers[0]}.xlsx')
+        # the first run imports the heavy dependencies (see src.lazy), which shouldn't count against either
+        make_template(tickers[0], tickers[1:2], RFR, MRP, TERMINAL_GROWTH, FORECAST_YEARS, MIN_TAX_RATE,
+                      outfile=os.path.join(directory, 'warm-up.xlsx'), keep_inputs=False)
+
+        full, full_fetches, valuation = traced_run(make_template, tickers[0], tickers[1:], RFR, MRP, TERMINAL_GROWTH,
+                                                   FORECAST_YEARS, MIN_TAX_RATE, outfile=outfile, workers=args.workers)
+        made = os.path.getmtime(outfile)
+        made_prices = {t: d['Share Price'] for t, d in load_inputs(outfile)['peer_data'].items()}
+        time.sleep(0.01)
+
+        refresh, refresh_fetches, refreshed = traced_run(refresh_template, outfile, workers=args.workers)
+
+        assert len(refresh_fetches) == len(tickers), f'a refresh downloaded {len(refresh_fetches)} pages for {len(tickers)} tickers'
+        assert all(s.attrs['page_type'] == 'quote' for s in refresh_fetches)
+        assert os.path.getmtime(outfile) > made, 'the workbook was not rewritten'
+        saved = load_inputs(outfile)
+        for t in tickers:
+            price = json.loads(chart(t))['chart']['result'][0]['meta']['regularMarketPrice']
+            assert saved['peer_data'][t]['Share Price'] == price, f'the share price of {t} was not updated'
+        # the share prices weigh the cost of equity against the cost of debt, so the value moved with them
+        assert float(refreshed['value_per_share'][0]) != float(valuation['value_per_share'][0])
+
+        # refreshing with the share prices the DCF was made with gives the same valuation as making it again
+        _, _, unchanged = traced_run(refresh_template, outfile, workers=args.workers, prices=made_prices,
+                                     outfile=os.path.join(directory, 'unchanged.xlsx'))
+        assert abs(float(unchanged['value_per_share'][0]) - float(valuation['value_per_share'][0])) < 1e-9
+
+        # a second workbook sharing most of the peers only adds the prices of its new tickers
+        other = os.path.join(directory, f'{tickers[1]}.xlsx')
+        make_template(tickers[1], tickers[2:] + ['^TNX'], RFR, MRP, TERMINAL_GROWTH, FORECAST_YEARS, MIN_TAX_RATE, outfile=other,
+                      workers=args.workers)
+        watchlist, watchlist_fetches, summary = traced_run(refresh_watchlist, [outfile, other], workers=args.workers)
+        assert not summary['failed'] and len(watchlist_fetches) == summary['tickers'] == len(tickers) + 1
+
+    print(f"{'run':<26}{'seconds':>9}{'requests':>10}{'KB':>9}")
+    for name, seconds, fetches in [('make_template', full, full_fetches), ('refresh_template', refresh, refresh_fetches),
+                                   ('refresh_watchlist (2 DCFs)', watchlist, watchlist_fetches)]:
+        print(f'{name:<26}{seconds:>9.2f}{len(fetches):>10}{sum(s.bytes for s in fetches) / 1000:>9.1f}')
+    print(f'a refresh is {full / refresh:.1f}x faster than making the DCF again')
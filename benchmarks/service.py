@@ -0,0 +1,135 @@
+import argparse
+import asyncio
+import http.client
+import json
+import threading
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+import src.fetch
+from benchmarks.fixtures import serve, write_fixtures
+from src.bonds import set_bond_index
+from src.ratelimit import HostRateLimiter
+from src.service import ValuationService
+from src.store import set_store
+from src.trace import Tracer, set_tracer
+
+# measures the valuation service (see src.service) against fixture pages served from a local http server: a cold
+# valuation, warm ones, and the throughput of several clients at once. checks that warm valuations fetch nothing,
+# that identical concurrent requests are answered by one job and that requests beyond "max_pending" are turned away.
+# run from the repository root with "python -m benchmarks.service"
+
+RFR = 0.04
+
+
+# runs the service on its own event loop in a background thread, returning its port
+def start(service):
+    ready = threading.Event()
+    address = []
+
+    def run():
+        asyncio.run(service.serve('127.0.0.1', 0, ready=lambda a: (address.append(a), ready.set())))
+
+    threading.Thread(target=run, daemon=True).start()
+    ready.wait()
+    return address[0][1]
+
+
+# a client keeping one connection open, like a dashboard would
+class Client:
+    def __init__(self, port):
+        self.connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+
+    def get(self, path):
+        start = time.perf_counter()
+        self.connection.request('GET', path)
+        response = self.connection.getresponse()
+        body = json.loads(response.read())
+        return response.status, body, time.perf_counter() - start, response.getheader('Retry-After')
+
+
+def fetches(tracer):
+    return sum(s.name == 'fetch' for s in tracer.spans)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--peers', '-p', type=int, default=10)
+    parser.add_argument('--requests', '-n', type=int, default=200)
+    parser.add_argument('--clients', '-c', type=int, default=4)
+    parser.add_argument('--latency', '-l', type=float, default=0.02, help='Seconds added to every response of the local server')
+    args = parser.parse_args()
+
+    # the scrapers use arguments newer versions of beautifulsoup warn about on every call
+    warnings.simplefilter('ignore', DeprecationWarning)
+
+    tickers = [f'T{i:03d}' for i in range(args.peers + 6)]
+    write_fixtures(tickers)
+
+    # every page is downloaded, so only the service keeps anything warm
+    src.fetch.set_cache(None)
+    set_store(None)
+    set_bond_index(None)
+    src.fetch.limiter = HostRateLimiter(default_rate=(1e9, 10 ** 9))
+    tracer = Tracer()
+    set_tracer(tracer)
+
+    with serve(latency=args.latency):
+        service = ValuationService(RFR, threads=4, max_pending=8)
+        port = start(service)
+        path = f"/valuation/{tickers[0]}?peers={','.join(tickers[1:args.peers + 1])}"
+
+        status, cold, cold_seconds, _ = Client(port).get(path)
+        assert status == 200, cold
+        value = cold['outputs']['value_per_share']
+
+        # warm requests are answered from the parsed data, without fetching anything
+        before = fetches(tracer)
+        client = Client(port)
+        warm = [client.get(path) for _ in range(20)]
+        assert all(s == 200 and b['outputs']['value_per_share'] == value for s, b, _, _ in warm)
+        assert fetches(tracer) == before, f'warm requests fetched {fetches(tracer) - before} pages'
+        warm_seconds = sorted(t for _, _, t, _ in warm)[len(warm) // 2]
+        assert warm_seconds < 1, f'a warm valuation took {warm_seconds:.2f}s'
+
+        # identical requests that arrive together are answered by one job, which gets each statement once
+        coalesced = service.stats.coalesced
+        before = len(tracer.spans)
+        same = f"/valuation/{tickers[-1]}?peers={','.join(tickers[1:4])}"
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            answers = list(executor.map(lambda _: Client(port).get(same), range(8)))
+        assert all(s == 200 for s, _, _, _ in answers)
+        assert len({b['outputs']['value_per_share'] for _, b, _, _ in answers}) == 1
+        assert service.stats.coalesced - coalesced == 7, f'{service.stats.coalesced - coalesced} of 7 requests were coalesced'
+        statement_fetches = [s for s in tracer.spans[before:] if s.name == 'fetch' and f'/{tickers[-1]}/' in s.attrs['url']
+                             and s.attrs['page_type'].startswith('statement')]
+        assert len(statement_fetches) == 3, f'{len(statement_fetches)} statements were fetched for 8 identical requests'
+
+        # requests beyond "max_pending" are turned away instead of queueing without bound
+        service.max_pending = 1
+        cold_paths = [f"/statements/{t}" for t in tickers[-5:-1]]
+        with ThreadPoolExecutor(max_workers=len(cold_paths)) as executor:
+            answers = list(executor.map(lambda p: Client(port).get(p), cold_paths))
+        assert any(s == 503 and retry == '1' for s, _, _, retry in answers), [s for s, _, _, _ in answers]
+        assert any(s == 200 for s, _, _, _ in answers)
+        service.max_pending = 8
+
+        # throughput of several dashboards asking for warm valuations at once
+        def client_run(n):
+            c = Client(port)
+            return [c.get(path)[2] for _ in range(n)]
+
+        start_time = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.clients) as executor:
+            latencies = sorted(t for ts in executor.map(client_run, [args.requests // args.clients] * args.clients) for t in ts)
+        elapsed = time.perf_counter() - start_time
+
+        stats = Client(port).get('/stats')[1]
+        service.close()
+
+    print(f'cold valuation ({args.peers} peers)    {cold_seconds * 1000:>8.0f} ms')
+    print(f'warm valuation (median)         {warm_seconds * 1000:>8.1f} ms')
+    print(f'{args.clients} clients, {len(latencies)} warm requests  {len(latencies) / elapsed:>8.1f} requests/s, '
+          f'p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, p95 {latencies[len(latencies) * 95 // 100] * 1000:.1f} ms')
+    print(f"service: {stats['requests']} requests, {stats['coalesced']} coalesced, {stats['rejected']} rejected")
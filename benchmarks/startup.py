@@ -0,0 +1,87 @@
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+# run from the repository root with "python -m benchmarks.startup"
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# what each short-lived invocation has to import before it can do any work
+IMPORTS = ['src.makeTemplate', 'src.batch', 'src.valuation', 'src.statements']
+COMMANDS = [['makeDCF.py', '-h'], ['batchDCF.py', '-h']]
+
+# a module from deep inside each heavy dependency, which is only in sys.modules once the dependency was really imported
+HEAVY = {
+    'numpy': 'numpy.linalg',
+    'pandas': 'pandas.core.frame',
+    'bs4': 'bs4.element',
+    'selenium': 'selenium.webdriver.remote.webdriver',
+    'xlsxwriter': 'xlsxwriter.workbook',
+    'requests': 'requests.sessions',
+}
+
+
+# imports "module" in a fresh interpreter with "-X importtime", returning the cumulative time (in ms) it took and the
+# cumulative time of each of the imports it made itself, the slowest first
+def import_times(module, cwd=ROOT):
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], cwd=cwd, capture_output=True, text=True, check=True)
+    lines = [line[len('import time:'):].split('|') for line in result.stderr.splitlines() if line.startswith('import time:') and 'cumulative' not in line]
+    # the log lists a module after everything it imported, indented by two spaces per level
+    start = max(i for i, (_, _, name) in enumerate(lines) if name.strip() == module)
+    total = int(lines[start][1]) / 1000
+    children = {}
+    for _, cumulative, name in reversed(lines[:start]):
+        depth = (len(name) - len(name.lstrip())) // 2
+        if depth == 0:
+            break
+        if depth == 1:
+            children[name.strip()] = int(cumulative) / 1000
+    return total, dict(sorted(children.items(), key=lambda t: -t[1]))
+
+
+# the heavy dependencies that importing "module" actually loads
+def heavy_imports(module, cwd=ROOT):
+    check = f'import sys, {module}; print(" ".join(name for name, marker in {HEAVY!r}.items() if marker in sys.modules))'
+    return subprocess.run([sys.executable, '-c', check], cwd=cwd, capture_output=True, text=True, check=True).stdout.split()
+
+
+def wall_time(command, cwd=ROOT):
+    start = time.perf_counter()
+    subprocess.run([sys.executable] + command, cwd=cwd, capture_output=True, check=True)
+    return (time.perf_counter() - start) * 1000
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', '-r', type=int, default=5)
+    parser.add_argument('--top', '-t', type=int, default=5, help='How many of the slowest imports to list for each module')
+    args = parser.parse_args()
+
+    # nothing heavy should be paid for just by importing, and the package must import from any directory
+    for module in IMPORTS:
+        heavy = heavy_imports(module)
+        assert not heavy, f'importing {module} loads {", ".join(heavy)}'
+    print('no heavy dependency is loaded at import time')
+    with tempfile.TemporaryDirectory() as directory:
+        subprocess.run([sys.executable, '-c', 'from src.makeTemplate import message_to_analyst; assert message_to_analyst()'], cwd=directory,
+                       env=dict(os.environ, PYTHONPATH=ROOT), check=True)
+    print('the package imports (and finds its message to the analyst) from outside the repository')
+
+    print(f'\n{"import":<24}{"median":>10}{"min":>10}   slowest imports it makes')
+    for module in IMPORTS:
+        runs = [import_times(module) for _ in range(args.repeat)]
+        totals = np.array([total for total, _ in runs])
+        slowest = ', '.join(f'{k} {v:.1f} ms' for k, v in list(runs[-1][1].items())[:args.top])
+        print(f'{module:<24}{np.median(totals):>7.1f} ms{totals.min():>7.1f} ms   {slowest}')
+
+    print(f'\n{"command":<24}{"median":>10}{"min":>10}')
+    baseline = np.array([wall_time(['-c', 'pass']) for _ in range(args.repeat)])
+    print(f'{"python -c pass":<24}{np.median(baseline):>7.1f} ms{baseline.min():>7.1f} ms')
+    for command in COMMANDS:
+        times = np.array([wall_time(command) for _ in range(args.repeat)])
+        print(f'{" ".join(command):<24}{np.median(times):>7.1f} ms{times.min():>7.1f} ms')
@@ -0,0 +1,106 @@
+import argparse
+import datetime as dt
+import time
+
+import numpy as np
+import pandas as pd
+from bs4 import BeautifulSoup
+
+from benchmarks.fixtures import STATEMENTS, rendered_statement_page
+from src.statements import make_statement_frame, parse_statement
+
+# compares the columnar statement parser with the cell-by-cell parser it replaced, on the rendered fixture pages.
+# run from the repository root with "python -m benchmarks.statement_parser"
+
+
+# the previous parser, which filled an empty object frame one cell at a time
+def parse_statement_cellwise(html):
+    soup = BeautifulSoup(html, 'lxml')
+    table = soup.find('section', {'data-test': 'qsp-financial'})
+
+    items = []
+    periods = []
+    for item in table.find_all('span', 'Va(m)'):
+        items.append(item.text)
+    for data in (table_data := table.find_all('div', 'Ta(c)')):
+        try:
+            data['data-test']
+        except:
+            try:
+                periods.append(dt.datetime.strptime(data.text, '%m/%d/%Y').strftime('%d %B %Y'))
+            except ValueError:
+                periods.append(data.text.upper().strip())
+
+    df = pd.DataFrame(columns=periods, index=items)
+    for i, data in enumerate(table_data[len(periods):]):
+        try:
+            df.iloc[int(i / len(periods)), i % len(periods)] = float(data.text.strip().replace(',', ''))
+        except ValueError:
+            df.iloc[int(i / len(periods)), i % len(periods)] = data.text.strip()
+    return df
+
+
+def median_ms(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return np.median(times) * 1000
+
+
+# percent-of-sales ratios of every line item, averaged over the full fiscal years like "get_dcf_inputs" does
+def ratios(df):
+    return df.drop(columns=df.columns[0]).div(df.loc['Total Revenue'].drop(df.columns[0]), axis=1).mean(axis=1)
+
+
+# the text of the table's cells, as both parsers see it after the soup is built
+def table_text(html):
+    table = BeautifulSoup(html, 'lxml').find('section', {'data-test': 'qsp-financial'})
+    items = [item.text for item in table.find_all('span', 'Va(m)')]
+    cells = table.find_all('div', 'Ta(c)')
+    periods = [c.text.upper().strip() for c in cells if not c.has_attr('data-test')]
+    values = [c.text.strip() for c in cells if c.has_attr('data-test')]
+    return items, periods, values
+
+
+# fills an empty object frame one cell at a time, like the previous parser did
+def build_cellwise(items, periods, values):
+    df = pd.DataFrame(columns=periods, index=items)
+    for i, v in enumerate(values):
+        try:
+            df.iloc[int(i / len(periods)), i % len(periods)] = float(v.replace(',', ''))
+        except ValueError:
+            df.iloc[int(i / len(periods)), i % len(periods)] = v
+    return df
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tickers', '-t', type=str, nargs='+', default=['AAPL', 'MSFT', 'GOOG'])
+    parser.add_argument('--repeat', '-r', type=int, default=20)
+    args = parser.parse_args()
+
+    print('whole parse (soup + frame), frame construction alone, and dcf-style ratios on the parsed income statement')
+    print(f"{'page':<28}{'cell-by-cell':>14}{'columnar':>12}{'speedup':>9}{'frame (cells)':>16}{'frame (columnar)':>18}{'speedup':>9}"
+          f"{'ratios (object)':>18}{'ratios (float64)':>18}")
+    for ticker in args.tickers:
+        for statement in STATEMENTS:
+            html = rendered_statement_page(ticker, statement)
+            old, new = parse_statement_cellwise(html), parse_statement(html)
+            # both parsers must read the same numbers
+            assert np.allclose(pd.to_numeric(old.stack(), errors='coerce').unstack().reindex_like(new).to_numpy(np.float64),
+                               new.to_numpy(), equal_nan=True)
+
+            old_ms = median_ms(lambda: parse_statement_cellwise(html), args.repeat)
+            new_ms = median_ms(lambda: parse_statement(html), args.repeat)
+            items, periods, values = table_text(html)
+            cells_ms = median_ms(lambda: build_cellwise(items, periods, values), args.repeat)
+            columnar_ms = median_ms(lambda: make_statement_frame(items, periods, values), args.repeat)
+            line = (f'{ticker + " " + statement:<28}{old_ms:>11.2f} ms{new_ms:>9.2f} ms{old_ms / new_ms:>8.1f}x'
+                    f'{cells_ms:>13.2f} ms{columnar_ms:>15.2f} ms{cells_ms / columnar_ms:>8.1f}x')
+            if statement == 'financials':
+                # "-" cells make arithmetic on the object frame raise, so blank them out while keeping its object dtype
+                old = old.mask(old.eq('-')).astype(object)
+                line += f'{median_ms(lambda: ratios(old), args.repeat):>15.3f} ms{median_ms(lambda: ratios(new), args.repeat):>15.3f} ms'
+            print(line)
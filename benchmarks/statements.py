@@ -0,0 +1,81 @@
+import argparse
+import pathlib
+import time
+import tracemalloc
+
+import numpy as np
+
+from benchmarks.fixtures import STATEMENTS, write_fixtures
+from src.statements import parse_statement, parse_statement_data
+
+# compares the two statement backends on the saved fixture pages. run from the repository root with
+# "python -m benchmarks.statements". by default only the parsing done by each backend is timed; pass --browser to
+# also time the selenium backend loading and expanding the pages in headless chrome
+
+
+def measure(func, arg, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(arg)
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    func(arg)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return np.median(times) * 1000, peak / 1e6
+
+
+def load_in_browser(driver):
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    def load(path):
+        driver.get(pathlib.Path(path).resolve().as_uri())
+        time.sleep(1)
+        WebDriverWait(driver, 10).until(
+            EC.element_to_be_clickable((By.XPATH, f"//*[text() = 'Expand All']"))
+        ).click()
+        return parse_statement(driver.execute_script('return document.body.innerHTML;'))
+    return load
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tickers', '-t', type=str, nargs='+', default=['AAPL', 'MSFT', 'GOOG'])
+    parser.add_argument('--repeat', '-r', type=int, default=20)
+    parser.add_argument('--browser', help='Also time loading the rendered pages in headless chrome', action='store_true')
+    args = parser.parse_args()
+
+    paths = write_fixtures(args.tickers)
+    driver = None
+    if args.browser:
+        from src.makeTemplate import LazyChrome
+        driver = LazyChrome()
+
+    print(f"{'page':<28}{'http parse':>14}{'selenium parse':>16}{'http MB':>10}{'selenium MB':>13}" + (f"{'selenium load':>15}" if driver else ''))
+    totals = np.zeros(3)
+    try:
+        for ticker in args.tickers:
+            for statement in STATEMENTS:
+                with open(paths[(ticker, statement)]) as f:
+                    page = f.read()
+                with open(paths[(ticker, statement + '.rendered')]) as f:
+                    rendered = f.read()
+
+                http_ms, http_mb = measure(parse_statement_data, page, args.repeat)
+                selenium_ms, selenium_mb = measure(parse_statement, rendered, args.repeat)
+                line = f'{ticker + " " + statement:<28}{http_ms:>11.2f} ms{selenium_ms:>13.2f} ms{http_mb:>10.2f}{selenium_mb:>13.2f}'
+                load_ms = 0
+                if driver:
+                    load_ms, _ = measure(load_in_browser(driver), paths[(ticker, statement + '.rendered')], 3)
+                    line += f'{load_ms:>12.0f} ms'
+                totals += [http_ms, selenium_ms, load_ms]
+                print(line)
+    finally:
+        if driver:
+            driver.close()
+
+    print(f'total per ticker: http {totals[0] / len(args.tickers):.2f} ms, selenium parse {totals[1] / len(args.tickers):.2f} ms'
+          + (f', selenium load {totals[2] / len(args.tickers):.0f} ms' if driver else ''))
@@ -0,0 +1,114 @@
+import argparse
+import os
+import tempfile
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+import src.fetch
+from benchmarks.fixtures import serve, statement_page, write_fixtures
+from src.bonds import set_bond_index
+from src.makeTemplate import make_template
+from src.ratelimit import HostRateLimiter
+from src.statements import parse_statement_data
+from src.store import STATEMENTS, SnapshotStore, set_store
+from src.trace import Tracer, set_tracer
+
+# checks that a DCF can be made again from the snapshot store (see src.store) without any requests, and times loading
+# the statements of thousands of tickers from the store against parsing them from their pages. run from the
+# repository root with "python -m benchmarks.store"
+
+RFR, MRP, TERMINAL_GROWTH, FORECAST_YEARS, MIN_TAX_RATE = 0.04, 0.055, 0.018050372, 5, 0.2
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+# whether the values of the frame are read straight from a memory-mapped file
+def is_mapped(df):
+    base = df.to_numpy()
+    while base is not None and not isinstance(base, np.memmap):
+        base = base.base
+    return base is not None
+
+
+# makes the same DCF by scraping the fixture server and then from the snapshot it saved, counting the requests of each
+def rebuild(directory, peers, workers):
+    tickers = [f'T{i:03d}' for i in range(peers + 1)]
+    write_fixtures(tickers)
+    results = {}
+    with serve():
+        for snapshot in [None, 'latest']:
+            tracer = Tracer()
+            set_tracer(tracer)
+            try:
+                elapsed, valuation = timed(make_template, tickers[0], tickers[1:], RFR, MRP, TERMINAL_GROWTH, FORECAST_YEARS, MIN_TAX_RATE,
+                                           outfile=os.path.join(directory, f'{snapshot}.xlsx'), workers=workers, keep_inputs=False,
+                                           snapshot=snapshot)
+            finally:
+                set_tracer(None)
+            results[snapshot] = elapsed, sum(s.name == 'fetch' for s in tracer.spans), float(valuation['value_per_share'][0])
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tickers', '-t', type=int, default=2000, help='The number of tickers whose statements are loaded at once')
+    parser.add_argument('--peers', '-p', type=int, default=10)
+    parser.add_argument('--workers', '-w', type=int, default=4)
+    args = parser.parse_args()
+
+    # the scrapers use arguments newer versions of beautifulsoup warn about on every call
+    warnings.simplefilter('ignore', DeprecationWarning)
+    src.fetch.set_cache(None)
+    set_bond_index(None)
+    src.fetch.limiter = HostRateLimiter(default_rate=(1e9, 10 ** 9))
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = SnapshotStore(os.path.join(directory, 'snapshots'))
+        set_store(store)
+
+        results = rebuild(directory, args.peers, args.workers)
+        (scraped, scraped_fetches, scraped_value), (loaded, loaded_fetches, loaded_value) = results[None], results['latest']
+        assert loaded_fetches == 0, f'making the DCF from its snapshot still made {loaded_fetches} requests'
+        assert abs(loaded_value - scraped_value) < 1e-9
+        print(f'make_template with {args.peers} peers: {scraped:.2f}s and {scraped_fetches} requests when scraped, '
+              f'{loaded:.2f}s and {loaded_fetches} requests from the snapshot')
+
+        # the statements of many tickers, parsed from their pages once and saved
+        tickers = [f'S{i:05d}' for i in range(args.tickers)]
+        pages = {s: statement_page('S00000', s) for s in STATEMENTS}
+        frames = {s: parse_statement_data(page) for s, page in pages.items()}
+        for t in tickers:
+            for s in STATEMENTS:
+                store.put_frame(t, s, frames[s], date='2024-01-01')
+
+        parse_time, _ = timed(lambda: [parse_statement_data(pages[s]) for s in STATEMENTS for _ in range(min(200, len(tickers)))])
+        parse_time *= len(tickers) / min(200, len(tickers))
+        load_time, loaded = timed(lambda: {s: store.get_frames(tickers, s) for s in STATEMENTS})
+        mapped_time, mapped = timed(lambda: {s: store.get_frames(tickers, s, mmap=True) for s in STATEMENTS})
+
+        assert all(len(loaded[s]) == len(tickers) for s in STATEMENTS)
+        assert all(is_mapped(mapped[s][t]) and not is_mapped(loaded[s][t]) for s in STATEMENTS for t in tickers[:10])
+        assert all(mapped[s][t].equals(frames[s]) and loaded[s][t].equals(frames[s]) for s in STATEMENTS for t in tickers[:10])
+
+        print(f'loading the statements of {len(tickers)} tickers:')
+        for name, seconds in [('parsed from their pages (estimated)', parse_time), ('loaded from the store', load_time),
+                              ('all memory-mapped from the store', mapped_time)]:
+            print(f'  {name:<38}{seconds:>8.2f}s{len(tickers) / seconds:>10.0f} tickers/s')
+
+        # a table too large to read every time it is loaded, like the stacked history of many tickers
+        large = pd.DataFrame(np.random.default_rng(0).normal(size=(200_000, 16)), columns=[f'c{i}' for i in range(16)])
+        store.put_frame('LARGE', 'history', large, date='2024-01-01')
+        # the first load parses the labels, which later loads share
+        store.get_frame('LARGE', 'history')
+        mapped_time, mapped = min((timed(store.get_frame, 'LARGE', 'history') for _ in range(5)), key=lambda r: r[0])
+        read_time, read = min((timed(store.get_frame, 'LARGE', 'history', mmap=False) for _ in range(5)), key=lambda r: r[0])
+        assert is_mapped(mapped) and np.array_equal(mapped.to_numpy(), large.to_numpy()) and read.equals(mapped)
+        print(f'loading a table of {large.size * 8 / 1e6:.0f} MB: {read_time * 1000:.1f} ms read, {mapped_time * 1000:.1f} ms memory-mapped')
+    set_store(None)
@@ -0,0 +1,132 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import warnings
+
+import numpy as np
+
+import src.fetch
+from benchmarks.fixtures import serve, write_fixtures
+from src.batch import make_batch
+from src.bonds import set_bond_index
+from src.ratelimit import HostRateLimiter
+from src.store import set_store
+from src.stream import current_rss_mb, make_stream, peak_rss_mb
+
+# compares making the templates of a universe of tickers one after another (see src.batch.make_batch) with making
+# them as a stream (see src.stream), against fixture pages served from a local http server. every ticker has its own
+# peers, drawn from the rest of the universe. each run is made in a fresh process, since a process' peak RSS never goes
+# down, and the resident memory is sampled through the run to see whether it stays flat. the batch keeps every peer
+# it scrapes, while the stream only keeps the most recently used ones. the stream is then run again under
+# a memory budget below what it used, which must hold tickers back without changing the values. run from the
+# repository root with "python -m benchmarks.stream"
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RFR, MRP, TERMINAL_GROWTH, FORECAST_YEARS, MIN_TAX_RATE = 0.04, 0.055, 0.018050372, 5, 0.2
+
+
+def universe(tickers, peers):
+    rng = np.random.default_rng(0)
+    names = [f'U{i:04d}' for i in range(tickers)]
+    return [(t, [names[j] for j in rng.choice(np.delete(np.arange(tickers), i), peers, replace=False)]) for i, t in enumerate(names)]
+
+
+# samples the resident memory of the process every "interval" seconds until it is stopped
+class Sampler(threading.Thread):
+    def __init__(self, interval=0.05):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.samples = []
+        self.done = threading.Event()
+
+    def run(self):
+        while not self.done.wait(self.interval):
+            self.samples.append(current_rss_mb())
+
+
+def run(mode, tickers, peers, directory, output_format, queue_size, memory_budget, latency, peer_entries):
+    src.fetch.set_cache(None)
+    set_store(None)
+    set_bond_index(None)
+    src.fetch.limiter = HostRateLimiter(default_rate=(1e9, 10 ** 9))
+    jobs = universe(tickers, peers)
+    baseline = current_rss_mb()
+
+    sampler = Sampler()
+    with serve(latency=latency):
+        sampler.start()
+        if mode == 'batch':
+            summary = make_batch(jobs, RFR, MRP, TERMINAL_GROWTH, FORECAST_YEARS, MIN_TAX_RATE, output_dir=directory, output_format=output_format)
+        else:
+            summary = make_stream(jobs, RFR, MRP, TERMINAL_GROWTH, FORECAST_YEARS, MIN_TAX_RATE, output_dir=directory, output_format=output_format,
+                                  queue_size=queue_size, memory_budget=memory_budget, peer_entries=peer_entries)
+        sampler.done.set()
+        sampler.join()
+
+    # how much the memory grew from the first quarter of the run to the last, once everything was imported and warm
+    quarter = max(1, len(sampler.samples) // 4)
+    return {
+        'seconds': summary['seconds'],
+        'tickers_per_minute': summary['tickers_per_minute'],
+        'failed': summary['failed'],
+        'values': summary['values'],
+        'baseline_rss_mb': baseline,
+        'peak_rss_mb': peak_rss_mb(),
+        'growth_mb': float(np.median(sampler.samples[-quarter:]) - np.median(sampler.samples[:quarter])),
+        'throttled_seconds': summary.get('throttled_seconds', 0.),
+    }
+
+
+def measure(mode, tickers, peers, output_format, queue_size, latency, peer_entries, memory_budget=None):
+    command = [sys.executable, '-W', 'ignore', '-m', 'benchmarks.stream', '--child', mode, '--tickers', str(tickers), '--peers', str(peers),
+               '--format', output_format, '--queue_size', str(queue_size), '--latency', str(latency), '--peer_entries', str(peer_entries)]
+    if memory_budget is not None:
+        command += ['--memory_budget', str(memory_budget)]
+    result = subprocess.run(command, cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tickers', '-t', type=int, default=200)
+    parser.add_argument('--peers', '-p', type=int, default=10)
+    parser.add_argument('--format', type=str, default='xlsx')
+    parser.add_argument('--queue_size', type=int, default=2)
+    parser.add_argument('--latency', '-l', type=float, default=0.01, help='The seconds the server waits before sending every page')
+    parser.add_argument('--peer_entries', type=int, default=100, help='The most peer scrapes the stream keeps for the tickers after them')
+    parser.add_argument('--memory_budget', type=float, help=argparse.SUPPRESS)
+    parser.add_argument('--child', type=str, choices=['batch', 'stream'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        # the scrapers use arguments newer versions of beautifulsoup warn about on every call
+        warnings.simplefilter('ignore', DeprecationWarning)
+        with tempfile.TemporaryDirectory() as directory:
+            print(json.dumps(run(args.child, args.tickers, args.peers, directory, args.format, args.queue_size, args.memory_budget, args.latency, args.peer_entries)))
+        raise SystemExit
+
+    write_fixtures([t for t, _ in universe(args.tickers, args.peers)])
+    print(f"{args.tickers} tickers with {args.peers} peers each, saved as {args.format}, pages sent after {args.latency * 1000:.0f} ms, "
+          f"the stream keeping {args.peer_entries} peer scrapes")
+    print(f"  {'mode':<32}{'seconds':>9}{'tickers/min':>13}{'baseline MB':>13}{'peak RSS MB':>13}{'growth MB':>11}{'held back s':>13}")
+    results = {}
+    for name, mode, budget in [('one after another', 'batch', None), ('stream', 'stream', None), ('stream under a budget', 'stream', 'below')]:
+        if budget == 'below':
+            # a budget the stream goes over, so it has to hold tickers back
+            budget = round(results['stream']['peak_rss_mb'] - 10)
+            name = f'{name} ({budget} MB)'
+        r = results[name if budget is None else 'budget'] = measure(mode, args.tickers, args.peers, args.format, args.queue_size, args.latency, args.peer_entries, budget)
+        print(f"  {name:<32}{r['seconds']:>9.1f}{r['tickers_per_minute']:>13.1f}{r['baseline_rss_mb']:>13.1f}{r['peak_rss_mb']:>13.1f}"
+              f"{r['growth_mb']:>11.1f}{r['throttled_seconds']:>13.1f}")
+
+    batch, stream, budget = results['one after another'], results['stream'], results['budget']
+    # every run values every ticker the same, in the same order
+    for r in [batch, stream, budget]:
+        assert not r['failed'], r['failed']
+        assert list(r['values'].items()) == list(batch['values'].items())
+    assert budget['throttled_seconds'] > 0
+    print('the stream and the budgeted stream value every ticker like the batch: ok')
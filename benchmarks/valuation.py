@@ -0,0 +1,69 @@
+import argparse
+import time
+
+import numpy as np
+
+from src.valuation import value
+
+# times valuing and ranking a universe of random companies at once (see src.valuation.value). the results are checked
+# against the formulas of the DCF sheet in tests/test_valuation.py. run from the repository root with
+# "python -m benchmarks.valuation"
+
+
+# a universe of random but plausible companies, each with "n_peers" peers, some of which are missing values
+def random_universe(n, n_peers, seed=0):
+    rng = np.random.default_rng(seed)
+    market_cap = rng.lognormal(16, 2, n)
+    total_debt = market_cap * rng.uniform(0, 1.5, n)
+    inputs = {
+        'revenue_actual': market_cap * rng.uniform(0.1, 2, n),
+        'ebit_margin': rng.normal(0.15, 0.1, n),
+        'depr_amort_pct': rng.uniform(0, 0.1, n),
+        'capex_pct': rng.uniform(0, 0.12, n),
+        'nwc_pct': rng.normal(0, 0.02, n),
+        'growth_rate_1': rng.normal(0.06, 0.05, n),
+        'growth_rate_2': rng.normal(0.05, 0.05, n),
+        'growth_rate_f': rng.normal(0.04, 0.03, n),
+    }
+    company = {
+        'Market Cap': market_cap,
+        'Total Debt': total_debt,
+        'Cash and Equivalents': market_cap * rng.uniform(0, 0.3, n),
+        'Debt/Equity': total_debt / market_cap,
+        'Bond Spread (10Y)': rng.uniform(0.005, 0.03, n),
+        'Bond Spread (30Y)': np.where(rng.random(n) < 0.5, np.nan, rng.uniform(0.005, 0.04, n)),
+        'Shares Outstanding': market_cap / rng.uniform(5, 500, n),
+        'LTM Earnings': market_cap / rng.uniform(5, 60, n),
+        'LTM Sales': market_cap / rng.uniform(0.5, 10, n),
+        'LTM EBITDA': market_cap / rng.uniform(3, 30, n),
+    }
+    missing = rng.random((n, n_peers)) < 0.1
+    peers = {
+        'Unlevered Beta': np.where(missing, np.nan, rng.uniform(0.3, 2, (n, n_peers))),
+        'P/E Ratio': np.where(missing, np.nan, np.maximum(rng.normal(20, 10, (n, n_peers)), 0)),
+        'EV/Sales': np.where(missing, np.nan, rng.uniform(0.5, 10, (n, n_peers))),
+        'EV/EBITDA': np.where(missing, np.nan, rng.uniform(3, 30, (n, n_peers))),
+    }
+    return inputs, company, peers
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--companies', '-n', type=int, default=10000)
+    parser.add_argument('--peers', '-p', type=int, default=20)
+    parser.add_argument('--forecast_years', '-fy', type=int, default=5)
+    parser.add_argument('--repeat', '-r', type=int, default=20)
+    args = parser.parse_args()
+
+    inputs, company, peers = random_universe(args.companies, args.peers)
+    tax_rate, rfr, mrp, terminal_growth = 0.21, 0.04, 0.055, 0.018050372
+
+    times = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        result = value(inputs, company, peers, tax_rate, rfr, mrp, terminal_growth, args.forecast_years)
+        ranking = np.argsort(-np.nan_to_num(result['value_per_share'], nan=-np.inf))
+        times.append(time.perf_counter() - start)
+    times = np.array(times) * 1000
+    print(f'valued and ranked {args.companies} companies with {args.peers} peers each: '
+          f'median {np.median(times):.2f} ms, min {times.min():.2f} ms ({args.companies / np.median(times) * 1000:,.0f} companies/s)')
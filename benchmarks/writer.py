@@ -0,0 +1,115 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.fixtures import STATEMENTS, statement_page
+from src.bonds import set_bond_index
+from src.inputs import column_from_json
+from src.makeTemplate import make_dcf, make_financials, make_peers
+from src.montecarlo import make_simulation, simulate
+from src.statements import parse_statement_data
+from src.store import set_store
+from src.workbook import formats, open_workbook
+
+# compares the peak memory (RSS) and time of writing workbooks in xlsxwriter's default mode, which keeps every cell
+# until the workbook is closed, with its constant memory mode (see src.workbook). each measurement runs in a fresh
+# process, since a process' peak RSS never goes down. run from the repository root with "python -m benchmarks.writer"
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RFR, MRP, TERMINAL_GROWTH, FORECAST_YEARS, MIN_TAX_RATE = 0.04, 0.055, 0.018050372, 5, 0.2
+
+
+# random scraped values for every peer, with a long summary like the ones on yahoo's profile pages
+class SyntheticPeerData:
+    def peer(self, ticker):
+        rng = np.random.default_rng(int(ticker[1:]))
+        return {
+            'Peer': f'{ticker} Inc. ({ticker})', 'Share Price': rng.uniform(5, 500), 'Equity Beta': rng.uniform(0.5, 2),
+            'Shares Outstanding': rng.uniform(1e4, 1e7), 'Profit Margin': rng.uniform(-0.1, 0.4), 'Operating Margin': rng.uniform(0, 0.4),
+            'Return on Assets': rng.uniform(0, 0.2), 'Return on Equity': rng.uniform(0, 0.4), 'Revenue Growth (1Y)': rng.normal(0.05, 0.1),
+            'Earnings Growth (1Y)': rng.normal(0.05, 0.2), 'LTM Sales': rng.uniform(1e5, 1e8), 'LTM EBITDA': rng.uniform(1e4, 1e7),
+            'LTM Earnings': rng.uniform(1e3, 1e6), 'Cash and Equivalents': rng.uniform(1e3, 1e7), 'Total Debt': rng.uniform(1e3, 1e7),
+            'Bond Spread (10Y)': rng.uniform(0.005, 0.03), 'Bond Spread (30Y)': rng.uniform(0.01, 0.04), 'Bond Rating (S&P)': 'A',
+        }
+
+    def summary(self, ticker):
+        return column_from_json({'Peer': f'{ticker} Inc. ({ticker})', 'Sector': 'Technology', 'Industry': 'Software',
+                                 'Employees': '12,000', 'Summary': f'{ticker} Inc. designs, makes and sells things. ' * 25,
+                                 'Link': f'https://finance.yahoo.com/quote/{ticker}'})
+
+
+# writes "books" workbooks with "peers" peers each, returning the seconds spent and the peak RSS (in MB) of the process
+def write_books(directory, constant_memory, peers, books, simulations):
+    set_store(None)
+    set_bond_index(None)
+    dfs = {s: parse_statement_data(statement_page('T0000', s)) for s in STATEMENTS}
+    # the estimates are the only inputs read from a page the fixtures don't parse offline
+    inputs = {'revenue_actual': 1e6, 'ebit_actual': 1.5e5, 'ebit_margin': 0.15, 'depr_amort_pct': 0.03, 'capex_pct': 0.04, 'nwc_pct': 0.01,
+              'growth_rate_1': 0.08, 'growth_rate_2': 0.06, 'growth_rate_f': 0.04}
+    peer_data = SyntheticPeerData()
+    tickers = [f'T{i:04d}' for i in range(1, peers + 1)]
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    start = time.perf_counter()
+    close_seconds = 0.
+    sizes, format_counts = [], []
+    for i in range(books):
+        path = os.path.join(directory, f'{i}.xlsx')
+        book = open_workbook(path, constant_memory)
+        statements, tax_rate = make_financials('T0000', book, None, MIN_TAX_RATE, dfs=dfs)
+        make_peers('T0000', tickers, tax_rate, statements, book, peer_data=peer_data)
+        make_dcf(statements, 'T0000', tickers, tax_rate, RFR, MRP, TERMINAL_GROWTH, FORECAST_YEARS, book, inputs)
+        if simulations:
+            make_simulation(simulate(inputs, 0.09, tax_rate, TERMINAL_GROWTH, FORECAST_YEARS, 1e6, 1e5, 1e5, simulations), book)
+        format_counts.append(formats.count(book))
+        closing = time.perf_counter()
+        book.close()
+        close_seconds += time.perf_counter() - closing
+        sizes.append(os.path.getsize(path))
+    return {
+        'seconds': time.perf_counter() - start,
+        'close_seconds': close_seconds,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'baseline_rss_mb': baseline,
+        'file_kb': float(np.mean(sizes)) / 1000,
+        'formats': max(format_counts),
+    }
+
+
+def measure(constant_memory, peers, books, simulations):
+    command = [sys.executable, '-m', 'benchmarks.writer', '--child', '--peers', str(peers), '--books', str(books), '--simulations', str(simulations)]
+    if constant_memory:
+        command.append('--constant_memory')
+    result = subprocess.run(command, cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--peers', '-p', type=int, nargs='+', default=[100, 500])
+    parser.add_argument('--books', '-b', type=int, default=1, help='The number of workbooks written one after another in one process')
+    parser.add_argument('--simulations', '-s', type=int, default=0)
+    parser.add_argument('--constant_memory', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        with tempfile.TemporaryDirectory() as directory:
+            print(json.dumps(write_books(directory, args.constant_memory, args.peers[0], args.books, args.simulations)))
+        raise SystemExit
+
+    # the seconds include building the peer rows (see "get_peer"), which is the same in both modes, while closing the
+    # workbook is where the default mode writes out the cells it kept
+    print(f"{'peers':>6}{'books':>6}  {'mode':<16}{'seconds':>9}{'close s':>9}{'peak RSS MB':>13}{'above baseline':>16}{'file KB':>9}{'formats':>9}")
+    for peers in args.peers:
+        for constant_memory in [False, True]:
+            r = measure(constant_memory, peers, args.books, args.simulations)
+            print(f"{peers:>6}{args.books:>6}  {'constant memory' if constant_memory else 'default':<16}{r['seconds']:>9.2f}{r['close_seconds']:>9.2f}{r['peak_rss_mb']:>13.1f}"
+                  f"{r['peak_rss_mb'] - r['baseline_rss_mb']:>16.1f}{r['file_kb']:>9.0f}{r['formats']:>9}")
@@ -0,0 +1 @@
+# makes the repository root importable, so the tests under tests/ can import "src" however pytest is started
@@ -1,9 +1,8 @@
 import argparse
-import requests
-from bs4 import BeautifulSoup
-from time import sleep
 
-from src.makeTemplate import make_template, headers
+from src.cli import add_fetch_args, close_tracer, configure, fill_market_values, report_cache
+from src.makeTemplate import get_risk_free_rate, make_template
+from src.output import FORMATS
 
 
 if __name__ == '__main__':
@@ -12,28 +11,35 @@ if __name__ == '__main__':
     parser.add_argument('ticker', type=str, help='The stock ticker to create a DCF for')
     parser.add_argument('--generate_peers', '-gp', help='Set this flag to automatically create a list of peers. If this is not set, you must pass a list of peers using the -p flag', action='store_true')
     parser.add_argument('--peers', '-p', help='Set a list of peers to compare the given ticker to. Must be set if --generate_peers is not set.', type=str, nargs='+')
-    parser.add_argument('--risk_free_rate', '-rfr', help='Set the risk-free rate for cost of capital calculations. Defaults to the current 10Y American Treasury yield.', type=float)
-    parser.add_argument('--market_risk_premium', '-mrp', help='Set the market risk premium for cost of capital calculations as a decimal. Defaults to the most recent American average MRP as given by Statista ~0.055.', type=float, default=0.055)
-    parser.add_argument('--terminal_growth', '-tg', help='Set the terminal growth rate in the DCF model as a decimal. Defaults to PricewaterhouseCoopers 50Y projected American GDP annual growth rate ~0.0181.', type=float, default=0.018050372)
+    parser.add_argument('--risk_free_rate', '-rfr', help='Set the risk-free rate for cost of capital calculations. Defaults to the current 10Y American Treasury yield, which is downloaded at most once an hour and shared by every run.', type=float)
+    parser.add_argument('--market_risk_premium', '-mrp', help='Set the market risk premium for cost of capital calculations as a decimal. Defaults to the most recent American average MRP as given by Statista ~0.055 (the "mrp" value of the market data, see --market_data).', type=float)
+    parser.add_argument('--terminal_growth', '-tg', help='Set the terminal growth rate in the DCF model as a decimal. Defaults to PricewaterhouseCoopers 50Y projected American GDP annual growth rate ~0.0181 (the "terminal_growth" value of the market data, see --market_data).', type=float)
     parser.add_argument('--forecast_years', '-fy', help='Set how many years to make projections for in the DCF mode as a decimal. Defaults to 5 years.', type=int, default=5)
     parser.add_argument('--min_tax_rate', '-tr', help='Set the minimum tax rate for a company as a decimal. Tax rate is typically calculated by the program, but the calculated value will not be used if it is below the minimum. Defaults to 0.2.', type=float, default=0.2)
-    parser.add_argument('--output', '-o', help='Set the filename to save the DCF in. Must be an .xlsx file.', type=str)
+    parser.add_argument('--output', '-o', help='Set the filename to save the DCF in. Must use the extension of the --format (.xlsx by default).', type=str)
+    parser.add_argument('--simulations', '-s', help='Set how many Monte Carlo paths of the DCF model to run. The distribution of the equity value per share is written to a "Simulation" sheet. Defaults to 0 (no simulation).', type=int, default=0)
+    parser.add_argument('--statement_backend', '-sb', help='Set how financial statements are retrieved. "http" reads the data embedded in the statement pages and only launches a browser if that fails, "selenium" always renders the pages in a browser. Defaults to "http".', type=str, choices=['http', 'selenium'], default='http')
+    parser.add_argument('--format', help='Set the format to save the DCF in. "xlsx" makes a workbook of formulas, while "json", "csv" (one row per value) and "npz" (NumPy arrays of float64 columns) save the parsed statements, the peer table, the inputs of the DCF, its cost of capital and its computed values without making a workbook. Defaults to "xlsx".', type=str, choices=list(FORMATS), default='xlsx')
+    parser.add_argument('--constant_memory', help='Set this flag to write the workbook one row at a time instead of keeping every cell in memory until it is saved. The workbook is somewhat larger, since text is stored in each cell instead of once per workbook.', action='store_true')
+    parser.add_argument('--workers', '-w', help='Set how many peers are scraped at the same time. Defaults to 4.', type=int, default=4)
+    parser.add_argument('--peer_fan_out', help='Set the most peers that are generated from any one ticker when --generate_peers is set. Defaults to 10.', type=int, default=10)
+    parser.add_argument('--max_peers', help='Set the most peers that are generated in total when --generate_peers is set. Defaults to 30.', type=int, default=30)
+    add_fetch_args(parser)
 
     args = parser.parse_args().__dict__
 
     if args['generate_peers'] is None and args['peers'] is None:
         raise ValueError('Please either set the --generate_peers flag or pass a list of peers using the --peers flag (pass the -h flag for help).')
-    if args['output'] is not None and not args['output'].endswith('.xlsx'):
-        raise ValueError('Output file must use a .xlsx extension.')
+    if args['output'] is not None and not args['output'].endswith(FORMATS[args['format']]):
+        raise ValueError(f"Output file must use a {FORMATS[args['format']]} extension.")
+
+    configure(args)
 
     if args['risk_free_rate'] is None:
-        url = f'https://finance.yahoo.com/quote/%5ETNX'
-        res = requests.get(url, headers=headers)
-        soup = BeautifulSoup(res.text, features='lxml')
-        sleep(1)
-        args['risk_free_rate'] = float(soup.find('fin-streamer', {'data-test': 'qsp-price'}).text) / 100
+        args['risk_free_rate'] = get_risk_free_rate()
+    fill_market_values(args)
 
-    make_template(
+    valuation = make_template(
         args['ticker'],
         [] if not args['peers'] else args['peers'],
         args['risk_free_rate'],
@@ -42,5 +48,21 @@ if __name__ == '__main__':
         args['forecast_years'],
         args['min_tax_rate'],
         0 if not args['generate_peers'] else 2,
-        None if not args['output'] else args['output']
+        None if not args['output'] else args['output'],
+        args['workers'],
+        simulations=args['simulations'],
+        statement_backend=args['statement_backend'],
+        peer_fan_out=args['peer_fan_out'],
+        max_peers=args['max_peers'],
+        snapshot=args['snapshot'],
+        constant_memory=args['constant_memory'],
+        output_format=args['format']
     )
+    print(f"DCF equity value per share: {valuation['value_per_share'][0]:,.2f}")
+    if 'simulation' in valuation:
+        percentiles = valuation['simulation']['percentiles']
+        print(f"Simulated equity value per share: 5th percentile {percentiles[5]:,.2f}, median {percentiles[50]:,.2f}, 95th percentile {percentiles[95]:,.2f}")
+
+    report_cache()
+
+    close_tracer(args)
@@ -0,0 +1,44 @@
+import argparse
+
+from src.cli import add_fetch_args, close_tracer, configure, report_cache
+from src.makeTemplate import get_risk_free_rate
+from src.refresh import read_watchlist, run_schedule
+
+
+# prints the summary of one refresh of the watchlist
+def report(summary):
+    print(f"Refreshed {len(summary['values'])} DCFs with the share prices of {summary['prices']} of {summary['tickers']} tickers in {summary['seconds']:.1f}s")
+    for path, value in summary['values'].items():
+        print(f'  {path}: DCF equity value per share {value:,.2f}')
+    if summary['failed']:
+        print(f"Failed: {' '.join(summary['failed'])}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('workbooks', type=str, nargs='*', help='The DCFs to refresh, given by their workbook or by the .inputs.json file saved next to it')
+    parser.add_argument('--watchlist', '-f', help='Read the DCFs to refresh from a file with one workbook per line.', type=str)
+    parser.add_argument('--risk_free_rate', '-rfr', help='Set the risk-free rate for cost of capital calculations. Defaults to the rate each DCF was made with.', type=float)
+    parser.add_argument('--update_risk_free_rate', help='Set this flag to use the current 10Y American Treasury yield as the risk-free rate. It is downloaded at most once an hour and shared by every run.', action='store_true')
+    parser.add_argument('--every', '-e', help='Set how many minutes to wait between refreshes, to keep refreshing the DCFs until the program is stopped. Defaults to refreshing once.', type=float)
+    parser.add_argument('--workers', '-w', help='Set how many share prices are downloaded at the same time. Defaults to 4.', type=int, default=4)
+    add_fetch_args(parser, snapshots=False, read_snapshots=False, trace_summary=False)
+
+    args = parser.parse_args().__dict__
+
+    paths = list(args['workbooks'])
+    if args['watchlist'] is not None:
+        paths += read_watchlist(args['watchlist'])
+    if not paths:
+        raise ValueError('Please pass at least one workbook, either as an argument or using the --watchlist flag (pass the -h flag for help).')
+
+    configure(args)
+
+    if args['update_risk_free_rate']:
+        args['risk_free_rate'] = get_risk_free_rate()
+
+    run_schedule(paths, 60 * (args['every'] or 0), None if args['every'] else 1, args['risk_free_rate'], args['workers'], report)
+
+    report_cache()
+    close_tracer(args)
@@ -0,0 +1,46 @@
+import argparse
+import asyncio
+import json
+import signal
+
+from src.cli import add_fetch_args, close_tracer, configure, fill_market_values
+from src.service import ValuationService
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--host', help='Set the address to listen on. Defaults to 127.0.0.1 (this machine only).', type=str, default='127.0.0.1')
+    parser.add_argument('--port', help='Set the port to listen on. Defaults to 8750.', type=int, default=8750)
+    parser.add_argument('--risk_free_rate', '-rfr', help='Set the risk-free rate for cost of capital calculations. Defaults to the current 10Y American Treasury yield, which is looked up again every --ttl seconds (and downloaded at most once an hour, see --market_data). A request can override it with "?rfr=".', type=float)
+    parser.add_argument('--market_risk_premium', '-mrp', help='Set the default market risk premium for cost of capital calculations as a decimal. Defaults to the most recent American average MRP as given by Statista ~0.055 (the "mrp" value of the market data, see --market_data).', type=float)
+    parser.add_argument('--terminal_growth', '-tg', help='Set the default terminal growth rate in the DCF model as a decimal. Defaults to PricewaterhouseCoopers 50Y projected American GDP annual growth rate ~0.0181 (the "terminal_growth" value of the market data, see --market_data).', type=float)
+    parser.add_argument('--forecast_years', '-fy', help='Set the default number of years to make projections for in the DCF model. Defaults to 5 years.', type=int, default=5)
+    parser.add_argument('--min_tax_rate', '-tr', help='Set the minimum tax rate for a company as a decimal. Defaults to 0.2.', type=float, default=0.2)
+    parser.add_argument('--statement_backend', '-sb', help='Set how financial statements are retrieved. "http" reads the data embedded in the statement pages and only launches a browser if that fails, "selenium" always renders the pages in a browser. Defaults to "http".', type=str, choices=['http', 'selenium'], default='http')
+    parser.add_argument('--threads', help='Set how many requests are worked on at the same time. Defaults to 4.', type=int, default=4)
+    parser.add_argument('--workers', '-w', help='Set how many peers each request scrapes at the same time. Defaults to 4.', type=int, default=4)
+    parser.add_argument('--max_pending', help='Set the most distinct requests that may be queued or worked on at once. Requests beyond it are answered with "503 Service Unavailable" and a Retry-After header. Defaults to 32.', type=int, default=32)
+    parser.add_argument('--ttl', help='Set how many seconds parsed statements, estimates and peer data are kept in memory between requests. Defaults to 900 (15 minutes, as long as quotes are cached for).', type=float, default=900)
+    parser.add_argument('--peer_fan_out', help='Set the most peers that are generated from any one ticker when a request sets "generate_peers". Defaults to 10.', type=int, default=10)
+    parser.add_argument('--max_peers', help='Set the most peers that are generated in total when a request sets "generate_peers". Defaults to 30.', type=int, default=30)
+    add_fetch_args(parser, read_snapshots=False, trace_summary=False)
+
+    args = parser.parse_args().__dict__
+
+    configure(args)
+    fill_market_values(args)
+
+    service = ValuationService(args['risk_free_rate'], args['market_risk_premium'], args['terminal_growth'], args['forecast_years'],
+                               args['min_tax_rate'], args['workers'], args['threads'], args['max_pending'], args['ttl'],
+                               args['statement_backend'], args['peer_fan_out'], args['max_peers'])
+    # stop the same way on "kill" as on Ctrl-C, so the stats are still printed
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        asyncio.run(service.serve(args['host'], args['port'], ready=lambda address: print(f'Serving DCFs on http://{address[0]}:{address[1]}')))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+        print(json.dumps(service.stats.summary(), indent=2))
+        close_tracer(args)
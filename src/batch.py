@@ -0,0 +1,124 @@
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import Future
+
+from src.makeTemplate import LazyChrome, get_peer_data, get_summary, make_template
+from src.output import output_file
+from src.peers import FAN_OUT, MAX_PEERS
+from src.store import SnapshotPeerData, get_store
+
+
+# shares peer scrapes between every model built in one run. only the raw scraped data is kept, since the values
+# derived from it depend on the tax rate and statements of the company being valued. a ticker requested by several
+# threads at once is only scraped by the first one, and the others wait for its result. if a "source" is given (e.g.
+# src.store.SnapshotPeerData), peers are read through it instead of being scraped. if "max_entries" is set, at most
+# that many peers (and summaries) are kept, dropping the ones least recently used, so a run over a whole universe
+# doesn't keep every peer it ever scraped
+class PeerData:
+    def __init__(self, source=None, max_entries=None):
+        self.source = source
+        self.max_entries = max_entries
+        self.fetches = 0
+        self.reuses = 0
+        self.prefetched = 0
+        self._peers = {}
+        self._summaries = {}
+        self._lock = threading.Lock()
+
+    def peer(self, ticker):
+        return self._get(self._peers, ticker, get_peer_data if self.source is None else self.source.peer)
+
+    def summary(self, ticker):
+        return self._get(self._summaries, ticker, get_summary if self.source is None else self.source.summary)
+
+    # scrapes a peer and its summary ahead of the model that needs them (see src.stream), so that model reading them
+    # is not another model sharing them. scrapes that fail are not kept, so they are tried again (and reported) by it
+    def prefetch(self, ticker):
+        for get in [self.peer, self.summary]:
+            try:
+                get(ticker)
+            except Exception:
+                continue
+            with self._lock:
+                self.prefetched += 1
+
+    def _get(self, store, ticker, scrape):
+        with self._lock:
+            future = store.get(ticker)
+            owner = future is None
+            if owner:
+                future = store[ticker] = Future()
+                self.fetches += 1
+                if self.max_entries is not None:
+                    self._evict(store)
+            else:
+                self.reuses += 1
+                # dicts keep their order, so moving the ticker to the end keeps the least recently used ones first
+                store[ticker] = store.pop(ticker)
+        if owner:
+            try:
+                future.set_result(scrape(ticker))
+            except Exception as e:
+                future.set_exception(e)
+                # a failed scrape is not kept, so it is tried again by the next model (or retry) that needs the ticker
+                with self._lock:
+                    if store.get(ticker) is future:
+                        del store[ticker]
+        return future.result()
+
+    # drops the least recently used scrapes that are done until "store" is no bigger than "max_entries"
+    def _evict(self, store):
+        for ticker in [t for t, f in store.items() if f.done()][:max(0, len(store) - self.max_entries)]:
+            del store[ticker]
+
+
+# reads a file of tickers to value. every line holds a ticker, optionally followed by its peers, e.g. "AAPL MSFT GOOG"
+def read_ticker_file(path):
+    jobs = []
+    with open(path) as f:
+        for line in f:
+            if line := line.split('#')[0].split():
+                jobs.append((line[0], line[1:]))
+    return jobs
+
+
+# makes a template for every (ticker, peers) pair in "jobs", sharing one browser, one risk-free rate and one set of
+# peer scrapes between all of them. if "snapshot" is set, the scrapes saved on or before it are used instead, and
+# each model is saved in "output_format" (see "make_template"). returns a summary of the run
+def make_batch(jobs, rfr, mrp, terminal_growth, forecast_years, min_tax_rate=0.2, peer_gen_depth=0, output_dir='.', workers=4, simulations=0,
+               statement_backend='http', peer_fan_out=FAN_OUT, max_peers=MAX_PEERS, snapshot=None, constant_memory=False,
+               output_format='xlsx'):
+    os.makedirs(output_dir, exist_ok=True)
+    store = get_store() if snapshot is not None else None
+    peer_data = PeerData(SnapshotPeerData(store, snapshot, get_peer_data, get_summary) if store is not None else None)
+    done, failed, values = [], [], {}
+
+    start = time.perf_counter()
+    driver = LazyChrome()
+    try:
+        for ticker, peers in jobs:
+            outfile = os.path.join(output_dir, output_file(ticker, output_format))
+            try:
+                valuation = make_template(ticker, list(peers), rfr, mrp, terminal_growth, forecast_years, min_tax_rate, peer_gen_depth,
+                                          outfile, workers, driver, peer_data, simulations, statement_backend, peer_fan_out, max_peers,
+                                          snapshot=snapshot, constant_memory=constant_memory, output_format=output_format)
+                values[ticker] = float(valuation['value_per_share'][0])
+                done.append(ticker)
+            except Exception:
+                print(f'Failed to make a DCF for {ticker}:\n{traceback.format_exc()}')
+                failed.append(ticker)
+    finally:
+        driver.close()
+    elapsed = time.perf_counter() - start
+
+    return {
+        'done': done,
+        'failed': failed,
+        'values': values,
+        'seconds': elapsed,
+        'tickers_per_minute': 60 * len(done) / elapsed if elapsed else 0.,
+        'peer_fetches': peer_data.fetches,
+        'peer_fetches_avoided': peer_data.reuses,
+    }
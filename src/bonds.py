@@ -0,0 +1,149 @@
+import os
+import sqlite3
+import threading
+import time
+
+from src.cache import DEFAULT_DIR
+from src.lazy import lazy_import
+from src.store import numeric_frame
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+# the buckets of initial time to maturity the spreads of an issuer's bonds are averaged over, as {tenor: (shortest,
+# longest)} in years of 365 days. the peers sheet shows the 10Y and 30Y buckets
+BUCKETS = {'2Y': (1, 3), '5Y': (4, 6), '10Y': (8, 12), '20Y': (18, 22), '30Y': (28, 32)}
+
+# how long (in seconds) the bonds of an issuer are trusted before its bond page is read again. companies only issue
+# bonds a few times a year, so the index is refreshed on a slow schedule
+MAX_AGE = 30 * 24 * 60 * 60
+
+# the columns of a bond table that are kept in the index
+COLUMNS = ['Coupon', 'Ref Coupon', 'Issue Date', 'Maturity']
+
+
+# the average spread (in percentage points) of the bonds in every bucket, for every issuer at once, as an
+# (issuers, buckets) array with NaN where an issuer has no bond in a bucket. "lengths" are the initial times to
+# maturity of the bonds in days, "spreads" their coupons over their reference coupons, and "issuers" the row of each
+# bond's issuer (every bond is in the first row if it is None)
+def bucket_spreads(lengths, spreads, buckets=BUCKETS, issuers=None, n_issuers=1):
+    lengths = np.asarray(lengths, dtype=np.float64)
+    spreads = np.asarray(spreads, dtype=np.float64)
+    issuers = np.zeros(len(lengths), dtype=np.intp) if issuers is None else np.asarray(issuers, dtype=np.intp)
+    bounds = np.array(list(buckets.values()), dtype=np.float64).reshape(-1, 2) * 365
+
+    # whether each bond is in each bucket, as a (bonds, buckets) mask. bonds without a spread aren't counted
+    inside = (lengths[:, None] >= bounds[:, 0]) & (lengths[:, None] <= bounds[:, 1]) & ~np.isnan(spreads)[:, None]
+    totals = np.zeros((n_issuers, len(bounds)))
+    counts = np.zeros((n_issuers, len(bounds)))
+    np.add.at(totals, issuers, np.where(inside, spreads[:, None], 0.))
+    np.add.at(counts, issuers, inside)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return totals / counts
+
+
+# the average spread of a bond table's bonds in every bucket as a decimal, as {tenor: spread}
+def bond_spreads(bonds, buckets=BUCKETS):
+    lengths = (bonds['Maturity'] - bonds['Issue Date']) / pd.Timedelta(days=1)
+    spreads = bucket_spreads(lengths, bonds['Coupon'] - bonds['Ref Coupon'], buckets)[0] / 100
+    return dict(zip(buckets, spreads.tolist()))
+
+
+# a local index of the bonds of every issuer, so their spreads can be looked up without reading their bond pages. an
+# issuer's bonds are trusted for "max_age" seconds after its bond page was read
+class BondIndex:
+    def __init__(self, path=os.path.join(DEFAULT_DIR, 'bonds.sqlite'), max_age=MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('CREATE TABLE IF NOT EXISTS issuers (ticker TEXT PRIMARY KEY, read REAL, rating TEXT)')
+        # dates are kept as days since 1970
+        self._db.execute('CREATE TABLE IF NOT EXISTS bonds (ticker TEXT, bond TEXT, coupon REAL, ref_coupon REAL, issued REAL, maturity REAL)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS bonds_by_ticker ON bonds (ticker)')
+        self._db.commit()
+
+    def fresh(self, ticker, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            row = self._db.execute('SELECT read FROM issuers WHERE ticker = ?', (ticker,)).fetchone()
+        return row is not None and now - row[0] <= self.max_age
+
+    # returns the bond table (None if the issuer has none) and bond rating of the issuer, or None if its bond page was
+    # never read or its bonds are stale
+    def get(self, ticker, now=None):
+        if not self.fresh(ticker, now):
+            return None
+        with self._lock:
+            rating, = self._db.execute('SELECT rating FROM issuers WHERE ticker = ?', (ticker,)).fetchone()
+            rows = self._db.execute('SELECT bond, coupon, ref_coupon, issued, maturity FROM bonds WHERE ticker = ? ORDER BY rowid',
+                                    (ticker,)).fetchall()
+        return _bond_table(rows) if rows else None, rating
+
+    # replaces the bonds of the issuer with those of its freshly read bond page. "bonds" is None if it has none
+    def put(self, ticker, bonds, rating):
+        rows = []
+        if bonds is not None:
+            values = numeric_frame(bonds[COLUMNS])
+            rows = [(ticker, bond, *(None if np.isnan(v) else v for v in row))
+                    for bond, row in zip(values.index, values.to_numpy(dtype=np.float64).tolist())]
+        with self._lock:
+            self._db.execute('DELETE FROM bonds WHERE ticker = ?', (ticker,))
+            self._db.executemany('INSERT INTO bonds VALUES (?, ?, ?, ?, ?, ?)', rows)
+            self._db.execute('INSERT INTO issuers VALUES (?, ?, ?) ON CONFLICT (ticker) DO UPDATE SET read = excluded.read, rating = excluded.rating',
+                             (ticker, time.time(), rating))
+            self._db.commit()
+
+    # makes the issuer's bond page get read again the next time its bonds are needed
+    def invalidate(self, ticker):
+        with self._lock:
+            self._db.execute('UPDATE issuers SET read = 0 WHERE ticker = ?', (ticker,))
+            self._db.commit()
+
+    # the average spread of every issuer's bonds in every bucket as decimals, as a frame with a row for each of
+    # "tickers" (once) and a column for each bucket. only what is in the index is used (stale bonds included), so the
+    # spreads of any set of peers are looked up without reading a page. tickers without bonds in a bucket have NaN in it
+    def spreads(self, tickers, buckets=BUCKETS):
+        rows = {t: i for i, t in enumerate(dict.fromkeys(tickers))}
+        with self._lock:
+            bonds = self._db.execute(f'SELECT ticker, maturity - issued, coupon - ref_coupon FROM bonds WHERE ticker IN ({",".join("?" * len(rows))})',
+                                     list(rows)).fetchall() if rows else []
+        issuers, lengths, spreads = zip(*bonds) if bonds else ((), (), ())
+        values = bucket_spreads(np.array(lengths, dtype=np.float64), np.array(spreads, dtype=np.float64), buckets,
+                                [rows[t] for t in issuers], len(rows))
+        return pd.DataFrame(values / 100, index=pd.Index(list(rows), dtype=object), columns=list(buckets))
+
+    def stats(self):
+        with self._lock:
+            issuers, = self._db.execute('SELECT COUNT(*) FROM issuers').fetchone()
+            bonds, = self._db.execute('SELECT COUNT(*) FROM bonds').fetchone()
+        return {'issuers': issuers, 'bonds': bonds}
+
+
+def _dates(days):
+    return pd.Timestamp('1970-01-01') + pd.to_timedelta(np.array(days, dtype=np.float64), unit='D')
+
+
+def _bond_table(rows):
+    bonds, coupons, ref_coupons, issued, maturities = zip(*rows)
+    return pd.DataFrame({'Coupon': np.array(coupons, dtype=np.float64), 'Ref Coupon': np.array(ref_coupons, dtype=np.float64),
+                         'Issue Date': _dates(issued), 'Maturity': _dates(maturities)}, index=pd.Index(bonds, dtype=object, name=''))
+
+
+# the index shared by every scrape. like the page cache (see src.fetch), it is created on first use so it can be
+# replaced (or disabled by setting it to None) before anything is read
+_index = ...
+
+
+def get_bond_index():
+    global _index
+    if _index is ...:
+        _index = BondIndex()
+    return _index
+
+
+def set_bond_index(index):
+    global _index
+    _index = index
@@ -0,0 +1,116 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+DEFAULT_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'automatic-dcf')
+
+# how long (in seconds) each type of page stays fresh in the cache. pages that carry a share price go stale
+# within minutes, while statements, profiles and bond tables only change when a company reports or issues debt
+TTLS = {
+    'quote': 15 * 60,
+    'key-statistics': 15 * 60,
+    'analysis': 24 * 60 * 60,
+    'peers': 24 * 60 * 60,
+    'profile': 7 * 24 * 60 * 60,
+    'statement': 7 * 24 * 60 * 60,
+    'statement-data': 7 * 24 * 60 * 60,
+    'bonds': 7 * 24 * 60 * 60,
+}
+
+
+# an on-disk cache of scraped pages keyed by url and page type (the same url may be cached both as it was downloaded
+# and as it was rendered by a browser). page bodies are stored zlib-compressed in one file per url,
+# while an sqlite index keeps track of when every entry was stored and last used so the least recently used
+# entries can be evicted once the cache grows past "max_bytes"
+class ResponseCache:
+    def __init__(self, directory=DEFAULT_DIR, max_bytes=256 * 1024 * 1024, ttls=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttls = dict(TTLS, **(ttls or {}))
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(directory, 'index.sqlite'), check_same_thread=False)
+        self._db.execute('CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, url TEXT, page_type TEXT, '
+                         'stored REAL, accessed REAL, size INTEGER)')
+        self._db.commit()
+
+    def _key(self, url, page_type):
+        return hashlib.sha1(f'{page_type} {url}'.encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.z')
+
+    # returns the cached body of the page, or None if it was never cached or has outlived its page type's ttl
+    def get(self, url, page_type):
+        key = self._key(url, page_type)
+        now = time.time()
+        with self._lock:
+            row = self._db.execute('SELECT stored FROM entries WHERE key = ?', (key,)).fetchone()
+            if row is None or now - row[0] > self.ttls.get(page_type, 0):
+                self.misses += 1
+                return None
+            try:
+                with open(self._path(key), 'rb') as f:
+                    body = zlib.decompress(f.read()).decode()
+            except (OSError, zlib.error):
+                # the body went missing or was corrupted, so treat it like it was never cached
+                self._db.execute('DELETE FROM entries WHERE key = ?', (key,))
+                self._db.commit()
+                self.misses += 1
+                return None
+            self._db.execute('UPDATE entries SET accessed = ? WHERE key = ?', (now, key))
+            self._db.commit()
+            self.hits += 1
+            return body
+
+    def put(self, url, page_type, body: str):
+        key = self._key(url, page_type)
+        data = zlib.compress(body.encode())
+        now = time.time()
+        with self._lock:
+            # write to a temporary file first so a concurrent reader never sees a partially-written body
+            tmp = self._path(key) + f'.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, self._path(key))
+            self._db.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)', (key, url, page_type, now, now, len(data)))
+            self._evict()
+            self._db.commit()
+
+    # removes the least recently used entries until the cache fits in "max_bytes"
+    def _evict(self):
+        total = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._db.execute('SELECT key, size FROM entries ORDER BY accessed').fetchall():
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+            self._db.execute('DELETE FROM entries WHERE key = ?', (key,))
+            total -= size
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            for (key,) in self._db.execute('SELECT key FROM entries').fetchall():
+                try:
+                    os.remove(self._path(key))
+                except OSError:
+                    pass
+            self._db.execute('DELETE FROM entries')
+            self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._db.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries').fetchone()
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'entries': entries, 'bytes': size}
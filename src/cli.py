@@ -0,0 +1,85 @@
+import os
+
+from src.bonds import BondIndex, set_bond_index
+from src.cache import ResponseCache
+from src.fetch import get_cache, set_cache, set_policy
+from src.market import MarketData, load_config, market_value, set_market_data
+from src.peers import PeerIndex, set_peer_index
+from src.resilience import RetryPolicy
+from src.store import SnapshotStore, set_store
+from src.trace import Tracer, get_tracer, set_tracer
+
+# the options every script shares: where scraped pages, the peer and bond indexes, the market data and the snapshots
+# are kept, how requests are retried and whether the run is traced. each script adds them to its parser with
+# "add_fetch_args" and sets the process up from its arguments with "configure"
+
+
+# "snapshots" adds --no_snapshots for scripts that save what they scrape, "read_snapshots" adds --snapshot for scripts
+# that can build from what was saved, and "trace_summary" adds --trace_summary for scripts that print it when they end
+def add_fetch_args(parser, snapshots=True, read_snapshots=True, trace_summary=True):
+    parser.add_argument('--cache_dir', help='Set the directory that scraped pages, the indexes of generated peers and of bonds, the market data and the snapshots of scraped data are kept in. Defaults to ~/.cache/automatic-dcf.', type=str)
+    parser.add_argument('--no_cache', help='Set this flag to always download pages, crawl for peers and read bond tables instead of reusing cached copies.', action='store_true')
+    parser.add_argument('--market_data', help='Set a JSON file configuring the market data every DCF is built on, laid out like src/market.json: which treasury yields are read and how many seconds they are kept for, the tenor of the risk-free rate, the market risk premium and terminal growth, and "overrides" pinning any of them (e.g. {"rfr": 0.04}) to work offline. Defaults to src/market.json.', type=str)
+    if read_snapshots:
+        parser.add_argument('--snapshot', help='Set a date (YYYY-MM-DD) or "latest" to build from the data saved by the runs made on or before that date instead of scraping it again. Anything that was never saved is still scraped.', type=str)
+    if snapshots:
+        parser.add_argument('--no_snapshots', help='Set this flag to not save the scraped data to the snapshot store.', action='store_true')
+    parser.add_argument('--timeout', help='Set how many seconds to wait for a page to be sent before the request is retried. Requests that time out, fail to connect or are answered with a 429 or 5xx status are retried after a random, growing wait. Defaults to 20.', type=float, default=20.)
+    parser.add_argument('--retries', help='Set how many times a request that failed is retried before giving up on the page. Peers whose pages could not be downloaded are scraped again once the other peers are done, and left blank if they still fail. Defaults to 4.', type=int, default=4)
+    parser.add_argument('--hedge_after', help='Set a number of seconds after which a request that has not been answered is sent again, using whichever answer comes first. Cuts the time lost to the odd slow response at the cost of a few more requests. Defaults to never.', type=float)
+    parser.add_argument('--trace', help='Set a file to append a trace of the run to, with one line of JSON for every page fetched and every stage of building a DCF (how long it took, how many bytes it fetched, how many of its pages were cached and the error it failed with, if any).', type=str)
+    if trace_summary:
+        parser.add_argument('--trace_summary', help='Set this flag to print how long each stage of building the DCF took in total at the end of the run.', action='store_true')
+
+
+# sets up the fetcher, the caches and indexes, the market data, the snapshot store and the tracer from the arguments
+# of "add_fetch_args" (as a dict)
+def configure(args):
+    set_policy(RetryPolicy(timeout=(5., args['timeout']), retries=args['retries'], hedge_after=args['hedge_after']))
+
+    market_config = load_config(args['market_data']) if args['market_data'] is not None else None
+    if args['no_cache']:
+        set_cache(None)
+        set_market_data(MarketData(None, market_config))
+        set_peer_index(None)
+        set_bond_index(None)
+    elif args['cache_dir'] is not None:
+        set_cache(ResponseCache(args['cache_dir']))
+        set_market_data(MarketData(os.path.join(args['cache_dir'], 'market.sqlite'), market_config))
+        set_peer_index(PeerIndex(os.path.join(args['cache_dir'], 'peers.sqlite')))
+        set_bond_index(BondIndex(os.path.join(args['cache_dir'], 'bonds.sqlite')))
+    elif market_config is not None:
+        set_market_data(MarketData(config=market_config))
+
+    if args.get('no_snapshots'):
+        if args.get('snapshot') is not None:
+            raise ValueError('The --snapshot and --no_snapshots flags cannot be used together.')
+        set_store(None)
+    elif 'no_snapshots' in args and args['cache_dir'] is not None:
+        set_store(SnapshotStore(os.path.join(args['cache_dir'], 'snapshots')))
+
+    if args['trace'] is not None or args.get('trace_summary'):
+        set_tracer(Tracer(args['trace']))
+
+
+# fills in the market risk premium and terminal growth that weren't given from the market data (see src.market)
+def fill_market_values(args):
+    if args['market_risk_premium'] is None:
+        args['market_risk_premium'] = market_value('mrp')
+    if args['terminal_growth'] is None:
+        args['terminal_growth'] = market_value('terminal_growth')
+
+
+# prints how the page cache was used, if there is one
+def report_cache():
+    if (cache := get_cache()) is not None:
+        stats = cache.stats()
+        print(f"Page cache: {stats['hits']} hits, {stats['misses']} misses, {stats['entries']} entries ({stats['bytes'] / 1e6:.1f} MB)")
+
+
+# closes the tracer of the run, if there is one, printing its summary if --trace_summary was set
+def close_tracer(args):
+    if (tracer := get_tracer()) is not None:
+        tracer.close()
+        if args.get('trace_summary'):
+            print(tracer.format_summary())
@@ -0,0 +1,60 @@
+from functools import lru_cache
+
+from src.lazy import lazy_import
+
+etree = lazy_import('lxml.etree')
+html = lazy_import('lxml.html')
+
+# reads labelled values out of scraped pages. a page is parsed once by lxml (without building a python object for
+# every node, as BeautifulSoup does), every label is found by one search of the tree, and each value is reached from the
+# element holding its label by an XPath, like "../following-sibling::*[1]" for the cell next to the label's cell
+
+
+def parse_html(page):
+    try:
+        return html.document_fromstring(page)
+    except ValueError:
+        # strings with an xml encoding declaration have to be parsed as bytes
+        return html.document_fromstring(page.encode('utf-8'), parser=html.HTMLParser(encoding='utf-8'))
+    except etree.ParserError:
+        # an empty page, which has no labels
+        return html.document_fromstring('<html></html>')
+
+
+@lru_cache(maxsize=None)
+def _xpath(path):
+    return etree.XPath(path)
+
+
+# the elements with a text node that is exactly one of the labels, in the order of the document
+@lru_cache(maxsize=None)
+def _label_search(labels):
+    return etree.XPath('//*[' + ' or '.join(f'text()=$l{i}' for i in range(len(labels))) + ']')
+
+
+# the element holding each of "labels" (the first, if a label is shown more than once), like the parent of what
+# BeautifulSoup's "find(text=label)" returns. labels that aren't on the page are left out
+def find_labels(root, labels):
+    labels = tuple(labels)
+    found = {}
+    if not labels:
+        return found
+    for element in _label_search(labels)(root, **{f'l{i}': label for i, label in enumerate(labels)}):
+        for text in (element.text, *(child.tail for child in element)):
+            if text in labels and text not in found:
+                found[text] = element
+    return found
+
+
+# the text of the value of each label in "fields", which maps each label to the XPath of its value from the element
+# holding the label, and of the first element matching each XPath in "paths" ({name: XPath from the root}). values that
+# aren't on the page are left out
+def find_values(root, fields, paths=None):
+    values = {}
+    for label, element in find_labels(root, fields).items():
+        if value := _xpath(fields[label])(element):
+            values[label] = value[0].text_content()
+    for name, path in (paths or {}).items():
+        if value := _xpath(path)(root):
+            values[name] = value[0].text_content()
+    return values
@@ -0,0 +1,259 @@
+import contextvars
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from src.cache import ResponseCache
+from src.lazy import lazy_import
+from src.ratelimit import HostRateLimiter
+from src.resilience import RETRY_STATUSES, CircuitOpen, FetchError, FetchOutcomes, HostCircuitBreaker, RetryPolicy, retry_after
+from src.trace import in_current_span, span
+
+requests = lazy_import('requests')
+
+# the sites that get scraped. urls are built from these whenever a page is needed, so the scrapers can be pointed at
+# another server (e.g. one replaying recorded pages) by changing them
+BASE_URLS = {
+    'yahoo': 'https://finance.yahoo.com',
+    'yahoo-query': 'https://query1.finance.yahoo.com',
+    'macroaxis': 'https://www.macroaxis.com',
+}
+
+# every page scraped for a ticker, as {name: (url, page type)}. the urls are filled in with the ticker and the sites of
+# BASE_URLS. the statements are the data embedded in the statement pages (see src.statements.parse_statement_data)
+PAGES = {
+    'financials': ('{yahoo}/quote/{ticker}/financials?p={ticker}', 'statement-data'),
+    'balance-sheet': ('{yahoo}/quote/{ticker}/balance-sheet?p={ticker}', 'statement-data'),
+    'cash-flow': ('{yahoo}/quote/{ticker}/cash-flow?p={ticker}', 'statement-data'),
+    'key-statistics': ('{yahoo}/quote/{ticker}/key-statistics?p={ticker}', 'key-statistics'),
+    'bonds': ('{macroaxis}/invest/bond/{ticker}', 'bonds'),
+    'profile': ('{yahoo}/quote/{ticker}/profile?p={ticker}', 'profile'),
+    'analysis': ('{yahoo}/quote/{ticker}/analysis?p={ticker}', 'analysis'),
+}
+
+
+def page_url(ticker, page):
+    return PAGES[page][0].format(ticker=ticker, **BASE_URLS)
+
+
+headers = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/84.0.4147.89 Safari/537.36',
+    'Cache-Control': 'no-cache'
+}
+
+# the cache shared by every scrape. it is created on first use so it can be replaced (or disabled by setting
+# it to None) before anything is fetched
+_cache = ...
+
+
+def get_cache():
+    global _cache
+    if _cache is ...:
+        _cache = ResponseCache()
+    return _cache
+
+
+def set_cache(cache):
+    global _cache
+    _cache = cache
+
+
+# each thread keeps its own session, so the connections it opens to a host are reused by its later requests instead
+# of being opened again for every page (sessions are not safe to share between threads)
+_sessions = threading.local()
+
+
+def get_session():
+    session = getattr(_sessions, 'session', None)
+    if session is None:
+        session = _sessions.session = requests.Session()
+    return session
+
+
+# every request that goes to the network is throttled per host, so concurrent scrapes stay under the hosts' rate limits
+limiter = HostRateLimiter()
+
+# how requests are timed out, retried and hedged, the circuit breaker of every host and the outcome of every download
+# (see src.resilience)
+policy = RetryPolicy()
+breakers = HostCircuitBreaker()
+outcomes = FetchOutcomes()
+
+
+def set_policy(retry_policy):
+    global policy
+    policy = retry_policy
+
+
+# hedged requests are sent from their own threads, so the first answer can be taken while the other is still on its way
+_hedges = ThreadPoolExecutor(max_workers=16, thread_name_prefix='hedge')
+
+
+def _get(url, timeout):
+    return get_session().get(url, headers=headers, timeout=timeout)
+
+
+# sends a request, and sends it again if it has not been answered after "hedge_after" seconds. returns the first
+# response (the other request is left to finish on its own) and whether the request was hedged. an error is only
+# raised if both requests fail
+def _hedged_get(url, timeout, hedge_after):
+    first = _hedges.submit(_get, url, timeout)
+    if wait([first], timeout=hedge_after).done:
+        return first.result(), False
+    limiter.acquire(url)
+    pending = {first, _hedges.submit(_get, url, timeout)}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                return future.result(), True
+            except Exception as e:
+                error = error or e
+    raise error
+
+
+# downloads a page with a GET request, following the "policy": timeouts, connection errors, broken or undecodable
+# bodies, 429s and 5xx responses are retried after a jittered backoff until the retries or the deadline run out, when a
+# FetchError is raised. other request errors (e.g. an invalid url or a redirect loop) raise a FetchError straight
+# away, since asking again won't help. requests are refused straight away while the circuit of the page's host is open,
+# and the host's circuit breaker counts one failure for a page that could not be downloaded, however many requests it
+# took. other responses (including errors like a 404) are returned as they are. returns the response, the number of
+# requests it took and whether one of them was hedged
+def download(url):
+    breaker = breakers(url)
+    start = time.monotonic()
+    # a page is let through once, so the trial request of a half-open circuit is followed by its own retries and the
+    # circuit hears back whether the page arrived
+    if not breaker.allow():
+        outcomes.record(url, 'failed', 0, 0., False)
+        raise CircuitOpen(url, 'circuit open', 0)
+
+    attempts, hedged = 0, False
+    while True:
+        attempts += 1
+        limiter.acquire(url)
+        wait_at_least = None
+        try:
+            if policy.hedge_after is None:
+                response = _get(url, policy.timeout)
+            else:
+                response, was_hedged = _hedged_get(url, policy.timeout, policy.hedge_after)
+                hedged = hedged or was_hedged
+        except requests.RequestException as e:
+            reason = type(e).__name__
+            retry = isinstance(e, (requests.Timeout, requests.ConnectionError, requests.exceptions.ChunkedEncodingError,
+                                   requests.exceptions.ContentDecodingError))
+        else:
+            if response.status_code not in RETRY_STATUSES:
+                # the host answered, even if it was to say the page doesn't exist
+                breaker.success()
+                outcomes.record(url, 'ok' if response.ok else 'error', attempts, time.monotonic() - start, hedged)
+                return response, attempts, hedged
+            reason = f'HTTP {response.status_code}'
+            retry = True
+            wait_at_least = retry_after(response)
+
+        delay = policy.delay(attempts, wait_at_least)
+        if not retry or attempts > policy.retries or time.monotonic() - start + delay > policy.deadline:
+            breaker.failure()
+            outcomes.record(url, 'failed', attempts, time.monotonic() - start, hedged)
+            raise FetchError(url, reason, attempts)
+        time.sleep(delay)
+
+
+# the bundle of the ticker being built (see TickerBundle). it is kept per context, so the threads working on the ticker
+# (see src.trace.in_current_span) share it
+_bundle = contextvars.ContextVar('bundle', default=None)
+
+
+# fetches the pages of a ticker ("pages", names of PAGES) all at once when it is started, so they arrive in about the
+# time of the slowest one instead of one after another as each part of a template gets to them. until it is closed,
+# "fetch" hands out the bundle's pages (waiting for those still on their way) instead of requesting them again, so a
+# page costs one request however many times it is read. a page that could not be downloaded even after retrying (see
+# "download") raises its FetchError in the first one to read it, and is then dropped from the bundle, so reading it
+# again (e.g. when a failed peer row is scraped again) downloads it again. a page that failed for any other reason is
+# fetched again by whoever reads it, so the error is raised (and handled) where it was before
+class TickerBundle:
+    def __init__(self, ticker, pages=tuple(PAGES), workers=4):
+        self.ticker = ticker
+        self.workers = workers
+        self.hits = 0
+        # the pages by (url, page type), so a page declared twice is only fetched once
+        self._pages = dict.fromkeys((page_url(ticker, page), PAGES[page][1]) for page in pages)
+        self._executor = None
+        self._token = None
+
+    # starts fetching the pages without making the bundle the current one, e.g. so one thread can fetch the pages of a
+    # ticker ahead while another builds the ticker before it (see src.stream)
+    def prefetch(self):
+        if self._pages and self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(self._pages))), thread_name_prefix='bundle')
+            # the pages are fetched in the context from before the bundle is set, so they aren't looked up in it
+            for url, page_type in self._pages:
+                self._pages[url, page_type] = self._executor.submit(in_current_span(fetch), url, page_type)
+        return self
+
+    # waits for every page to arrive (or fail)
+    def wait(self):
+        wait([f for f in self._pages.values() if f is not None])
+        return self
+
+    def start(self):
+        self.prefetch()
+        self._token = _bundle.set(self)
+        return self
+
+    # the page, or None if it is not in the bundle or could not be downloaded
+    def page(self, url, page_type):
+        if (future := self._pages.get((url, page_type))) is None:
+            return None
+        try:
+            html = future.result()
+        except FetchError:
+            self._pages.pop((url, page_type), None)
+            raise
+        except Exception:
+            return None
+        self.hits += 1
+        return html
+
+    def close(self):
+        if self._token is not None:
+            _bundle.reset(self._token)
+            self._token = None
+        if self._executor is not None:
+            # pages nobody read are not waited for
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+# gets the html of a page, using the cached copy if it is still fresh for its page type. pages that have to be
+# rendered in a browser pass a "render" function which is only called on a cache miss; every other page is
+# downloaded with a plain GET request (see "download"), and only cached if it was found. pages fetched ahead by the
+# current TickerBundle are taken from it
+def fetch(url, page_type, render=None):
+    if (bundle := _bundle.get()) is not None and (html := bundle.page(url, page_type)) is not None:
+        return html
+
+    with span('fetch', page_type=page_type, url=url) as s:
+        cache = get_cache()
+        if cache is not None and (html := cache.get(url, page_type)) is not None:
+            s.cache_hits = 1
+            s.bytes = len(html)
+            return html
+
+        found = True
+        if render is not None:
+            limiter.acquire(url)
+            html = render(url)
+        else:
+            response, attempts, hedged = download(url)
+            html = response.text
+            found = response.ok
+            s.set(status=response.status_code, attempts=attempts, hedged=hedged)
+        s.cache_misses = 1
+        s.bytes = len(html)
+
+        if cache is not None and found:
+            cache.put(url, page_type, html)
+        return html
@@ -0,0 +1,66 @@
+import datetime as dt
+import json
+import os
+
+from src.lazy import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+# everything a template was built from is saved next to its workbook, so the workbook can be rebuilt later (e.g. with
+# new share prices, see src.refresh) without scraping the statements, peers and estimates again
+
+VERSION = 1
+
+
+# the file the inputs of a workbook are saved in, e.g. "AAPL.xlsx" -> "AAPL.inputs.json"
+def inputs_path(outfile):
+    return os.path.splitext(outfile)[0] + '.inputs.json'
+
+
+def _plain(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (dt.date, dt.datetime)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def frame_to_json(df):
+    return {'index': list(df.index), 'columns': list(df.columns), 'data': df.to_numpy().tolist()}
+
+
+def frame_from_json(data):
+    return pd.DataFrame(np.array(data['data'], dtype=np.float64).reshape(len(data['index']), len(data['columns'])),
+                        index=pd.Index(data['index'], dtype=object), columns=pd.Index(data['columns'], dtype=object))
+
+
+# a one-column frame (like a row of the peers sheet) as a dict, in the same order
+def column_to_json(df, exclude=()):
+    return {k: v for k, v in df['Data'].items() if k not in exclude}
+
+
+def column_from_json(data):
+    return pd.DataFrame({'Data': pd.Series(data, dtype=object)})
+
+
+def save_inputs(path, inputs):
+    inputs = dict(inputs, version=VERSION, saved=dt.datetime.now().isoformat(timespec='seconds'))
+    # write to a temporary file first so a reader (e.g. a scheduled refresh) never sees a partially-written file
+    with open(path + '.tmp', 'w') as f:
+        json.dump(inputs, f, default=_plain)
+    os.replace(path + '.tmp', path)
+
+
+# loads the inputs saved for a workbook, given either the workbook or the inputs file itself
+def load_inputs(path):
+    if not path.endswith('.inputs.json'):
+        path = inputs_path(path)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f'{path} does not exist. Only workbooks made since their inputs started being saved can be refreshed; '
+                                f'make the DCF again to save them')
+    with open(path) as f:
+        inputs = json.load(f)
+    if inputs.get('version') != VERSION:
+        raise ValueError(f"{path} was saved in version {inputs.get('version')} of the inputs format, but version {VERSION} is expected")
+    return inputs
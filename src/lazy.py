@@ -0,0 +1,39 @@
+import importlib
+import threading
+import types
+
+_lock = threading.Lock()
+
+
+# a stand-in for a module that is only imported the first time one of its attributes is used, so the heavy
+# dependencies (pandas, selenium, ...) are only paid for by the code paths that need them. attributes are looked
+# up on the real module once and then kept on the stand-in, so later lookups cost the same as a normal module's
+class LazyModule(types.ModuleType):
+    def __init__(self, name):
+        super().__init__(name)
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            # the import system already locks each module, but the lock keeps two threads from both doing the lookup
+            with _lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self.__name__)
+        return self._module
+
+    def __getattr__(self, attr):
+        if attr.startswith('__'):
+            return getattr(self._load(), attr)
+        value = getattr(self._load(), attr)
+        setattr(self, attr, value)
+        return value
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        return f"<lazy module '{self.__name__}'{' (loaded)' if self._module is not None else ''}>"
+
+
+def lazy_import(name):
+    return LazyModule(name)
@@ -1,16 +1,43 @@
+from __future__ import annotations
+
 import datetime as dt
 import json
+import os
+import threading
 import traceback
-from time import sleep
-
-import pandas as pd
-import requests
-import xlsxwriter as xls
-from bs4 import BeautifulSoup
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import WebDriverWait
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from src.bonds import bond_spreads, get_bond_index
+from src.extract import find_labels, find_values, parse_html
+from src.fetch import TickerBundle, fetch, page_url
+from src.inputs import column_to_json, frame_to_json, inputs_path, save_inputs
+from src.lazy import lazy_import
+from src.market import RISK_FREE, market_value
+from src.montecarlo import make_simulation, simulate
+from src.output import collect_results, output_file, write_results
+from src.parsing import parse_table, parse_value
+from src.peers import FAN_OUT, MAX_PEERS, discover_peers, driver_lock
+from src.peertable import DERIVED_LABELS, LABELS, PeerRecord, PeerTable
+from src.resilience import FetchError
+from src.statements import StatementNotFound, parse_statement, parse_statement_data
+from src.store import SnapshotPeerData, get_store, numeric_frame
+from src.trace import in_current_span, span, traced
+from src.valuation import sheet_values, value_company
+from src.workbook import colnum_string, get_format, open_workbook
+
+# the heavy dependencies are only imported once they are used, so scripts start quickly (see src.lazy)
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+xls = lazy_import('xlsxwriter')
+bs4 = lazy_import('bs4')
+etree = lazy_import('lxml.etree')
+webdriver = lazy_import('selenium.webdriver')
+by = lazy_import('selenium.webdriver.common.by')
+EC = lazy_import('selenium.webdriver.support.expected_conditions')
+ui = lazy_import('selenium.webdriver.support.ui')
+
+MESSAGE_PATH = os.path.join(os.path.dirname(__file__), 'message.txt')
 
 # TO DO:
 # HOTFIX: fix bug causing summaries to be read wrong
@@ -26,67 +53,82 @@ from selenium.webdriver.support.ui import WebDriverWait
 
 # Format the column widths in the DCF
 # Clean up dcf implementation
-headers = {
-    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/84.0.4147.89 Safari/537.36',
-    'Cache-Control': 'no-cache'
-}
-
-options = webdriver.ChromeOptions()
-options.add_argument('User-Agent="Mozilla/5.0 (Windows NT 10.0; WOW64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/72.0.3626.121 Safari/537.36"')
-options.add_argument('Cache-Control="no-cache"')
-options.add_argument('--headless')
-options.add_argument("--log-level=3")
-
-message_to_analyst = open('message.txt').read()
-
-
-def get_statement(ticker, statement_name, driver: webdriver.Chrome):
-    url = f'https://finance.yahoo.com/quote/{ticker}/{statement_name}?p={ticker}'
 
-    driver.get(url)
-    sleep(1)
-    WebDriverWait(driver, 10).until(
-        EC.element_to_be_clickable((By.XPATH, f"//*[text() = 'Expand All']"))
-    ).click()
 
-    html = driver.execute_script('return document.body.innerHTML;')
-    soup = BeautifulSoup(html, 'lxml')
-
-    table = soup.find('section', {'data-test': 'qsp-financial'})
-
-    items = []
-    periods = []
-
-    # determine how many line items there are, so they can be made into rows
-    for item in table.find_all('span', 'Va(m)'):
-        items.append(item.text)
-
-    # determine how many periods there are, so they can be made into columns
-    for data in (table_data := table.find_all('div', 'Ta(c)')):
-        try:
-            data['data-test']
-        except:
-            try:
-                periods.append(dt.datetime.strptime(data.text, '%m/%d/%Y').strftime('%d %B %Y'))
-            except ValueError:
-                periods.append(data.text.upper().strip())
-
-    # create a dataframe based on the determined dimensions of the table
-    df = pd.DataFrame(columns=periods, index=items)
-
-    # now iteratively read the data into the table
-    for i, data in enumerate(table_data[len(periods):]):
-        # data is read across the line item, ie period decreases until the next line item
-        # the line wraps when all periods are filled out, so "i" divided by number of periods
-        # determines the row number and "i" mod the number of periods determines the column number
+def chrome_options():
+    options = webdriver.ChromeOptions()
+    options.add_argument('User-Agent="Mozilla/5.0 (Windows NT 10.0; WOW64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/72.0.3626.121 Safari/537.36"')
+    options.add_argument('Cache-Control="no-cache"')
+    options.add_argument('--headless')
+    options.add_argument("--log-level=3")
+    return options
+
+
+# the message written into the notes section of the DCF sheet, read from next to this file the first time it is needed
+@lru_cache(maxsize=None)
+def message_to_analyst():
+    with open(MESSAGE_PATH) as f:
+        return f.read()
+
+
+# a chrome driver that is only launched the first time it is used, so runs that never need a browser don't start one
+class LazyChrome:
+    def __init__(self):
+        self._driver = None
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        if self._driver is None:
+            # a long-running process (see src.service) may need the browser in several threads at once. launching it is
+            # locked here, and every page rendered with it takes src.peers.driver_lock
+            with self._lock:
+                if self._driver is None:
+                    self._driver = webdriver.Chrome(options=chrome_options())
+        return getattr(self._driver, name)
+
+    def close(self):
+        if self._driver is not None:
+            self._driver.close()
+            self._driver = None
+
+
+# gets a financial statement using the given backend. the "http" backend reads the data embedded in the page as it is
+# downloaded, falling back to the "selenium" backend (which renders the page in the browser and reads its table)
+# if the page has no embedded data. the statement is saved to the snapshot store (see src.store)
+@traced(args=('ticker', 'statement_name', 'backend'))
+def get_statement(ticker, statement_name, driver: webdriver.Chrome, backend='http'):
+    url = page_url(ticker, statement_name)
+
+    df = None
+    if backend == 'http':
         try:
-            df.iloc[int(i / len(periods)), i % len(periods)] = float(data.text.strip().replace(',', ''))
-        except ValueError:
-            df.iloc[int(i / len(periods)), i % len(periods)] = data.text.strip()
+            df = parse_statement_data(fetch(url, 'statement-data'))
+        except StatementNotFound:
+            pass
 
+    def render(url):
+        with driver_lock, span('render', url=url):
+            driver.get(url)
+            ui.WebDriverWait(driver, 10).until(
+                EC.element_to_be_clickable((by.By.XPATH, f"//*[text() = 'Expand All']"))
+            ).click()
+            return driver.execute_script('return document.body.innerHTML;')
+
+    if df is None:
+        df = parse_statement(fetch(url, 'statement', render))
+    if (store := get_store()) is not None:
+        store.put_frame(ticker, statement_name, df)
     return df
 
 
+# gets a value from a statement, raising a KeyError if the line item is missing or has no value for the period
+def statement_value(df, item, period):
+    value = df.loc[item, period]
+    if np.isnan(value):
+        raise KeyError(f'{item} has no value for {period}')
+    return value
+
+
 # gets the width of every column in the dataframe for autofitting cells
 def get_col_widths(dataframe):
     # First we find the maximum length of the index column
@@ -95,17 +137,45 @@ def get_col_widths(dataframe):
     return [idx_max] + [max([len(str(s)) for s in dataframe[col].values] + [len(col)]) for col in dataframe.columns]
 
 
-# get the col letter from its int value
-def colnum_string(n):
-    n += 1
-    string = ""
-    while n > 0:
-        n, remainder = divmod(n - 1, 26)
-        string = chr(65 + remainder) + string
-    return string
+# gets the statements of the ticker and the tax rate used for it, and writes a sheet for each statement unless "book"
+# is None (see "write_financials")
+@traced(args=('ticker',))
+def make_financials(ticker: str, book: xls.Workbook, driver: webdriver.Chrome, min_tax_rate: float, statement_backend='http', dfs: dict = None):
+    statements = ['financials', 'balance-sheet', 'cash-flow']  # "financials" means income statement
+
+    # statements that were already retrieved (e.g. saved with a previous template) are used as they are
+    dfs = dict(dfs or {})
+    for statement in statements:
+        if statement not in dfs:
+            dfs[statement] = get_statement(ticker, statement, driver, statement_backend)
+        if statement == 'financials':
+            tax_rate = dfs[statement].loc['Tax Rate for Calcs', dfs[statement].columns[0]]
+            if tax_rate == 0 or np.isnan(tax_rate):
+                try:
+                    # use most recent tax rate only
+                    tax_rate = (statement_value(dfs[statement], 'Tax Provision', dfs[statement].columns[0])
+                                / statement_value(dfs[statement], 'Pretax Income', dfs[statement].columns[0]))
+                except KeyError:
+                    pass
+
+            # a tax rate that could not be calculated (NaN) also falls back to the minimum
+            tax_rate = tax_rate if tax_rate >= min_tax_rate else min_tax_rate
+
+    if book is not None:
+        write_financials(dfs, book)
+
+    # ratios = pd.DataFrame(columns=['Data'])
+
+    # ratios.loc['Current Ratio'] = dfs['balance-sheet']['Current Assets'] / dfs['balance-sheet']['Current Liabilities']
+    # ratios.loc['Cash & Securities / Assets'] = dfs['balance-sheet']['Cash, Cash Equivalents & Short Term Investments'] / dfs['balance-sheet']['Total Assets']
+
+    # ratios.loc['Days of Receivables'] = 365 * dfs['balance-sheet']['Accounts receivable'] / dfs['financials']['Total Revenue']
+
+    return dfs, tax_rate
 
 
-def make_financials(ticker: str, book: xls.Workbook, driver: webdriver.Chrome, min_tax_rate: float):
+@traced()
+def write_financials(dfs: dict, book: xls.Workbook):
     statements = ['financials', 'balance-sheet', 'cash-flow']  # "financials" means income statement
     names = ['Income Statement', 'Balance Sheet', 'Cash Flow']
 
@@ -144,53 +214,40 @@ def make_financials(ticker: str, book: xls.Workbook, driver: webdriver.Chrome, m
     # a list of figures that should have a seperator after them
     ratio_seperators = ['Cash & Securities / Assets', 'Cash Conversion Cycle', 'Gross Debt / EBITDA', 'Assets / Equity', 'Assets', 'Net Working Capital']
 
-    header = book.add_format({
+    header = get_format(book, {
         'font_color': 'white',
         'bg_color': '#034638',
     })
 
-    line_item = book.add_format({
+    line_item = get_format(book, {
         'align': 'left',
     })
 
-    regular_data = book.add_format({
+    regular_data = get_format(book, {
         'num_format': 43,
     })
 
-    key_figure = book.add_format({
+    key_figure = get_format(book, {
         'num_format': 43,
         'top': 1,
     })
 
-    bottom_line = book.add_format({
+    bottom_line = get_format(book, {
         'num_format': 43,
         'top': 1,
         'bottom': 6,
     })
 
     # checks if the line item is a key figure and formats accordingly. returns 1 if a seperator was used, 0 if not
-    def get_format(item, statement):
+    def item_format(item, statement):
         if item in bottom_lines[statement]:
             return bottom_line
         if item in key_figures[statement]:
             return key_figure
         return regular_data
 
-    dfs = {}
     # make financial statements
     for statement, name in zip(statements, names):
-        dfs[statement] = get_statement(ticker, statement, driver)
-        if statement == 'financials':
-            tax_rate = dfs[statement].loc['Tax Rate for Calcs', dfs[statement].columns[0]]
-            if tax_rate == 0:
-                try:
-                    # use most recent tax rate only
-                    tax_rate = (dfs[statement].loc['Tax Provision', dfs[statement].columns[0]] / dfs[statement].loc['Pretax Income', dfs[statement].columns[0]])
-                except KeyError:
-                    pass
-
-            tax_rate = max(tax_rate, min_tax_rate)
-
         sheet = book.add_worksheet(name)
         sheet.freeze_panes(2, 1)
 
@@ -208,219 +265,286 @@ def make_financials(ticker: str, book: xls.Workbook, driver: webdriver.Chrome, m
         # write the line items column
         s = 0
         for i, item in enumerate(dfs[statement].index):
-            # write data items with formatting before formatting the whole row, if necessary
-            sheet.write_row(i + s + 2, 1, dfs[statement].loc[item], get_format(item, statement))
+            # write data items with formatting before formatting the whole row, if necessary. missing values are shown as "-"
+            sheet.write_row(i + s + 2, 1, [v if v == v else '-' for v in dfs[statement].loc[item].tolist()], item_format(item, statement))
             # after formatting, write the line item so it overwrites the rest-of-row formatting
             sheet.write(i + s + 2, 0, item, line_item)
             # format the row based off the line item label. if a seperator should be placed after the
             # row, keep track of how many seperators were used so all other rows can be pushed down
             s += 1 if item in seperators[statement] else 0
 
-    # ratios = pd.DataFrame(columns=['Data'])
-
-    # ratios.loc['Current Ratio'] = dfs['balance-sheet']['Current Assets'] / dfs['balance-sheet']['Current Liabilities']
-    # ratios.loc['Cash & Securities / Assets'] = dfs['balance-sheet']['Cash, Cash Equivalents & Short Term Investments'] / dfs['balance-sheet']['Total Assets']
 
-    # ratios.loc['Days of Receivables'] = 365 * dfs['balance-sheet']['Accounts receivable'] / dfs['financials']['Total Revenue']
+# where the value of each label on the key statistics page is, from the element holding the label: the next cell of
+# its row
+KEY_STATISTICS = {label: '../following-sibling::*[1]' for label in [
+    'Beta (5Y Monthly)', 'Shares Outstanding', 'Profit Margin', 'Operating Margin', 'Return on Assets', 'Return on Equity',
+    'Quarterly Revenue Growth', 'Quarterly Earnings Growth', 'Revenue', 'EBITDA', 'Net Income Avi to Common', 'Total Cash',
+    'Total Debt']}
+QUOTE_HEADER = {'Peer': '//h1', 'Share Price': '//fin-streamer[@data-test="qsp-price"]'}
+BOND_RATING = {'Average S&P Rating': 'following-sibling::*[1]'}
 
-    return dfs, tax_rate
 
+# reads a peer's values from its key statistics page (see get_peer_data). reading stops at the first value that is
+# missing or is not a number, so the values after it are left out
+def read_key_statistics(page, data):
+    values = find_values(parse_html(page), KEY_STATISTICS, QUOTE_HEADER)
 
-def to_datatype(s: str, parse_dates: bool = False):
-    s = s.replace(',', '')
-    if s.endswith('%'):
-        try:
-            return float(s.replace('%', '')) / 100
-        except ValueError:
-            pass
-    elif s.endswith('T'):
-        try:
-            return float(s.replace('T', '')) * 1e12
-        except ValueError:
-            pass
-    elif s.endswith('B'):
-        try:
-            return float(s.replace('B', '')) * 1e9
-        except ValueError:
-            pass
-    elif s.endswith('M'):
-        try:
-            return float(s.replace('M', '')) * 1e6
-        except ValueError:
-            pass
-    elif s.endswith('k'):
-        try:
-            return float(s.replace('k', '')) * 1e3
-        except ValueError:
-            pass
     try:
-        return float(s)
-    except ValueError:
-        pass
+        data['Peer'] = values['Peer']
+        data['Share Price'] = parse_value(values['Share Price'])
 
-    if parse_dates:
-        try:
-            return dt.datetime.strptime(s, '%M/%d/%Y')
-        except ValueError:
-            pass
-        try:
-            return dt.datetime.strptime(s, '%M-%d-%Y')
-        except ValueError:
-            pass
+        data['Equity Beta'] = parse_value(values['Beta (5Y Monthly)'])
+        if data['Equity Beta'] == 'N/A':  # handle invalid numbers
+            data['Equity Beta'] = 0.
+        data['Shares Outstanding'] = parse_value(values['Shares Outstanding']) / 1000
 
-    return s
+        data['Profit Margin'] = parse_value(values['Profit Margin'])
+        data['Operating Margin'] = parse_value(values['Operating Margin'])
+        data['Return on Assets'] = parse_value(values['Return on Assets'])
+        data['Return on Equity'] = parse_value(values['Return on Equity'])
+        data['Revenue Growth (1Y)'] = parse_value(values['Quarterly Revenue Growth'])
+        data['Earnings Growth (1Y)'] = parse_value(values['Quarterly Earnings Growth'])
 
+        data['LTM Sales'] = parse_value(values['Revenue']) / 1000
 
-def get_peer(ticker, tax_rate, dfs):
-    statements = ['financials', 'balance-sheet', 'cash-flow']
-    labels = ['Peer', 'P/E Ratio', 'EV/Sales', 'EV/EBITDA', 'Market Cap', 'Total Debt', 'Cash and Equivalents',
-              'Enterprise Value', 'Debt/Equity', 'Bond Rating (S&P)', 'Bond Spread (10Y)', 'Bond Spread (30Y)',
-              'LTM Sales', 'LTM EBITDA', 'LTM Earnings', 'Share Price', 'Shares Outstanding', 'Equity Beta',
-              'Unlevered Beta', 'Profit Margin', 'Operating Margin', 'Return on Assets', 'Return on Equity',
-              'Revenue Growth (1Y)', 'Earnings Growth (1Y)', 'Key Notes']
+        try:
+            data['LTM EBITDA'] = parse_value(values['EBITDA']) / 1000
+        # if ebitda is not a line item, leave it to be constructed from the financial statements by "get_peer"
+        except (TypeError, KeyError):
+            data['LTM EBITDA'] = None
 
-    df = pd.DataFrame(columns=['Data'])
-    for l in labels:
-        df.loc[l] = ''
+        data['LTM Earnings'] = parse_value(values['Net Income Avi to Common']) / 1000
 
-    url = f'https://finance.yahoo.com/quote/{ticker}/key-statistics?p={ticker}'
-    res = requests.get(url, headers=headers)
-    sleep(1)
-    soup = BeautifulSoup(res.text, features='lxml')
+        data['Cash and Equivalents'] = parse_value(values['Total Cash']) / 1000
+        data['Total Debt'] = parse_value(values['Total Debt']) / 1000
+    except (TypeError, KeyError):
+        # print(traceback.format_exc())
+        pass
+    return data
 
-    try:
-        df.loc['Peer'] = soup.find('h1').text
-        df.loc['Share Price'] = to_datatype(soup.find('fin-streamer', {'data-test': 'qsp-price'}).text)
 
-        df.loc['Equity Beta'] = to_datatype(soup.find(text='Beta (5Y Monthly)').parent.parent.next_sibling.text)
-        if df.loc['Equity Beta', 'Data'] == 'N/A':  # handle invalid numbers
-            df.loc['Equity Beta'] = 0.
-        df.loc['Shares Outstanding'] = to_datatype(soup.find(text='Shares Outstanding').parent.parent.next_sibling.text) / 1000
+# reads a peer's bond table (None if it has none) and bond rating (None if it is not shown) from its bond page
+def read_bonds(page):
+    root = parse_html(page)
+    debt_frame = None
 
-        df.loc['Profit Margin'] = to_datatype(soup.find(text='Profit Margin').parent.parent.next_sibling.text)
-        df.loc['Operating Margin'] = to_datatype(soup.find(text='Operating Margin').parent.parent.next_sibling.text)
-        df.loc['Return on Assets'] = to_datatype(soup.find(text='Return on Assets').parent.parent.next_sibling.text)
-        df.loc['Return on Equity'] = to_datatype(soup.find(text='Return on Equity').parent.parent.next_sibling.text)
-        df.loc['Revenue Growth (1Y)'] = to_datatype(soup.find(text='Quarterly Revenue Growth').parent.parent.next_sibling.text)
-        df.loc['Earnings Growth (1Y)'] = to_datatype(soup.find(text='Quarterly Earnings Growth').parent.parent.next_sibling.text)
+    if (header := find_labels(root, ['Issue Date']).get('Issue Date')) is not None:
+        header = header.getparent()
+        headings = [heading.text_content().strip() for heading in header.iterchildren(etree.Element)]
+        rows = [[datum.text_content().strip() for _, datum in zip(headings, row.iterchildren(etree.Element))]
+                for row in header.itersiblings(etree.Element)]
 
-        df.loc['LTM Sales'] = to_datatype(soup.find(text='Revenue').parent.parent.next_sibling.text) / 1000
+        # the coupons are parsed as numbers and the issue and maturity dates as dates, a column at a time
+        debt_frame = parse_table(headings, rows).set_index('')
+        debt_frame['Spread'] = debt_frame['Coupon'] - debt_frame['Ref Coupon']
+        debt_frame['Length'] = debt_frame['Maturity'] - debt_frame['Issue Date']
 
+    return debt_frame, find_values(root, BOND_RATING).get('Average S&P Rating')
+
+
+# scrapes everything about a peer that does not depend on the company being valued. the values are returned
+# as a dict keyed by the labels of the peers sheet, so the same scrape can be shared by every model the peer is used in.
+# the values and the peer's bond table are saved to the snapshot store (see src.store). the bond page is only read if
+# the peer's bonds are not fresh in the bond index (see src.bonds)
+@traced(args=('ticker',))
+def get_peer_data(ticker):
+    data = {}
+
+    url = page_url(ticker, 'key-statistics')
+    read_key_statistics(fetch(url, 'key-statistics'), data)
+
+    debt_frame = None
+    if (index := get_bond_index()) is not None and (saved := index.get(ticker)) is not None:
+        bonds, rating = saved
+    else:
+        url = page_url(ticker, 'bonds')
+        debt_frame, rating = read_bonds(fetch(url, 'bonds'))
+        bonds = debt_frame
+        if index is not None:
+            index.put(ticker, debt_frame, rating)
+
+    # get the average spreads of all bonds with an initial time to maturity of approximately 10 years (between 8 and
+    # 12) and 30 years (between 28 and 32)
+    if bonds is not None:
+        spreads = bond_spreads(bonds)
+        data['Bond Spread (10Y)'] = spreads['10Y']
+        data['Bond Spread (30Y)'] = spreads['30Y']
+    if rating is not None:
+        data['Bond Rating (S&P)'] = rating
+
+    if (store := get_store()) is not None:
+        store.put_record(ticker, 'peer', data)
+        if debt_frame is not None:
+            store.put_frame(ticker, 'bonds', numeric_frame(debt_frame))
+    return data
+
+
+# the EBITDA of a peer whose key statistics don't show it, constructed from the valued company's statements, or a
+# blank string if it can't be
+def constructed_ebitda(dfs):
+    statements = ['financials', 'balance-sheet', 'cash-flow']
+    try:
+        # start with net income (this value should always be present on yahoo, everything else may not be)
+        ebit_actual = dfs[statements[0]].loc['Net Income Common Stockholders', 'TTM']
+        # add back taxes to net income
         try:
-            df.loc['LTM EBITDA'] = to_datatype(soup.find(text='EBITDA').parent.parent.next_sibling.text) / 1000
-            if df.loc['LTM EBITDA', 'Data'] == 'N/A':
-                raise TypeError
-        # if ebitda is not a line item
-        except (TypeError, AttributeError):
-            # start with net income (this value should always be present on yahoo, everything else may not be)
-            ebit_actual = dfs[statements[0]].loc['Net Income Common Stockholders', 'TTM']
-            # add back taxes to net income
-            try:
-                ebit_actual += dfs[statements[0]].loc['Tax Provision', 'TTM']
-            except (KeyError, TypeError):
-                pass
-            # try to add back interest expense and interest income
-            try:
-                ebit_actual += dfs[statements[0]].loc['Interest Expense', 'TTM']
-            except (KeyError, TypeError):
-                pass
-            try:
-                ebit_actual -= dfs[statements[0]].loc['Interest Income', 'TTM']
-            except (KeyError, TypeError):
-                pass
-            # try to add back depreciation
-            try:
-                ebit_actual += dfs[statements[0]].loc['Reconciled Depreciation', 'TTM']
-            except (KeyError, TypeError):
-                pass
-            df.loc['LTM EBITDA'] = ebit_actual
-
-        df.loc['LTM Earnings'] = to_datatype(soup.find(text='Net Income Avi to Common').parent.parent.next_sibling.text) / 1000
-
-        df.loc['Cash and Equivalents'] = to_datatype(soup.find(text='Total Cash').parent.parent.next_sibling.text) / 1000
-        df.loc['Total Debt'] = to_datatype(soup.find(text='Total Debt').parent.parent.next_sibling.text) / 1000
+            ebit_actual += statement_value(dfs[statements[0]], 'Tax Provision', 'TTM')
+        except (KeyError, TypeError):
+            pass
+        # try to add back interest expense and interest income
+        try:
+            ebit_actual += statement_value(dfs[statements[0]], 'Interest Expense', 'TTM')
+        except (KeyError, TypeError):
+            pass
+        try:
+            ebit_actual -= statement_value(dfs[statements[0]], 'Interest Income', 'TTM')
+        except (KeyError, TypeError):
+            pass
+        # try to add back depreciation
+        try:
+            ebit_actual += statement_value(dfs[statements[0]], 'Reconciled Depreciation', 'TTM')
+        except (KeyError, TypeError):
+            pass
+    except (TypeError, AttributeError):
+        # print(traceback.format_exc())
+        return ''
+    return ebit_actual
 
-        df.loc['Market Cap'] = df.loc['Share Price'] * df.loc['Shares Outstanding']
-        df.loc['Enterprise Value'] = df.loc['Market Cap'] + df.loc['Total Debt'] - df.loc['Cash and Equivalents']
 
-        df.loc['Debt/Equity'] = df.loc['Total Debt'] / df.loc['Market Cap']
-        df.loc['Unlevered Beta'] = df.loc['Equity Beta'] / (1 + (1 - tax_rate) * df.loc['Debt/Equity'])
-        df.loc['Unlevered Beta'] = df.loc['Unlevered Beta'].apply(lambda x: x or '')
+# builds a peer's row of the peers sheet from the scraped "data", which is scraped now if it was not passed. a missing
+# EBITDA is constructed from the valued company's statements, while the values derived from the others (which
+# depend on the valued company's tax rate) are calculated for every row at once by the PeerTable it is put in
+@traced(args=('ticker',))
+def get_peer(ticker, dfs, data=None):
+    if data is None:
+        data = get_peer_data(ticker)
+    if 'Total Debt' in data and data.get('LTM EBITDA', '') is None:
+        data = dict(data, **{'LTM EBITDA': constructed_ebitda(dfs)})
+    return PeerRecord(ticker, data)
 
-        df.loc['P/E Ratio'] = max(df.loc['Market Cap', 'Data'] / df.loc['LTM Earnings', 'Data'], 0.)
-        df.loc['EV/Sales'] = max(df.loc['Enterprise Value', 'Data'] / df.loc['LTM Sales', 'Data'], 0.)
-        df.loc['EV/EBITDA'] = max(df.loc['Enterprise Value', 'Data'] / df.loc['LTM EBITDA', 'Data'], 0.)
-    except (TypeError, AttributeError):
-        # print(traceback.format_exc())
-        pass
 
-    # get bond ratings and spread
-    url = f'https://www.macroaxis.com/invest/bond/{ticker}'
-    res = requests.get(url, headers=headers)
-    sleep(1)
-    soup = BeautifulSoup(res.text, features='lxml')
+# where the value of each label on the profile page is, from the element holding the label. the details are four nodes
+# after their labels, counting the ": " text and the empty comments react leaves around it
+PROFILE = {'Description': '../following-sibling::*[1]', 'Full Time Employees': 'following-sibling::node()[4][self::*]',
+           'Sector(s)': 'following-sibling::node()[4][self::*]', 'Industry': 'following-sibling::node()[4][self::*]'}
 
-    try:
-        data = []
-        headings = []
-        for header in soup.find(text='Issue Date').parent.parent.children:
-            headings.append(header.text.strip())
-        for row in soup.find(text='Issue Date').parent.parent.next_siblings:
-            entry = {}
-            for header, datum in zip(headings, row.children):
-                entry[header] = to_datatype(datum.text.strip(), parse_dates=True)
-            data.append(entry)
-
-        debt_frame = pd.DataFrame(data).set_index('')
-        debt_frame['Spread'] = debt_frame['Coupon'] - debt_frame['Ref Coupon']
-        debt_frame['Length'] = debt_frame['Maturity'] - debt_frame['Issue Date']
 
-        # get all bonds with an initial time to maturity of approximately 10 years (between 8 and 12) and calculate the average spread
-        df.loc['Bond Spread (10Y)'] = debt_frame.loc[(debt_frame['Length'] >= dt.timedelta(days=2920)) & (debt_frame['Length'] <= dt.timedelta(days=4380))]['Spread'].mean() / 100
-        # get all bonds with an initial time to maturity of approximately 30 years (between 28 and 32) and calculate the average spread
-        df.loc['Bond Spread (30Y)'] = debt_frame.loc[(debt_frame['Length'] >= dt.timedelta(days=10220)) & (debt_frame['Length'] <= dt.timedelta(days=11680))]['Spread'].mean() / 100
-    except AttributeError:
-        pass
+# reads a company's summary from its profile page into "df" (see get_summary), stopping at the first value that is
+# missing
+def read_profile(page, df):
+    values = find_values(parse_html(page), PROFILE, {'Peer': '//h1'})
 
     try:
-        df.loc['Bond Rating (S&P)'] = soup.find(text='Average S&P Rating').parent.next_sibling.text
-    except AttributeError:
+        df.loc['Peer'] = values['Peer']
+        df.loc['Summary'] = values['Description']
+        df.loc['Employees'] = values['Full Time Employees']
+        df.loc['Sector'] = values['Sector(s)']
+        df.loc['Industry'] = values['Industry']
+    except KeyError:
+        # print(traceback.format_exc())
         pass
-
     return df
 
 
-def get_summary(ticker):
+# a summary with nothing but the link to the ticker
+def blank_summary(ticker):
     labels = ['Peer', 'Sector', 'Industry', 'Employees', 'Summary', 'Link']
     df = pd.DataFrame(columns=['Data'])
     for l in labels:
         df.loc[l] = ''
+    df.loc['Link'] = f'https://finance.yahoo.com/quote/{ticker}'
+    return df
 
-    url = f'https://finance.yahoo.com/quote/{ticker}/profile?p={ticker}'
-    res = requests.get(url, headers=headers)
-    sleep(1)
-    soup = BeautifulSoup(res.text, features='lxml')
 
-    try:
-        df.loc['Peer'] = soup.find('h1').text
-        df.loc['Summary'] = soup.find(text='Description').parent.parent.next_sibling.text
-        df.loc['Employees'] = soup.find(text='Full Time Employees').parent.next_sibling.next_sibling.next_sibling.next_sibling.text
-        df.loc['Sector'] = soup.find(text='Sector(s)').parent.next_sibling.next_sibling.next_sibling.next_sibling.text
-        df.loc['Industry'] = soup.find(text='Industry').parent.next_sibling.next_sibling.next_sibling.next_sibling.text
-    except (TypeError, AttributeError) as e:
-        # print(traceback.format_exc())
-        pass
+@traced(args=('ticker',))
+def get_summary(ticker):
     # even if getting the data fails, always include the link to the ticker
-    df.loc['Link'] = f'https://finance.yahoo.com/quote/{ticker}'
+    df = blank_summary(ticker)
+
+    url = page_url(ticker, 'profile')
+    read_profile(fetch(url, 'profile'), df)
+
+    if (store := get_store()) is not None:
+        store.put_record(ticker, 'summary', column_to_json(df))
     return df
 
 
-# peers must be sent as a list-like
-def make_peers(ticker, peers, tax_rate, dfs, book: xls.Workbook, peer_gen_depth=0, driver: webdriver.Chrome = None):
+# runs "scrape" in the current span, returning the FetchError of a page that could not be downloaded instead of raising it
+def _attempt(scrape):
+    def attempt(ticker):
+        try:
+            return scrape(ticker)
+        except FetchError as e:
+            return e
+    return in_current_span(attempt)
+
+
+# scrapes the tickers whose "results" are FetchErrors once more, now that the others are done and the hosts that failed
+# them have had time to recover (see src.fetch.download). tickers that fail again are reported and get the row made by
+# "blank", so a peer is never left blank without saying so
+def _retry_failed(executor, scrape, tickers, results, blank, what):
+    failed = [i for i, r in enumerate(results) if isinstance(r, FetchError)]
+    for i, result in zip(failed, executor.map(_attempt(scrape), [tickers[i] for i in failed])):
+        if isinstance(result, FetchError):
+            print(f'Could not scrape the {what} of {tickers[i]}, leaving it blank: {result}')
+            result = blank(tickers[i])
+        results[i] = result
+    return results
+
+
+# peers must be sent as a list-like. returns the peers sheet as a PeerTable (see src.peertable) with the main ticker's
+# row first, and the summaries of the main ticker and its peers, and writes them to the "Peers" and "Peer Summaries"
+# sheets unless "book" is None. the peers are scraped by a pool of "workers" threads, while the rate at which each host is hit is limited by
+# the fetcher. if "peer_data" is given (see src.batch.PeerData), peers are read through it so scrapes can be shared
+# between models
+@traced(args=('ticker',))
+def make_peers(ticker, peers, tax_rate, dfs, book: xls.Workbook, peer_gen_depth=0, driver: webdriver.Chrome = None, workers=4, peer_data=None,
+               peer_fan_out=FAN_OUT, max_peers=MAX_PEERS):
+    # if "peer_gen_depth" > 0, generate a list of peers by reading the "People Also Watch" tab on Yahoo
+    # for every level of depth, add peers of the given peer to the list.
+    # e.g. peer_gen_depth = 1 means only the main  ticker's peers are added to the list,
+    # peer_gen_depth = 2 means peers of the main ticker's peers are also added to the list, and so on.
+    # the levels are searched breadth first, taking at most "peer_fan_out" peers from each ticker and
+    # "max_peers" in total (see src.peers.discover_peers)
+    # note that peers passed by the user to this "make_peers" function will not
+    # have their peers checked, regardless of the depth
+    if peer_gen_depth > 0:
+        for p in discover_peers(ticker, peer_gen_depth, driver, workers, peer_fan_out, max_peers):
+            if p not in peers:
+                peers.append(p)
+    try:
+        peers.remove(ticker)
+    except ValueError:
+        pass
+
+    if peer_data is None:
+        scrape_peer, scrape_summary = lambda t: get_peer(t, dfs), get_summary
+    else:
+        scrape_peer, scrape_summary = lambda t: get_peer(t, dfs, peer_data.peer(t)), peer_data.summary
+
+    # scrape the main ticker and all of its peers concurrently. map returns the results in the order they were
+    # submitted, so the rows are still in the same order as the peers were given
+    tickers = [ticker] + peers
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        records = executor.map(_attempt(scrape_peer), tickers)
+        summary_dfs = executor.map(_attempt(scrape_summary), tickers)
+        records = _retry_failed(executor, scrape_peer, tickers, list(records), lambda t: get_peer(t, dfs, {}), 'peer data')
+        summary_dfs = _retry_failed(executor, scrape_summary, tickers, list(summary_dfs), blank_summary, 'summary')
+    table = PeerTable(records, tax_rate)
+
+    if book is not None:
+        write_peers(tax_rate, table, summary_dfs, book)
+
+    return table, summary_dfs
+
+
+# writes the "Peers" and "Peer Summaries" sheets, with the main ticker's row and summary first
+@traced()
+def write_peers(tax_rate, table, summary_dfs, book: xls.Workbook):
     # a list of columns that should be seperated from the next column
     column_splits = ['EV/EBITDA', 'Enterprise Value', 'Bond Spread (30Y)', 'LTM Earnings', 'Unlevered Beta']
 
-    header = book.add_format({
+    header = get_format(book, {
         'bold': True,
         'top': 1,
         'bottom': 1,
@@ -429,74 +553,40 @@ def make_peers(ticker, peers, tax_rate, dfs, book: xls.Workbook, peer_gen_depth=
         'valign': 'vcenter',
     })
 
-    bold = book.add_format({
+    bold = get_format(book, {
         'bold': True,
     })
 
-    main_ticker = book.add_format({
+    main_ticker = get_format(book, {
         'num_format': 43,
         'bg_color': '#E7E6E6',
         'top': 1,
         'bottom': 1,
     })
 
-    entry = book.add_format({
+    entry = get_format(book, {
         'num_format': 43,
     })
 
-    last_entry = book.add_format({
+    last_entry = get_format(book, {
         'num_format': 43,
         'bottom': 1,
     })
 
-    summary = book.add_format({
+    summary = get_format(book, {
 
     })
 
-    last_summary = book.add_format({
+    last_summary = get_format(book, {
         'bottom': 1,
     })
 
-    main_summary = book.add_format({
+    main_summary = get_format(book, {
         'bg_color': '#E7E6E6',
         'top': 1,
         'bottom': 1,
     })
 
-    # if "peer_gen_depth" > 0, generate a list of peers by reading the "People Also Watch" tab on Yahoo
-    # for every level of depth, add peers of the given peer to the list.
-    # e.g. peer_gen_depth = 1 means only the main  ticker's peers are added to the list,
-    # peer_gen_depth = 2 means peers of the main ticker's peers are also added to the list, and so on
-    def generate_peers(t: str, peers: list, driver: webdriver.Chrome, depth: int):
-        # base case when the given depth was reached
-        if depth == 0:
-            return
-
-        try:
-            driver.get(f'https://finance.yahoo.com/quote/{t}?p={t}')
-            sleep(5)
-            WebDriverWait(driver, 10).until(
-                EC.element_to_be_clickable((By.XPATH, f"//section[@id = 'recommendations-by-symbol']//a"))
-            )
-
-            html = driver.execute_script('return document.body.innerHTML;')
-            soup = BeautifulSoup(html, 'lxml')
-            for p in soup.find('h2', text='People Also Watch').parent.find_all('a'):
-                if p.text not in peers and p.text != t:
-                    peers.append(p.text)
-                    generate_peers(p.text, peers, driver, depth - 1)
-        finally:
-            return
-
-    # generate the peer list and add it to the current peers
-    # note that peers passed by the user to this "make_peers" function will not
-    # have their peers checked, regardless of the depth
-    generate_peers(ticker, peers, driver, peer_gen_depth)
-    try:
-        peers.remove(ticker)
-    except ValueError:
-        pass
-
     sheet = book.add_worksheet('Peers')
     summaries = book.add_worksheet('Peer Summaries')
     sheet.freeze_panes(4, 1)
@@ -508,12 +598,12 @@ def make_peers(ticker, peers, tax_rate, dfs, book: xls.Workbook, peer_gen_depth=
 
     sheet.set_row(2, 52.8)
 
-    def write_items(df, row, format, sheet):
+    def write_items(labels, values, row, format, sheet):
         # keep track of seperators between columns
         s = 0
-        for i, item in enumerate(df.index):
+        for i, (item, value) in enumerate(zip(labels, values)):
             try:
-                sheet.write(row, i + s, item if format == header else df.loc[item, 'Data'], format)
+                sheet.write(row, i + s, value, format)
             except Exception:
                 # write an empty cell if the current data could not be written
                 sheet.write(row, i + s, '', format)
@@ -525,72 +615,71 @@ def make_peers(ticker, peers, tax_rate, dfs, book: xls.Workbook, peer_gen_depth=
 
         sheet.set_column(0, 0, 32)
 
-    df = get_peer(ticker, tax_rate, dfs)
+    company_summary_df, *summary_dfs = summary_dfs
     # write the headers and the main ticker's info
-    write_items(df, 2, header, sheet)
-    write_items(df, 3, main_ticker, sheet)
+    write_items(LABELS, LABELS, 2, header, sheet)
+    write_items(LABELS, table.values[0].tolist(), 3, main_ticker, sheet)
 
     # write the summary headers and the main ticker's summary
-    df = get_summary(ticker)
-    write_items(df, 0, header, summaries)
-    write_items(df, 1, main_summary, summaries)
+    write_items(company_summary_df.index, company_summary_df.index, 0, header, summaries)
+    write_items(company_summary_df.index, company_summary_df['Data'].tolist(), 1, main_summary, summaries)
 
-    for p, peer in enumerate(peers):
+    for p, (values, summary_df) in enumerate(zip(table.values[1:].tolist(), summary_dfs)):
         # write info about a peer
-        df = get_peer(peer, tax_rate, dfs)
-        write_items(df, p + 4, entry if p + 1 < len(peers) else last_entry, sheet)
+        write_items(LABELS, values, p + 4, entry if p + 2 < len(table) else last_entry, sheet)
         # write peer summary
-        df = get_summary(peer)
-        write_items(df, p + 2, summary if p + 1 < len(peers) else last_summary, summaries)
+        write_items(summary_df.index, summary_df['Data'].tolist(), p + 2, summary if p + 2 < len(table) else last_summary, summaries)
 
 
-def make_dcf(dfs: dict, ticker: str, peers: list, tax_rate: float, rfr: float, mrp: float, terminal_growth: float, forecast_years: int, book: xls.Workbook):
+# gets the company-specific inputs of the DCF model from its financial statements and analyst estimates, and saves
+# them to the snapshot store (see src.store)
+def get_dcf_inputs(dfs: dict, ticker: str):
     statements = ['financials', 'balance-sheet', 'cash-flow']  # "financials" means income statement
 
     # get values from financial statements required to make DCF
     revenue_actual = dfs[statements[0]].loc['Total Revenue', dfs[statements[0]].columns[1]]
 
     try:
-        ebit_actual = dfs[statements[0]].loc['EBIT', dfs[statements[0]].columns[1]]
+        ebit_actual = statement_value(dfs[statements[0]], 'EBIT', dfs[statements[0]].columns[1])
     # if EBIT is not a line item, construct it manually:
     except (KeyError, TypeError):
         # start with net income (this value should always be present on yahoo, everything else may not be)
         ebit_actual = dfs[statements[0]].loc['Net Income Common Stockholders', dfs[statements[0]].columns[1]]
         # try to add back taxes to net income
         try:
-            ebit_actual += dfs[statements[0]].loc['Tax Provision', dfs[statements[0]].columns[1]]
+            ebit_actual += statement_value(dfs[statements[0]], 'Tax Provision', dfs[statements[0]].columns[1])
         except (KeyError, TypeError):
             pass
         # try to add back interest expense and interest income (may not be a line item)
         try:
-            ebit_actual += dfs[statements[0]].loc['Interest Expense', dfs[statements[0]].columns[1]]
+            ebit_actual += statement_value(dfs[statements[0]], 'Interest Expense', dfs[statements[0]].columns[1])
         except (KeyError, TypeError):
             pass
         try:
-            ebit_actual -= dfs[statements[0]].loc['Interest Income', dfs[statements[0]].columns[1]]
+            ebit_actual -= statement_value(dfs[statements[0]], 'Interest Income', dfs[statements[0]].columns[1])
         except (KeyError, TypeError):
             pass
 
     revenue_ttm = dfs[statements[0]].loc['Total Revenue', dfs[statements[0]].columns[0]]
 
     try:
-        ebit_ttm = dfs[statements[0]].loc['EBIT', dfs[statements[0]].columns[0]]
+        ebit_ttm = statement_value(dfs[statements[0]], 'EBIT', dfs[statements[0]].columns[0])
     # if EBIT is not a line item, construct it manually:
     except (KeyError, TypeError):
         # start with net income (this value should always be present on yahoo, everything else may not be)
         ebit_ttm = dfs[statements[0]].loc['Net Income Common Stockholders', dfs[statements[0]].columns[0]]
         # try to add back taxes to net income
         try:
-            ebit_ttm += dfs[statements[0]].loc['Tax Provision', dfs[statements[0]].columns[0]]
+            ebit_ttm += statement_value(dfs[statements[0]], 'Tax Provision', dfs[statements[0]].columns[0])
         except (KeyError, TypeError):
             pass
         # try to add back interest expense and interest income (may not be a line item)
         try:
-            ebit_ttm += dfs[statements[0]].loc['Interest Expense', dfs[statements[0]].columns[0]]
+            ebit_ttm += statement_value(dfs[statements[0]], 'Interest Expense', dfs[statements[0]].columns[0])
         except (KeyError, TypeError):
             pass
         try:
-            ebit_ttm -= dfs[statements[0]].loc['Interest Income', dfs[statements[0]].columns[0]]
+            ebit_ttm -= statement_value(dfs[statements[0]], 'Interest Income', dfs[statements[0]].columns[0])
         except (KeyError, TypeError):
             pass
 
@@ -615,11 +704,11 @@ def make_dcf(dfs: dict, ticker: str, peers: list, tax_rate: float, rfr: float, m
 
     try:
         # get the first two years' growth rate from the Analyst section of yahoo finance
-        url = f'https://finance.yahoo.com/quote/{ticker}/analysis?p={ticker}'
-        res = requests.get(url, headers=headers)
-        soup = BeautifulSoup(res.text, features='lxml')
-        growth_rate_1 = to_datatype([c for c in soup.find('td', text='Sales Growth (year/est)').next_siblings][2].text)
-        growth_rate_2 = to_datatype([c for c in soup.find('td', text='Sales Growth (year/est)').next_siblings][3].text)
+        with span('analysis', ticker=ticker):
+            url = page_url(ticker, 'analysis')
+            soup = bs4.BeautifulSoup(fetch(url, 'analysis'), features='lxml')
+            growth_rate_1 = parse_value([c for c in soup.find('td', text='Sales Growth (year/est)').next_siblings][2].text)
+            growth_rate_2 = parse_value([c for c in soup.find('td', text='Sales Growth (year/est)').next_siblings][3].text)
         # reverse the columns so pct_change gets the growth rate of the past revenues in the income statement
         rates = dfs[statements[0]][dfs[statements[0]].columns[::-1]].loc['Total Revenue'].pct_change().dropna()[:-1]
         # the growth rate to be used for the remaining years in the DCF forecast. not to be confused with the terminal growth rate.
@@ -631,62 +720,103 @@ def make_dcf(dfs: dict, ticker: str, peers: list, tax_rate: float, rfr: float, m
         growth_rate_2 = rates
         growth_rate_f = rates
 
-    header = book.add_format({
+    inputs = {
+        'revenue_actual': revenue_actual,
+        'ebit_actual': ebit_actual,
+        'ebit_margin': ebit_margin,
+        'depr_amort_pct': depr_amort_pct,
+        'capex_pct': capex_pct,
+        'nwc_pct': nwc_pct,
+        'growth_rate_1': growth_rate_1,
+        'growth_rate_2': growth_rate_2,
+        'growth_rate_f': growth_rate_f,
+    }
+    if (store := get_store()) is not None:
+        store.put_record(ticker, 'estimates', inputs)
+    return inputs
+
+
+# "inputs" can be passed to reuse the output of "get_dcf_inputs"
+@traced(args=('ticker',))
+def make_dcf(dfs: dict, ticker: str, peers: list, tax_rate: float, rfr: float, mrp: float, terminal_growth: float, forecast_years: int, book: xls.Workbook,
+             inputs: dict = None, table=None):
+    if inputs is None:
+        inputs = get_dcf_inputs(dfs, ticker)
+    # the results of the formulas, written along with them so the sheet can be read without recalculating it. without
+    # the peers' data they are left at 0, like before
+    values = {} if table is None else sheet_values(inputs, table, tax_rate, rfr, mrp, terminal_growth, forecast_years)
+    revenue_actual = inputs['revenue_actual']
+    ebit_actual = inputs['ebit_actual']
+    ebit_margin = inputs['ebit_margin']
+    depr_amort_pct = inputs['depr_amort_pct']
+    capex_pct = inputs['capex_pct']
+    nwc_pct = inputs['nwc_pct']
+    growth_rate_1 = inputs['growth_rate_1']
+    growth_rate_2 = inputs['growth_rate_2']
+    growth_rate_f = inputs['growth_rate_f']
+
+    header = get_format(book, {
         'font_color': 'white',
         'bg_color': '#034638',
         'bold': True,
     })
 
-    subheader = book.add_format({
+    subheader = get_format(book, {
         'bold': True,
     })
 
-    line_item = book.add_format({
+    line_item = get_format(book, {
         'align': 'left',
     })
 
-    regular_data = book.add_format({
+    regular_data = get_format(book, {
         'num_format': 43,
     })
 
-    percent = book.add_format({
+    percent = get_format(book, {
         'num_format': 10,
     })
 
-    supp_line_item = book.add_format({
+    supp_line_item = get_format(book, {
         'align': 'left',
         'italic': True,
     })
 
-    supp_data = book.add_format({
+    supp_data = get_format(book, {
         'num_format': 43,
         'italic': True,
     })
 
-    supp_percent = book.add_format({
+    supp_percent = get_format(book, {
         'num_format': 10,
         'italic': True,
     })
 
-    key_figure = book.add_format({
+    key_figure = get_format(book, {
         'num_format': 43,
         'top': 1,
     })
 
-    bottom_line = book.add_format({
+    bottom_line = get_format(book, {
         'num_format': 43,
         'bottom': 6,
     })
 
-    notes = book.add_format({
+    notes = get_format(book, {
         'text_wrap': True,
         'valign': 'top',
     })
 
     sheet = book.add_worksheet('DCF')
+
+    def write_formula(row, col, formula, format=None):
+        sheet.write_formula(row, col, formula, format, values.get(f'{colnum_string(col)}{row + 1}', 0))
     # make sure the header encompasses either the length of peer valuation table and the forecast table
     header_size = max(9, forecast_years + 2)
 
+    # every row is written in full before the next one, so the sheet can be written in constant memory mode (see
+    # src.workbook)
+
     # write the WACC header
     sheet.write(0, 0, '*in thousands, except per-share items. Next steps after generation: 1. Check that WACC inputs are correct (especially debt spread). 2. Update growth rates as desired. 3. Update all other DCF inputs as desired.')
     sheet.merge_range(1, 0, 1, header_size - 1, 'Cost of Capital', header)
@@ -696,42 +826,41 @@ def make_dcf(dfs: dict, ticker: str, peers: list, tax_rate: float, rfr: float, m
     sheet.write(2, 3, 'Cost of Debt', subheader)
     sheet.write(2, 6, 'WACC', subheader)
 
-    # write the cost of equity line items and values
+    # write the cost of equity (columns A-B), cost of debt (columns D-F) and WACC calculation (columns G-H) lines
     sheet.write(3, 0, 'Risk Free Rate', line_item)
     sheet.write(3, 1, rfr, percent)
-    sheet.write(4, 0, 'Market Risk Premium', line_item)
-    sheet.write(4, 1, mrp, percent)
-    # use competitor beta
-    sheet.write(5, 0, 'Beta', line_item)
-    sheet.write(5, 1, f"=AVERAGE(Peers!$W$5:$W${len(peers) + 4}) * (1 + (1-$B$14) * Peers!$K$4)", regular_data)
-    sheet.write(6, 0, 'Cost of Equity', line_item)
-    sheet.write(6, 1, "=B4+B5*B6", percent)
-
-    # write the cost of debt line items and values
     sheet.write(3, 3, 'Risk Free Rate', line_item)
     sheet.write(3, 4, rfr, percent)
+    sheet.write(3, 6, 'Weight of Equity', line_item)
+    write_formula(3, 7, "=Peers!$F$4/(Peers!$F$4 + Peers!$G$4)", percent)
+
+    sheet.write(4, 0, 'Market Risk Premium', line_item)
+    sheet.write(4, 1, mrp, percent)
     sheet.write(4, 3, 'Spread', line_item)
     # use 30Y spread but if they are unavailable use 10 year spread
-    sheet.write(4, 4, "=IF(ISBLANK(Peers!$N$4), Peers!$M$4, Peers!$N$4)", percent)
+    write_formula(4, 4, "=IF(ISBLANK(Peers!$N$4), Peers!$M$4, Peers!$N$4)", percent)
     # indicate which type of bond spread was used, or if no bond spreads could be found
-    sheet.write(4, 5, '=IF(ISBLANK(Peers!$N$4), IF(ISBLANK(Peers!$M$4), "NEEDS TO BE UPDATED", "10Y spread"), "30Y spread")', line_item)
-    sheet.write(5, 3, 'Cost of Debt', line_item)
-    sheet.write(5, 4, "=E4+E5", percent)
-
-    # write the WACC calculation lines
-    sheet.write(3, 6, 'Weight of Equity', line_item)
-    sheet.write(3, 7, "=Peers!$F$4/(Peers!$F$4 + Peers!$G$4)", percent)
+    write_formula(4, 5, '=IF(ISBLANK(Peers!$N$4), IF(ISBLANK(Peers!$M$4), "NEEDS TO BE UPDATED", "10Y spread"), "30Y spread")', line_item)
     sheet.write(4, 6, 'Weight of Debt', line_item)
-    sheet.write(4, 7, "=Peers!$G$4/(Peers!$F$4 + Peers!$G$4)", percent)
+    write_formula(4, 7, "=Peers!$G$4/(Peers!$F$4 + Peers!$G$4)", percent)
+
+    # use competitor beta
+    sheet.write(5, 0, 'Beta', line_item)
+    write_formula(5, 1, f"=AVERAGE(Peers!$W$5:$W${len(peers) + 4}) * (1 + (1-$B$14) * Peers!$K$4)", regular_data)
+    sheet.write(5, 3, 'Cost of Debt', line_item)
+    write_formula(5, 4, "=E4+E5", percent)
     sheet.write(5, 6, 'WACC', line_item)
-    sheet.write(5, 7, "=B7 * H4 + E6 * H5", percent)
+    write_formula(5, 7, "=B7 * H4 + E6 * H5", percent)
+
+    sheet.write(6, 0, 'Cost of Equity', line_item)
+    write_formula(6, 1, "=B4+B5*B6", percent)
 
     # write the DCF inputs header
     sheet.merge_range(10, 0, 10, header_size - 1, 'DCF Model Inputs', header)
 
     # write the input lines and values
     sheet.write(11, 0, 'Cost of Capital', line_item)
-    sheet.write(11, 1, "=H6", percent)
+    write_formula(11, 1, "=H6", percent)
     sheet.write(12, 0, 'Terminal Growth Rate', line_item)
     sheet.write(12, 1, terminal_growth, percent)
     sheet.write(13, 0, 'Tax Rate', line_item)
@@ -745,58 +874,52 @@ def make_dcf(dfs: dict, ticker: str, peers: list, tax_rate: float, rfr: float, m
     sheet.write(16, 1, nwc_pct, percent)
 
     sheet.write(17, 0, 'Current Debt Value', line_item)
-    sheet.write(17, 1, "=Peers!$G$4", regular_data)
+    write_formula(17, 1, "=Peers!$G$4", regular_data)
     sheet.write(18, 0, 'Current Cash Value', line_item)
-    sheet.write(18, 1, "=Peers!$H$4", regular_data)
+    write_formula(18, 1, "=Peers!$H$4", regular_data)
     sheet.write(19, 0, 'Shares Outstanding', line_item)
-    sheet.write(19, 1, "=Peers!$U$4", regular_data)
+    write_formula(19, 1, "=Peers!$U$4", regular_data)
 
     # write the DCF model header
     sheet.merge_range(23, 0, 23, header_size - 1, 'DCF Model', header)
-    # write the period headers
-    sheet.write(26, 1, f'{dt.datetime.today().year - 1} Actual', subheader)
-    for i in range(forecast_years):
-        sheet.write(26, i + 2, dt.datetime.today().year + i, subheader)
 
-    # write the DCF model line items
+    # write the forecast assumptions
     sheet.write(24, 0, 'Revenue Growth', supp_line_item)
-    sheet.write(25, 0, 'EBIT Margin', supp_line_item)
-    sheet.write(27, 0, 'Revenue', line_item)
-    sheet.write(28, 0, 'EBIT', line_item)
-    sheet.write(29, 0, 'Tax', line_item)
-    sheet.write(30, 0, 'NOPAT', line_item)
-    sheet.write(31, 0, 'Depreciation & Amortization', line_item)
-    sheet.write(32, 0, 'Capital Expenditures', line_item)
-    sheet.write(33, 0, 'Increase in Working Capital', line_item)
-    sheet.write(34, 0, 'Free Cash Flow', line_item)
-    sheet.write(35, 0, 'Discounted FCF', line_item)
-    sheet.write(36, 0, 'Terminal Value', line_item)
-
-    # write the historic DCF values
-    sheet.write(27, 1, revenue_actual, key_figure)
-    sheet.write(28, 1, ebit_actual, regular_data)
-    sheet.write(34, 1, "", key_figure)
-
-    # write the forecast figures
     for i in range(forecast_years):
         growth = growth_rate_1 if i == 0 else (growth_rate_2 if i == 1 else growth_rate_f)
-        c = colnum_string(i + 2)
-        p = colnum_string(i + 1)
-
         sheet.write(24, i + 2, growth, supp_percent)
+    sheet.write(25, 0, 'EBIT Margin', supp_line_item)
+    for i in range(forecast_years):
         sheet.write(25, i + 2, ebit_margin, supp_percent)
-        sheet.write(27, i + 2, f"={p}28 * ({c}25 + 1)", key_figure)
-        sheet.write(28, i + 2, f"={c}28 * {c}26", regular_data)
-        sheet.write(29, i + 2, f"=IF({c}29 > 0, {c}29 * $B$14, 0)", regular_data)
-        sheet.write(30, i + 2, f"={c}29 - {c}30", regular_data)
-        sheet.write(31, i + 2, f"={c}28 * $B$15", regular_data)
-        sheet.write(32, i + 2, f"={c}28 * $B$16", regular_data)
-        sheet.write(33, i + 2, f"={c}28 * $B$17", regular_data)
-        sheet.write(34, i + 2, f"={c}31 + {c}32 - {c}33 - {c}34", key_figure)
-        sheet.write(35, i + 2, f"={c}35 / ((1+$B$12) ^ {i + 1})", regular_data)
+
+    # write the period headers
+    sheet.write(26, 1, f'{dt.datetime.today().year - 1} Actual', subheader)
+    for i in range(forecast_years):
+        sheet.write(26, i + 2, dt.datetime.today().year + i, subheader)
+
+    # write the DCF model line items, their historic values and their forecast formulas, where {c} is the column of
+    # the year, {p} the column of the year before it and {n} how many years away it is
+    forecast_rows = [
+        ('Revenue', revenue_actual, key_figure, "={p}28 * ({c}25 + 1)", key_figure),
+        ('EBIT', ebit_actual, regular_data, "={c}28 * {c}26", regular_data),
+        ('Tax', None, None, "=IF({c}29 > 0, {c}29 * $B$14, 0)", regular_data),
+        ('NOPAT', None, None, "={c}29 - {c}30", regular_data),
+        ('Depreciation & Amortization', None, None, "={c}28 * $B$15", regular_data),
+        ('Capital Expenditures', None, None, "={c}28 * $B$16", regular_data),
+        ('Increase in Working Capital', None, None, "={c}28 * $B$17", regular_data),
+        ('Free Cash Flow', "", key_figure, "={c}31 + {c}32 - {c}33 - {c}34", key_figure),
+        ('Discounted FCF', None, None, "={c}35 / ((1+$B$12) ^ {n})", regular_data),
+    ]
+    for row, (name, actual, actual_format, formula, format) in enumerate(forecast_rows, 27):
+        sheet.write(row, 0, name, line_item)
+        if actual is not None:
+            sheet.write(row, 1, actual, actual_format)
+        for i in range(forecast_years):
+            write_formula(row, i + 2, formula.format(c=colnum_string(i + 2), p=colnum_string(i + 1), n=i + 1), format)
 
     # write the terminal value
-    sheet.write(
+    sheet.write(36, 0, 'Terminal Value', line_item)
+    write_formula(
         36,
         forecast_years + 1,
         f"={colnum_string(forecast_years + 1)}36 / (1+$B$12) / ($B$12 - $B$13)",
@@ -808,11 +931,11 @@ def make_dcf(dfs: dict, ticker: str, peers: list, tax_rate: float, rfr: float, m
 
     # write the DCF outputs
     sheet.write(41, 0, 'Enterprise Value', line_item)
-    sheet.write(41, 1, f"=SUM($C$36:${colnum_string(forecast_years + 1)}$37)", regular_data)
+    write_formula(41, 1, f"=SUM($C$36:${colnum_string(forecast_years + 1)}$37)", regular_data)
     sheet.write(42, 0, 'Equity Value', line_item)
-    sheet.write(42, 1, "=$B$42 - $B$18 + $B$19", regular_data)
+    write_formula(42, 1, "=$B$42 - $B$18 + $B$19", regular_data)
     sheet.write(43, 0, 'Equity Value per Share', line_item)
-    sheet.write(43, 1, "=$B$43 / $B$20", bottom_line)
+    write_formula(43, 1, "=$B$43 / $B$20", bottom_line)
 
     # write the peer valuations header and subheaders
     sheet.merge_range(47, 0, 47, header_size - 1, 'Peer Implied Valuations', header)
@@ -825,51 +948,154 @@ def make_dcf(dfs: dict, ticker: str, peers: list, tax_rate: float, rfr: float, m
     sheet.write(48, 8, 'Implied Range Maximum', subheader)
     # write the peer implied valuations
     sheet.write(49, 0, 'Price/Earnings', line_item)
-    sheet.write(49, 1, f"=Peers!$B$4")
-    sheet.write(49, 2, f'=AVERAGEIF(Peers!$B$5:$B${len(peers) + 4}, ">0", Peers!$B$5:$B${len(peers) + 4})', regular_data)
-    sheet.write(49, 3, f"=_xlfn.MINIFS(Peers!$B$5:$B${len(peers) + 4}, Peers!$B$5:$B${len(peers) + 4}, \">0\")", regular_data)
-    sheet.write(49, 4, f"=MAX(Peers!$B$5:$B${len(peers) + 4})", regular_data)
-    sheet.write(49, 6, f'=IF(C51 > 0, C50 * Peers!$R$4 / $B$20, "")', regular_data)
-    sheet.write(49, 7, f'=IF(C51 > 0, D50 * Peers!$R$4 / $B$20, "")', regular_data)
-    sheet.write(49, 8, f'=IF(C51 > 0, E50 * Peers!$R$4 / $B$20, "")', regular_data)
+    write_formula(49, 1, f"=Peers!$B$4")
+    write_formula(49, 2, f'=AVERAGEIF(Peers!$B$5:$B${len(peers) + 4}, ">0", Peers!$B$5:$B${len(peers) + 4})', regular_data)
+    write_formula(49, 3, f"=_xlfn.MINIFS(Peers!$B$5:$B${len(peers) + 4}, Peers!$B$5:$B${len(peers) + 4}, \">0\")", regular_data)
+    write_formula(49, 4, f"=MAX(Peers!$B$5:$B${len(peers) + 4})", regular_data)
+    write_formula(49, 6, f'=IF(C51 > 0, C50 * Peers!$R$4 / $B$20, "")', regular_data)
+    write_formula(49, 7, f'=IF(C51 > 0, D50 * Peers!$R$4 / $B$20, "")', regular_data)
+    write_formula(49, 8, f'=IF(C51 > 0, E50 * Peers!$R$4 / $B$20, "")', regular_data)
 
     sheet.write(50, 0, 'EV/Sales', line_item)
-    sheet.write(50, 1, f"=Peers!$C$4")
-    sheet.write(50, 2, f'=AVERAGEIF(Peers!$C$5:$C${len(peers) + 4}, ">0", Peers!$C$5:$C${len(peers) + 4})', regular_data)
-    sheet.write(50, 3, f"=_xlfn.MINIFS(Peers!$C$5:$C${len(peers) + 4}, Peers!$C$5:$C${len(peers) + 4}, \">0\")", regular_data)
-    sheet.write(50, 4, f"=MAX(Peers!$C$5:$C${len(peers) + 4})", regular_data)
-    sheet.write(50, 6, f'=IF(C51 > 0, ($B$19 - $B$18 + C51 * Peers!$P$4) / $B$20, "")', regular_data)
-    sheet.write(50, 7, f'=IF(C51 > 0, ($B$19 - $B$18 + D51 * Peers!$P$4) / $B$20, "")', regular_data)
-    sheet.write(50, 8, f'=IF(C51 > 0, ($B$19 - $B$18 + E51 * Peers!$P$4) / $B$20, "")', regular_data)
+    write_formula(50, 1, f"=Peers!$C$4")
+    write_formula(50, 2, f'=AVERAGEIF(Peers!$C$5:$C${len(peers) + 4}, ">0", Peers!$C$5:$C${len(peers) + 4})', regular_data)
+    write_formula(50, 3, f"=_xlfn.MINIFS(Peers!$C$5:$C${len(peers) + 4}, Peers!$C$5:$C${len(peers) + 4}, \">0\")", regular_data)
+    write_formula(50, 4, f"=MAX(Peers!$C$5:$C${len(peers) + 4})", regular_data)
+    write_formula(50, 6, f'=IF(C51 > 0, ($B$19 - $B$18 + C51 * Peers!$P$4) / $B$20, "")', regular_data)
+    write_formula(50, 7, f'=IF(C51 > 0, ($B$19 - $B$18 + D51 * Peers!$P$4) / $B$20, "")', regular_data)
+    write_formula(50, 8, f'=IF(C51 > 0, ($B$19 - $B$18 + E51 * Peers!$P$4) / $B$20, "")', regular_data)
 
     sheet.write(51, 0, "EV/EBITDA", line_item)
-    sheet.write(51, 1, f"=Peers!$D$4")
-    sheet.write(51, 2, f'=AVERAGEIF(Peers!$D$5:$D${len(peers) + 4}, ">0", Peers!$D$5:$D${len(peers) + 4})', regular_data)
-    sheet.write(51, 3, f"=_xlfn.MINIFS(Peers!$D$5:$D${len(peers) + 4}, Peers!$D$5:$D${len(peers) + 4}, \">0\")", regular_data)
-    sheet.write(51, 4, f"=MAX(Peers!$D$5:$D${len(peers) + 4})", regular_data)
-    sheet.write(51, 6, f'=IF(C52 > 0, ($B$19 - $B$18 + C52 * Peers!$Q$4) / $B$20, "")', regular_data)
-    sheet.write(51, 7, f'=IF(C52 > 0, ($B$19 - $B$18 + D52 * Peers!$Q$4) / $B$20, "")', regular_data)
-    sheet.write(51, 8, f'=IF(C52 > 0, ($B$19 - $B$18 + E52 * Peers!$Q$4) / $B$20, "")', regular_data)
+    write_formula(51, 1, f"=Peers!$D$4")
+    write_formula(51, 2, f'=AVERAGEIF(Peers!$D$5:$D${len(peers) + 4}, ">0", Peers!$D$5:$D${len(peers) + 4})', regular_data)
+    write_formula(51, 3, f"=_xlfn.MINIFS(Peers!$D$5:$D${len(peers) + 4}, Peers!$D$5:$D${len(peers) + 4}, \">0\")", regular_data)
+    write_formula(51, 4, f"=MAX(Peers!$D$5:$D${len(peers) + 4})", regular_data)
+    write_formula(51, 6, f'=IF(C52 > 0, ($B$19 - $B$18 + C52 * Peers!$Q$4) / $B$20, "")', regular_data)
+    write_formula(51, 7, f'=IF(C52 > 0, ($B$19 - $B$18 + D52 * Peers!$Q$4) / $B$20, "")', regular_data)
+    write_formula(51, 8, f'=IF(C52 > 0, ($B$19 - $B$18 + E52 * Peers!$Q$4) / $B$20, "")', regular_data)
 
     # add a section for analysis notes
     sheet.merge_range(55, 0, 55, header_size - 1, 'Analyst Notes', header)
-    sheet.merge_range(56, 0, 106, header_size - 1, '', notes)
-    sheet.write(56, 0, message_to_analyst, notes)
+    sheet.merge_range(56, 0, 106, header_size - 1, message_to_analyst(), notes)
+
+
+# gets the current risk-free rate (the 10Y American treasury yield, unless configured otherwise) as a decimal. it is
+# shared by every run through the market data store, so it is only downloaded once in a while (see src.market)
+def get_risk_free_rate():
+    return market_value(RISK_FREE)
+
+
+# the main ticker's pages a template is going to scrape, so they can be fetched together before they are needed (see
+# src.fetch.TickerBundle). statements that were given or are rendered by the browser are left out, and so are the peer
+# pages if "peer_data" reads them
+def template_pages(ticker, statement_backend='http', dfs=None, inputs=None, peer_data=None):
+    pages = [s for s in ['financials', 'balance-sheet', 'cash-flow'] if s not in (dfs or {})] if statement_backend == 'http' else []
+    if peer_data is None:
+        pages += ['key-statistics', 'profile']
+        if (index := get_bond_index()) is None or not index.fresh(ticker):
+            pages.append('bonds')
+    if inputs is None:
+        pages.append('analysis')
+    return pages
+
+
+# everything a template was built from, as it is saved next to it (see src.inputs)
+def template_inputs(ticker, peers, outfile, output_format, rfr, mrp, terminal_growth, forecast_years, min_tax_rate, simulations, dfs, inputs,
+                    table, summary_dfs):
+    return {
+        'ticker': ticker, 'peers': peers, 'outfile': os.path.abspath(outfile), 'output_format': output_format, 'rfr': rfr, 'mrp': mrp,
+        'terminal_growth': terminal_growth, 'forecast_years': forecast_years, 'min_tax_rate': min_tax_rate, 'simulations': simulations,
+        'statements': {k: frame_to_json(df) for k, df in dfs.items()},
+        'inputs': inputs,
+        # only the scraped values are kept, since the others are derived from them
+        'peer_data': {t: {k: v for k, v in table.record(i, DERIVED_LABELS).items() if not (isinstance(v, str) and v == '')}
+                      for i, t in enumerate(table.tickers)},
+        'summaries': {t: column_to_json(df) for t, df in zip([ticker] + peers, summary_dfs)},
+    }
 
 
-def make_template(ticker, peers, rfr, mrp, terminal_growth, forecast_years, min_tax_rate=0.2, peer_gen_depth=0, outfile=None):
+# values the company of a template (see src.valuation.value_company), running "simulations" Monte Carlo paths of its DCF
+# if it is set (see src.montecarlo.simulate)
+def value_template(inputs, table, tax_rate, rfr, mrp, terminal_growth, forecast_years, simulations=0):
+    valuation = value_company(inputs, table, tax_rate, rfr, mrp, terminal_growth, forecast_years)
+    if simulations:
+        total_debt, cash, shares_outstanding = (table.column(l)[0] for l in ['Total Debt', 'Cash and Equivalents', 'Shares Outstanding'])
+        valuation['simulation'] = simulate(inputs, valuation['wacc'][0], tax_rate, terminal_growth, forecast_years, total_debt, cash,
+                                           shares_outstanding, simulations)
+    return valuation
+
+
+# saves a template to "outfile": a workbook of its statements, peers, DCF and simulation (if it has one), or its values
+# in one of the plain data formats of src.output
+def render_template(outfile, output_format, ticker, peers, dfs, tax_rate, rfr, mrp, terminal_growth, forecast_years, inputs, table, summary_dfs,
+                    valuation, constant_memory=False):
+    if output_format != 'xlsx':
+        with span('write_results', outfile=outfile, output_format=output_format):
+            write_results(outfile, collect_results(ticker, peers, dfs, tax_rate, rfr, mrp, terminal_growth, forecast_years, inputs, table,
+                                                   summary_dfs, valuation), output_format)
+        return
+
+    writer = open_workbook(outfile, constant_memory)
+    try:
+        write_financials(dfs, writer)
+        write_peers(tax_rate, table, summary_dfs, writer)
+        make_dcf(dfs, ticker, peers, tax_rate, rfr, mrp, terminal_growth, forecast_years, writer, inputs, table)
+        if 'simulation' in valuation:
+            make_simulation(valuation['simulation'], writer)
+    finally:
+        with span('workbook_close', outfile=outfile):
+            writer.close()
+
+
+# a running "driver" can be passed to reuse one browser for many templates, in which case it is left open. otherwise
+# a browser is only launched if it is needed (see "LazyChrome").
+# returns the valuation of the company (see src.valuation.value), so its fair value is known without opening the workbook.
+# if "simulations" is set, that many Monte Carlo paths of the DCF are also run (see src.montecarlo.simulate) and
+# written to a "Simulation" sheet, and the results are returned under the valuation's "simulation" key.
+# statements ("dfs") and DCF inputs ("inputs") that were already retrieved are used instead of being scraped again.
+# unless "keep_inputs" is False, everything the template was built from is saved next to it (see src.inputs).
+# if "snapshot" is set to a date ("YYYY-MM-DD") or "latest", everything saved in the snapshot store on or before that
+# date (see src.store) is used instead of being scraped again, and only what was never saved is scraped.
+# "constant_memory" writes the workbook a row at a time instead of keeping every cell until it is closed (see src.workbook)
+# "output_format" is "xlsx" for a workbook, or one of the plain data formats of src.output ("json", "csv" or "npz"),
+# which save the values instead of formulas without making a workbook at all.
+# the pages of the main ticker are fetched all at once with up to "workers" threads (see src.fetch.TickerBundle)
+@traced(args=('ticker',))
+def make_template(ticker, peers, rfr, mrp, terminal_growth, forecast_years, min_tax_rate=0.2, peer_gen_depth=0, outfile=None, workers=4,
+                  driver: webdriver.Chrome = None, peer_data=None, simulations=0, statement_backend='http', peer_fan_out=FAN_OUT, max_peers=MAX_PEERS,
+                  dfs=None, inputs=None, keep_inputs=True, snapshot=None, constant_memory=False, output_format='xlsx'):
     if outfile == None:
-        outfile = ticker.replace('.', '-') + '.xlsx'
+        outfile = output_file(ticker, output_format)
+
+    if snapshot is not None and (store := get_store()) is not None:
+        dfs = {**store.get_statements(ticker, snapshot), **(dfs or {})}
+        if inputs is None:
+            inputs = store.get_record(ticker, 'estimates', snapshot)
+        if peer_data is None:
+            peer_data = SnapshotPeerData(store, snapshot, get_peer_data, get_summary)
+
+    bundle = TickerBundle(ticker, template_pages(ticker, statement_backend, dfs, inputs, peer_data), workers).start()
 
-    driver = webdriver.Chrome(options=options)
+    close_driver = driver is None
+    if close_driver:
+        driver = LazyChrome()
     try:
-        writer = xls.Workbook(outfile)
-        dfs, tax_rate = make_financials(ticker, writer, driver, min_tax_rate)
-        make_peers(ticker, peers, tax_rate, dfs, writer, peer_gen_depth, driver)
-        make_dcf(dfs, ticker, peers, tax_rate, rfr, mrp, terminal_growth, forecast_years, writer)
+        dfs, tax_rate = make_financials(ticker, None, driver, min_tax_rate, statement_backend, dfs)
+        table, summary_dfs = make_peers(ticker, peers, tax_rate, dfs, None, peer_gen_depth, driver, workers, peer_data, peer_fan_out, max_peers)
+        if inputs is None:
+            inputs = get_dcf_inputs(dfs, ticker)
     finally:
-        driver.close()
-        writer.close()
+        bundle.close()
+        if close_driver:
+            driver.close()
+
+    valuation = value_template(inputs, table, tax_rate, rfr, mrp, terminal_growth, forecast_years, simulations)
+    render_template(outfile, output_format, ticker, peers, dfs, tax_rate, rfr, mrp, terminal_growth, forecast_years, inputs, table, summary_dfs,
+                    valuation, constant_memory)
+    if keep_inputs:
+        save_inputs(inputs_path(outfile), template_inputs(ticker, peers, outfile, output_format, rfr, mrp, terminal_growth, forecast_years,
+                                                          min_tax_rate, simulations, dfs, inputs, table, summary_dfs))
+    return valuation
 
 
 if __name__ == '__main__':
@@ -0,0 +1,148 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import quote
+
+from src.cache import DEFAULT_DIR
+from src.extract import find_values, parse_html
+from src.fetch import BASE_URLS, fetch
+
+# the market data every DCF is built on (treasury yields, the market risk premium and the terminal growth rate),
+# configured in "market.json". yields are read from the quote pages of yahoo's treasury indexes at most once every
+# "max_age" seconds and kept in an sqlite file, so every run and every process on the machine shares them. the other
+# values are fixed by the configuration, and any value (e.g. "10Y" or "rfr") can be pinned under "overrides"
+
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), 'market.json')
+
+# how long (in seconds) a yield is trusted for if the configuration doesn't say
+MAX_AGE = 60 * 60
+
+# the name the risk-free rate is asked for by. unless it is overridden, it is the yield of the "risk_free_tenor"
+RISK_FREE = 'rfr'
+
+# how long (in seconds) a process waits for another one that is downloading a yield
+DOWNLOAD_TIMEOUT = 60.
+
+QUOTE_PRICE = {'price': '//fin-streamer[@data-test="qsp-price"]'}
+
+
+def load_config(path=CONFIG_PATH):
+    with open(path) as f:
+        return json.load(f)
+
+
+# the current yield of a treasury index (e.g. ^TNX for the 10Y yield) as a decimal. yahoo quotes them in percent
+def read_yield(symbol):
+    page = fetch(f"{BASE_URLS['yahoo']}/quote/{quote(symbol)}", 'quote')
+    return float(find_values(parse_html(page), {}, QUOTE_PRICE)['price'].replace(',', '')) / 100
+
+
+# the market data shared by every run. "config" is the parsed configuration (see "load_config"), and "path" the sqlite
+# file the yields are kept in, or None to keep them in memory. a yield that can't be downloaded falls back to the last
+# one read however old it is, so runs still work offline once the yields were read
+class MarketData:
+    def __init__(self, path=os.path.join(DEFAULT_DIR, 'market.sqlite'), config=None):
+        config = load_config() if config is None else config
+        self.path = path
+        self.max_age = config.get('max_age', MAX_AGE)
+        self.yields = dict(config.get('yields', {}))
+        self.risk_free_tenor = config.get('risk_free_tenor', '10Y')
+        self.values = dict(config.get('values', {}))
+        self.overrides = dict(config.get('overrides', {}))
+        self.fetches = 0
+
+        if path is not None:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        # one thread reads a stale yield while the others wait for it
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path if path is not None else ':memory:', timeout=DOWNLOAD_TIMEOUT, check_same_thread=False)
+        self._db.execute('CREATE TABLE IF NOT EXISTS market (name TEXT PRIMARY KEY, value REAL, read REAL, source TEXT)')
+        self._db.commit()
+
+    # the value of "name" as a decimal: an override, a yield by its tenor (downloaded if it is stale), "rfr" for the
+    # risk-free rate, or one of the fixed values. raises a KeyError for names that aren't configured
+    def get(self, name, now=None):
+        if name in self.overrides:
+            return float(self.overrides[name])
+        if name == RISK_FREE:
+            return self.get(self.risk_free_tenor, now)
+        if name not in self.yields:
+            return float(self.values[name])
+
+        now = time.time() if now is None else now
+        with self._lock:
+            if (value := self._fresh(name, now)) is not None:
+                return value
+            # the process that finds the yield stale holds the database's write lock while it downloads it, so the
+            # others wait for it and read what it stored instead of downloading it too
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                if (value := self._fresh(name, now)) is not None:
+                    return value
+                row = self._db.execute('SELECT value, read FROM market WHERE name = ?', (name,)).fetchone()
+                try:
+                    value = read_yield(self.yields[name])
+                except Exception:
+                    if row is None:
+                        raise
+                    print(f'Could not download the {name} yield, using the one read {(now - row[1]) / 3600:.1f} hours ago')
+                    return row[0]
+                self.fetches += 1
+                self._put(name, value, self.yields[name])
+            finally:
+                self._db.commit()
+        return value
+
+    def _fresh(self, name, now):
+        row = self._db.execute('SELECT value, read FROM market WHERE name = ?', (name,)).fetchone()
+        return row[0] if row is not None and now - row[1] <= self.max_age else None
+
+    def risk_free_rate(self, now=None):
+        return self.get(RISK_FREE, now)
+
+    # sets a value as if it had just been read from "source", e.g. to load yields from elsewhere before going offline
+    def put(self, name, value, source='manual'):
+        with self._lock:
+            self._put(name, value, source)
+
+    def _put(self, name, value, source):
+        self._db.execute('INSERT INTO market VALUES (?, ?, ?, ?) ON CONFLICT (name) DO UPDATE SET value = excluded.value, '
+                         'read = excluded.read, source = excluded.source', (name, value, time.time(), source))
+        self._db.commit()
+
+    # every yield, by tenor
+    def curve(self, now=None):
+        return {tenor: self.get(tenor, now) for tenor in self.yields}
+
+    # every value that has been read, with how old it is (in seconds) and where it came from
+    def stats(self):
+        with self._lock:
+            rows = self._db.execute('SELECT name, value, read, source FROM market ORDER BY name').fetchall()
+        now = time.time()
+        return {name: {'value': value, 'age_s': now - read, 'source': source} for name, value, read, source in rows}
+
+
+# the market data shared by every scrape. like the page cache (see src.fetch), it is created on first use so it can be
+# replaced (or disabled by setting it to None, when every value is read again each time it is asked for) before anything
+# is read
+_market = ...
+
+
+def get_market_data():
+    global _market
+    if _market is ...:
+        _market = MarketData()
+    return _market
+
+
+def set_market_data(market):
+    global _market
+    _market = market
+
+
+# a value of the shared market data (see MarketData.get)
+def market_value(name):
+    market = get_market_data()
+    return (market if market is not None else MarketData(None)).get(name)
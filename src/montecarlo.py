@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import math
+import os
+
+from src.lazy import lazy_import
+from src.trace import traced
+from src.valuation import discounted_cash_flow, growth_schedule
+from src.workbook import get_format
+
+np = lazy_import('numpy')
+xls = lazy_import('xlsxwriter')
+
+# the standard deviation of the normal distribution each DCF input is drawn from. every distribution is centred
+# on the value used in the DCF sheet
+STDEVS = {
+    'growth_rate_1': 0.02,
+    'growth_rate_2': 0.025,
+    'growth_rate_f': 0.015,
+    'ebit_margin': 0.02,
+    'depr_amort_pct': 0.005,
+    'capex_pct': 0.005,
+    'nwc_pct': 0.005,
+    'terminal_growth': 0.0025,
+    'wacc': 0.01,
+}
+
+PERCENTILES = [1, 5, 10, 25, 50, 75, 90, 95, 99]
+
+# simulations of at least this many paths are spread over a process pool
+PROCESS_THRESHOLD = 1_000_000
+
+
+# values "paths" random draws of the DCF inputs. it is a top-level function so it can be sent to worker processes
+def _simulate_batch(seed, paths, means, stdevs, revenue_actual, tax_rate, forecast_years, total_debt, cash, shares_outstanding):
+    rng = np.random.default_rng(seed)
+    draws = {k: rng.normal(means[k], stdevs[k], paths) for k in means}
+    growth = growth_schedule(draws['growth_rate_1'], draws['growth_rate_2'], draws['growth_rate_f'], forecast_years)
+    dcf = discounted_cash_flow(revenue_actual, growth, draws['ebit_margin'], tax_rate, draws['depr_amort_pct'],
+                               draws['capex_pct'], draws['nwc_pct'], draws['wacc'], draws['terminal_growth'], total_debt, cash,
+                               shares_outstanding)
+    values = dcf['value_per_share']
+    # a terminal value only makes sense when the cost of capital is above the terminal growth rate
+    return values[draws['wacc'] > draws['terminal_growth']]
+
+
+# runs a Monte Carlo simulation of the DCF model, drawing every input from a normal distribution centred on its
+# point estimate. "inputs" are the values returned by "get_dcf_inputs" and "wacc" is the model's cost of capital.
+# paths are valued in vectorized batches of "batch_size", which are spread over "processes" worker processes
+# once there are at least PROCESS_THRESHOLD paths (processes=1 always runs in this process)
+@traced()
+def simulate(inputs, wacc, tax_rate, terminal_growth, forecast_years, total_debt, cash, shares_outstanding, paths=100_000,
+             stdevs=None, batch_size=250_000, processes=None, seed=None, bins=50):
+    stdevs = dict(STDEVS, **(stdevs or {}))
+    means = {k: float(inputs[k]) for k in ['growth_rate_1', 'growth_rate_2', 'growth_rate_f', 'ebit_margin', 'depr_amort_pct', 'capex_pct', 'nwc_pct']}
+    means['terminal_growth'] = float(terminal_growth)
+    means['wacc'] = float(wacc)
+
+    sizes = [batch_size] * (paths // batch_size) + ([paths % batch_size] if paths % batch_size else [])
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    # the revenue actual is not drawn, since it is a reported figure
+    args = [(s, n, means, stdevs, float(inputs['revenue_actual']), tax_rate, forecast_years, total_debt, cash, shares_outstanding)
+            for s, n in zip(seeds, sizes)]
+
+    if processes != 1 and paths >= PROCESS_THRESHOLD and len(sizes) > 1:
+        # process pools are slow to import, and most simulations are too small to need one
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=min(processes or os.cpu_count() or 1, len(sizes))) as executor:
+            batches = list(executor.map(_simulate_batch, *zip(*args)))
+    else:
+        batches = [_simulate_batch(*a) for a in args]
+
+    values = np.concatenate(batches) if batches else np.empty(0)
+    values = values[np.isfinite(values)]
+
+    if values.size:
+        percentiles = np.percentile(values, PERCENTILES)
+        # leave the extreme tails out of the histogram so they don't squash the rest of the distribution
+        counts, edges = np.histogram(values, bins=bins, range=(percentiles[0], percentiles[-1]))
+    else:
+        percentiles = np.full(len(PERCENTILES), np.nan)
+        counts, edges = np.zeros(bins, dtype=np.int64), np.full(bins + 1, np.nan)
+
+    return {
+        'paths': paths,
+        'valid_paths': int(values.size),
+        'mean': float(values.mean()) if values.size else np.nan,
+        'stdev': float(values.std()) if values.size else np.nan,
+        'percentiles': dict(zip(PERCENTILES, percentiles.tolist())),
+        'histogram': {'counts': counts.tolist(), 'edges': edges.tolist()},
+        'means': means,
+        'stdevs': stdevs,
+    }
+
+
+# writes a number, leaving the cell blank if it is NaN or infinite (which xlsxwriter refuses to write), as the results
+# of a simulation without a single valid path are
+def _write_number(sheet, row, col, value, format=None):
+    if math.isfinite(value):
+        sheet.write_number(row, col, value, format)
+    else:
+        sheet.write_blank(row, col, None, format)
+
+
+@traced()
+def make_simulation(result: dict, book: xls.Workbook):
+    header = get_format(book, {
+        'font_color': 'white',
+        'bg_color': '#034638',
+        'bold': True,
+    })
+
+    subheader = get_format(book, {
+        'bold': True,
+    })
+
+    line_item = get_format(book, {
+        'align': 'left',
+    })
+
+    regular_data = get_format(book, {
+        'num_format': 43,
+    })
+
+    percent = get_format(book, {
+        'num_format': 10,
+    })
+
+    sheet = book.add_worksheet('Simulation')
+    sheet.set_column(0, 0, 40)
+    sheet.set_column(1, 3, 16)
+
+    sheet.write(0, 0, f"*Monte Carlo simulation of the DCF model over {result['paths']:,} paths, {result['valid_paths']:,} of which had a cost of capital above the terminal growth rate")
+    sheet.merge_range(1, 0, 1, 3, 'Simulated Inputs', header)
+    sheet.write(2, 1, 'Mean', subheader)
+    sheet.write(2, 2, 'Std. Deviation', subheader)
+    names = {
+        'growth_rate_1': 'Revenue Growth (Year 1)',
+        'growth_rate_2': 'Revenue Growth (Year 2)',
+        'growth_rate_f': 'Revenue Growth (Remaining Years)',
+        'ebit_margin': 'EBIT Margin',
+        'depr_amort_pct': 'Dep & Amort / Revenue',
+        'capex_pct': 'CAPEX / Revenue',
+        'nwc_pct': 'Change in Net Working Capital / Revenue',
+        'terminal_growth': 'Terminal Growth Rate',
+        'wacc': 'Cost of Capital',
+    }
+    for i, (key, name) in enumerate(names.items()):
+        sheet.write(i + 3, 0, name, line_item)
+        _write_number(sheet, i + 3, 1, result['means'][key], percent)
+        _write_number(sheet, i + 3, 2, result['stdevs'][key], percent)
+
+    row = len(names) + 5
+    sheet.merge_range(row, 0, row, 3, 'Equity Value per Share', header)
+    sheet.write(row + 1, 0, 'Mean', line_item)
+    _write_number(sheet, row + 1, 1, result['mean'], regular_data)
+    sheet.write(row + 2, 0, 'Std. Deviation', line_item)
+    _write_number(sheet, row + 2, 1, result['stdev'], regular_data)
+    for i, (p, v) in enumerate(result['percentiles'].items()):
+        sheet.write(row + i + 3, 0, f'{p}th Percentile', line_item)
+        _write_number(sheet, row + i + 3, 1, v, regular_data)
+
+    row += len(result['percentiles']) + 5
+    sheet.merge_range(row, 0, row, 3, 'Histogram', header)
+    sheet.write(row + 1, 0, 'Bin Start', subheader)
+    sheet.write(row + 1, 1, 'Bin End', subheader)
+    sheet.write(row + 1, 2, 'Paths', subheader)
+    edges = result['histogram']['edges']
+    counts = result['histogram']['counts']
+    for i, count in enumerate(counts):
+        _write_number(sheet, row + i + 2, 0, edges[i], regular_data)
+        _write_number(sheet, row + i + 2, 1, edges[i + 1], regular_data)
+        sheet.write(row + i + 2, 2, count)
+
+    chart = book.add_chart({'type': 'column'})
+    chart.add_series({
+        'name': 'Paths',
+        'categories': ['Simulation', row + 2, 0, row + len(counts) + 1, 0],
+        'values': ['Simulation', row + 2, 2, row + len(counts) + 1, 2],
+        'gap': 10,
+    })
+    chart.set_title({'name': 'Distribution of Equity Value per Share'})
+    chart.set_legend({'none': True})
+    chart.set_x_axis({'num_format': '#,##0.00'})
+    sheet.insert_chart(1, 5, chart, {'x_scale': 2, 'y_scale': 1.5})
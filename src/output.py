@@ -0,0 +1,167 @@
+import csv
+import json
+import os
+
+from src.lazy import lazy_import
+from src.valuation import to_array
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+# the results of a template can be written as plain data instead of a workbook, for pipelines that only need the
+# numbers: the parsed statements, the peer table and the peer summaries, the inputs of the DCF, its cost of capital and
+# everything it computes (which the workbook only holds as formulas). no workbook is made at all in these formats
+
+# the extension of each format. "npz" keeps every table as columns of float64 (see "write_npz")
+FORMATS = {'xlsx': '.xlsx', 'json': '.json', 'csv': '.csv', 'npz': '.npz'}
+
+# the arrays of the valuation (see src.valuation.value) with one value per forecast year
+FORECAST = ['growth', 'revenue', 'ebit', 'tax', 'nopat', 'depr_amort', 'capex', 'nwc', 'fcf', 'discounted_fcf']
+COST_OF_CAPITAL = ['beta', 'cost_of_equity', 'bond_spread', 'cost_of_debt', 'weight_of_equity', 'weight_of_debt', 'wacc']
+OUTPUTS = ['terminal_value', 'enterprise_value', 'equity_value', 'value_per_share']
+
+
+def output_file(ticker, output_format):
+    return ticker.replace('.', '-') + FORMATS[output_format]
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+# the peer table (one row per ticker, the main ticker first, see src.peertable.PeerTable) and the peer summaries
+def peer_tables(ticker, peers, table, summary_dfs):
+    tickers = pd.Index([ticker] + list(peers), dtype=object)
+    return {
+        'peers': table.frame(),
+        'summaries': pd.DataFrame([df['Data'].tolist() for df in summary_dfs], index=tickers,
+                                  columns=pd.Index(summary_dfs[0].index, dtype=object), dtype=object),
+    }
+
+
+# the results of a template as scalars (dicts of floats) and tables (frames with one row per statement item, ticker
+# or forecast year). "valuation" is the single-company valuation returned by src.valuation.value_company
+def collect_results(ticker, peers, dfs, tax_rate, rfr, mrp, terminal_growth, forecast_years, inputs, table, summary_dfs, valuation):
+    implied = valuation['implied']
+    results = {
+        'ticker': ticker,
+        'inputs': {'tax_rate': _float(tax_rate), 'rfr': _float(rfr), 'mrp': _float(mrp), 'terminal_growth': _float(terminal_growth),
+                   'forecast_years': forecast_years, **{k: _float(v) for k, v in inputs.items()}},
+        'cost_of_capital': {k: _float(valuation[k][0]) for k in COST_OF_CAPITAL},
+        'outputs': {
+            **{k: _float(valuation[k][0]) for k in OUTPUTS},
+            **{f'{m}_{s}': _float(implied[m][i][0]) for m in ['pe', 'ev_sales', 'ev_ebitda'] for i, s in enumerate(['implied', 'min', 'max'])},
+        },
+        'tables': {
+            **{f'statements/{k}': df for k, df in dfs.items()},
+            'forecast': pd.DataFrame({k: valuation[k][0] for k in FORECAST},
+                                     index=pd.Index([f'Year {i + 1}' for i in range(forecast_years)], dtype=object)),
+            **peer_tables(ticker, peers, table, summary_dfs),
+        },
+    }
+    if 'simulation' in valuation:
+        simulation = valuation['simulation']
+        results['simulation'] = {
+            'paths': simulation['paths'], 'valid_paths': simulation['valid_paths'], 'mean': simulation['mean'], 'stdev': simulation['stdev'],
+            **{f'p{p}': v for p, v in simulation['percentiles'].items()},
+        }
+    return results
+
+
+def _cell(value):
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and value != value:
+        return None
+    return value
+
+
+def _scalars(results):
+    return {k: v for k, v in results.items() if isinstance(v, dict) and k != 'tables'}
+
+
+def table_to_json(df):
+    return {'rows': [str(r) for r in df.index], 'columns': [str(c) for c in df.columns],
+            'data': [[_cell(v) for v in row] for row in df.itertuples(index=False, name=None)]}
+
+
+# the results as a document of plain values, with missing values as None
+def results_to_json(results):
+    data = {'ticker': results['ticker']}
+    data.update({k: {n: _cell(v) for n, v in d.items()} for k, d in _scalars(results).items()})
+    data['tables'] = {name: table_to_json(df) for name, df in results['tables'].items()}
+    return data
+
+
+def write_json(path, results):
+    with open(path, 'w') as f:
+        json.dump(results_to_json(results), f, default=str)
+
+
+# one line per value, as (ticker, table, row, column, value), so the files of many tickers can simply be concatenated.
+# the scalars are written with an empty column
+def write_csv(path, results):
+    ticker = results['ticker']
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['ticker', 'table', 'row', 'column', 'value'])
+        for name, d in _scalars(results).items():
+            writer.writerows((ticker, name, k, '', _cell(v)) for k, v in d.items())
+        for name, df in results['tables'].items():
+            columns = [str(c) for c in df.columns]
+            for row, values in zip(df.index, df.itertuples(index=False, name=None)):
+                writer.writerows((ticker, name, row, c, v) for c, v in zip(columns, map(_cell, values)) if v is not None)
+
+
+def _blank(value):
+    return value is None or value == '' or (isinstance(value, float) and value != value)
+
+
+# splits a table into its columns of numbers (blanks are NaN) and its columns of text (blanks are empty strings)
+def _split(df):
+    numbers, text = {}, {}
+    for c in df.columns:
+        column = df[c]
+        if pd.api.types.is_numeric_dtype(column):
+            numbers[c] = column.to_numpy(dtype=np.float64, na_value=np.nan)
+            continue
+        values = column.tolist()
+        # a column that is blank throughout is kept as numbers, so the numeric columns of a table don't depend on what was scraped
+        if all(_blank(v) or isinstance(v, (int, float, np.number)) and not isinstance(v, bool) for v in values):
+            numbers[c] = to_array(values)
+        else:
+            text[c] = ['' if _blank(v) else str(v) for v in values]
+    return numbers, text
+
+
+# every table as "<table>/values" (a float64 matrix), "<table>/rows" and "<table>/columns". columns of text (like the
+# peer names or the summaries) are kept as "<table>/text", a matrix of strings, with their labels in
+# "<table>/text_columns". the scalars are kept as "<name>/keys" and "<name>/values"
+def write_npz(path, results):
+    arrays = {'ticker': np.array(results['ticker'])}
+    for name, d in _scalars(results).items():
+        arrays[f'{name}/keys'] = np.array(list(d), dtype=str)
+        arrays[f'{name}/values'] = np.array([_float(v) for v in d.values()], dtype=np.float64)
+    for name, df in results['tables'].items():
+        numbers, text = _split(df)
+        arrays[f'{name}/rows'] = np.array([str(r) for r in df.index], dtype=str)
+        arrays[f'{name}/columns'] = np.array([str(c) for c in numbers], dtype=str)
+        arrays[f'{name}/values'] = np.column_stack(list(numbers.values())) if numbers else np.empty((len(df), 0))
+        if text:
+            arrays[f'{name}/text_columns'] = np.array([str(c) for c in text], dtype=str)
+            arrays[f'{name}/text'] = np.column_stack(list(text.values())).astype(str)
+    with open(path, 'wb') as f:
+        np.savez_compressed(f, **arrays)
+
+
+WRITERS = {'json': write_json, 'csv': write_csv, 'npz': write_npz}
+
+
+def write_results(path, results, output_format):
+    # write to a temporary file first so a reader never sees a partially-written file
+    tmp = path + '.tmp'
+    WRITERS[output_format](tmp, results)
+    os.replace(tmp, path)
@@ -0,0 +1,127 @@
+import datetime as dt
+import re
+
+from src.lazy import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+# parses the numbers and dates scraped from Yahoo and Macroaxis, which are shown as text like "1,234.5", "2.41T",
+# "15.3%", "N/A" or "05/15/2030". single values are read by their suffix and a precompiled date pattern, while whole
+# columns (like those of a bond table) are converted in one pass into float64 or datetime64 arrays, with NaN / NaT where
+# a cell holds no value
+
+# the multiplier of each suffix. percents are divided by 100 instead, which is exact where multiplying by 0.01 is not
+SCALES = {'T': 1e12, 'B': 1e9, 'M': 1e6, 'k': 1e3, '%': 100.}
+
+# cells that are shown when there is no value
+MISSING = frozenset(['', 'N/A', 'NA', 'n/a', '-', '--', '—'])
+
+DATE_FORMATS = ['%m/%d/%Y', '%m-%d-%Y']
+
+# a month, day and year separated by the same "/" or "-"
+_DATE = re.compile(r'\s*(\d{1,2})([/-])(\d{1,2})\2(\d{4})\s*')
+
+
+def _scaled(number, suffix):
+    if suffix == '%':
+        return float(number) / 100
+    return float(number) * SCALES[suffix] if suffix else float(number)
+
+
+# a scraped value as a float (e.g. "2.41T" -> 2.41e12, "15.3%" -> 0.153), or a datetime if "parse_dates" is set and it
+# is a date. anything else (like "N/A") is returned as it is, so callers can tell a missing value from a number
+def parse_value(s: str, parse_dates: bool = False):
+    s = s.replace(',', '')
+    suffix = s[-1:]
+    try:
+        return _scaled(s[:-1], suffix) if suffix in SCALES else float(s)
+    except ValueError:
+        pass
+
+    if parse_dates and (match := _DATE.fullmatch(s)):
+        month, _, day, year = match.groups()
+        try:
+            return dt.datetime(int(year), int(month), int(day))
+        except ValueError:
+            pass
+
+    return s
+
+
+def _cells(values):
+    if isinstance(values, (pd.Series, pd.Index, np.ndarray)):
+        values = values.tolist()
+    return values
+
+
+def _number(value):
+    if isinstance(value, str):
+        value = value.replace(',', '')
+        if (suffix := value.strip()[-1:]) in SCALES:
+            try:
+                return _scaled(value.strip()[:-1], suffix)
+            except ValueError:
+                return np.nan
+    try:
+        return np.nan if value is None else float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+# a list or Series of scraped values as a float64 array, with NaN for cells that are missing or are not numbers
+def parse_numbers(values):
+    values = _cells(values)
+    if all(isinstance(v, str) for v in values):
+        cleaned = [v.replace(',', '').strip() for v in values]
+        suffixes = [v[-1:] if v[-1:] in SCALES else '' for v in cleaned]
+        bodies = [v[:-1] if s else v for v, s in zip(cleaned, suffixes)]
+        try:
+            # most columns are plain numbers or numbers with suffixes, which numpy converts in one pass
+            numbers = np.array(bodies, dtype=np.float64)
+        except ValueError:
+            # otherwise pandas does, with NaN for the cells that aren't numbers
+            numbers = pd.to_numeric(pd.Series(bodies, dtype=object), errors='coerce').to_numpy(dtype=np.float64)
+        if any(suffixes):
+            scales = np.array([SCALES.get(s, 1.) for s in suffixes])
+            numbers = np.where(np.array(suffixes) == '%', numbers / scales, numbers * scales)
+        return numbers
+    return np.array([_number(v) for v in values], dtype=np.float64)
+
+
+# a list or Series of scraped dates (in any of DATE_FORMATS) as a datetime64 array, with NaT for cells that are missing
+# or are not dates
+def parse_dates(values):
+    values = pd.Series(_cells(values), dtype=object)
+    strings = values if all(isinstance(v, str) for v in values) else values.where(values.map(lambda v: isinstance(v, str)))
+    dates = pd.to_datetime(strings, format=DATE_FORMATS[0], errors='coerce')
+    for date_format in DATE_FORMATS[1:]:
+        if (missing := dates.isna()).any():
+            dates = dates.where(~missing, pd.to_datetime(strings.where(missing), format=date_format, errors='coerce'))
+    return dates.to_numpy()
+
+
+def _present(value):
+    return value is not None and not (isinstance(value, str) and value.strip() in MISSING)
+
+
+# a column of scraped cells as a float64 array if every cell that isn't missing is a number, as a datetime64 array if
+# every one is a date (only looked for if "dates" is set), and as the text of the cells otherwise
+def parse_column(values, dates=True):
+    values = _cells(values)
+    present = np.array([_present(v) for v in values], dtype=bool)
+    if present.any():
+        # the first cell with a value rules out most columns before they are converted as a whole
+        first = values[int(present.argmax())]
+        if not np.isnan(_number(first)) and not np.isnan((numbers := parse_numbers(values))[present]).any():
+            return numbers
+        if dates and isinstance(parse_value(first, parse_dates=True), dt.datetime) \
+                and not pd.isna(parsed := parse_dates(values))[present].any():
+            return parsed
+    return pd.Series(values, dtype=object)
+
+
+# a table of scraped cells (one list per row, in the order of "headings") as a frame with each column parsed by
+# "parse_column"
+def parse_table(headings, rows, dates=True):
+    return pd.DataFrame({heading: parse_column([row[i] if i < len(row) else '' for row in rows], dates) for i, heading in enumerate(headings)})
@@ -0,0 +1,187 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src.cache import DEFAULT_DIR
+from src.fetch import BASE_URLS, fetch
+from src.lazy import lazy_import
+from src.trace import in_current_span, span, traced
+
+bs4 = lazy_import('bs4')
+by = lazy_import('selenium.webdriver.common.by')
+EC = lazy_import('selenium.webdriver.support.expected_conditions')
+ui = lazy_import('selenium.webdriver.support.ui')
+
+# the data behind the "People Also Watch" section of a quote page, which can be downloaded without a browser
+RECOMMENDATIONS_PATH = '/v6/finance/recommendationsbysymbol/{}'
+
+# the most peers taken from any one ticker, and the most peers discovered in total
+FAN_OUT = 10
+MAX_PEERS = 30
+
+# how long (in seconds) the peers of a ticker are trusted before they are crawled again
+MAX_AGE = 30 * 24 * 60 * 60
+
+# a browser can only render one page at a time, so every thread that renders a page with it (peers here, statements in
+# src.makeTemplate.get_statement) takes turns
+driver_lock = threading.Lock()
+
+
+# reads the symbols out of the recommendations data, most similar first
+def parse_recommendations(text):
+    result = json.loads(text)['finance']['result']
+    return [r['symbol'] for r in result[0]['recommendedSymbols']] if result else []
+
+
+# reads the symbols out of the "People Also Watch" section of a quote page rendered by a browser
+def parse_people_also_watch(html):
+    soup = bs4.BeautifulSoup(html, 'lxml')
+    return [a.text for a in soup.find('h2', text='People Also Watch').parent.find_all('a')]
+
+
+# gets the tickers yahoo lists under "People Also Watch" for the given ticker. the recommendations data is downloaded
+# directly, and the quote page is only rendered in the "driver" if that fails
+@traced(args=('ticker',))
+def scrape_peers(ticker, driver=None):
+    try:
+        return parse_recommendations(fetch(BASE_URLS['yahoo-query'] + RECOMMENDATIONS_PATH.format(ticker), 'peers'))
+    except (ValueError, KeyError, IndexError, TypeError):
+        if driver is None:
+            raise
+
+    def render(url):
+        with driver_lock, span('render', url=url):
+            driver.get(url)
+            ui.WebDriverWait(driver, 10).until(
+                EC.element_to_be_clickable((by.By.XPATH, f"//section[@id = 'recommendations-by-symbol']//a"))
+            )
+            return driver.execute_script('return document.body.innerHTML;')
+
+    return parse_people_also_watch(fetch(f"{BASE_URLS['yahoo']}/quote/{ticker}?p={ticker}", 'peers', render))
+
+
+# a local graph of which tickers yahoo lists as peers of which, so peers can be looked up without crawling. every
+# node (ticker) is refreshed on its own: its edges are trusted for "max_age" seconds after it was crawled, or for
+# the "max_age" set on that node, so tickers whose peers rarely change can be kept longer and others shorter
+class PeerIndex:
+    def __init__(self, path=os.path.join(DEFAULT_DIR, 'peers.sqlite'), max_age=MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('CREATE TABLE IF NOT EXISTS nodes (ticker TEXT PRIMARY KEY, crawled REAL, max_age REAL)')
+        self._db.execute('CREATE TABLE IF NOT EXISTS edges (ticker TEXT, peer TEXT, rank INTEGER, PRIMARY KEY (ticker, peer))')
+        self._db.commit()
+
+    # returns the peers of the ticker, most similar first, or None if it was never crawled or its edges are stale
+    def get(self, ticker, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            row = self._db.execute('SELECT crawled, max_age FROM nodes WHERE ticker = ?', (ticker,)).fetchone()
+            if row is None or now - row[0] > (self.max_age if row[1] is None else row[1]):
+                return None
+            return [p for (p,) in self._db.execute('SELECT peer FROM edges WHERE ticker = ? ORDER BY rank', (ticker,))]
+
+    # replaces the edges of the ticker with the freshly crawled "peers"
+    def put(self, ticker, peers):
+        with self._lock:
+            self._db.execute('DELETE FROM edges WHERE ticker = ?', (ticker,))
+            self._db.executemany('INSERT OR IGNORE INTO edges VALUES (?, ?, ?)', [(ticker, p, i) for i, p in enumerate(peers)])
+            self._db.execute('INSERT INTO nodes VALUES (?, ?, NULL) ON CONFLICT (ticker) DO UPDATE SET crawled = excluded.crawled',
+                             (ticker, time.time()))
+            self._db.commit()
+
+    # sets how long the edges of the ticker are trusted for, or goes back to the index's "max_age" if it is None
+    def set_max_age(self, ticker, max_age):
+        with self._lock:
+            self._db.execute('UPDATE nodes SET max_age = ? WHERE ticker = ?', (max_age, ticker))
+            self._db.commit()
+
+    # makes the ticker get crawled again the next time its peers are needed
+    def invalidate(self, ticker):
+        with self._lock:
+            self._db.execute('UPDATE nodes SET crawled = 0 WHERE ticker = ?', (ticker,))
+            self._db.commit()
+
+    # the peers of the ticker up to "depth" levels away, using only what is in the index (stale edges included)
+    def peers(self, ticker, depth, fan_out=FAN_OUT, max_peers=MAX_PEERS):
+        return breadth_first(ticker, depth, lambda tickers: {t: self.get(t, now=0) or [] for t in tickers}, fan_out, max_peers)
+
+    def stats(self):
+        with self._lock:
+            nodes, = self._db.execute('SELECT COUNT(*) FROM nodes').fetchone()
+            edges, = self._db.execute('SELECT COUNT(*) FROM edges').fetchone()
+        return {'nodes': nodes, 'edges': edges}
+
+
+# walks the peer graph from "ticker" one level at a time, where "neighbours" maps a list of tickers to their peers.
+# at most "fan_out" new peers are taken from each ticker and the walk stops once "max_peers" peers were found
+def breadth_first(ticker, depth, neighbours, fan_out=FAN_OUT, max_peers=MAX_PEERS):
+    found = []
+    seen = {ticker}
+    frontier = [ticker]
+    for _ in range(depth):
+        if not frontier or len(found) >= max_peers:
+            break
+        edges = neighbours(frontier)
+        next_frontier = []
+        for t in frontier:
+            taken = 0
+            for p in edges.get(t, []):
+                if taken >= fan_out or len(found) >= max_peers:
+                    break
+                if p in seen:
+                    continue
+                seen.add(p)
+                found.append(p)
+                next_frontier.append(p)
+                taken += 1
+        frontier = next_frontier
+    return found
+
+
+# the index shared by every peer search. like the page cache (see src.fetch), it is created on first use so it can
+# be replaced (or disabled by setting it to None) before anything is crawled
+_index = ...
+
+
+def get_peer_index():
+    global _index
+    if _index is ...:
+        _index = PeerIndex()
+    return _index
+
+
+def set_peer_index(index):
+    global _index
+    _index = index
+
+
+# finds the peers of "ticker" up to "depth" levels away, breadth first (see "breadth_first"). the peers of tickers on
+# the same level are scraped at the same time by "workers" threads, and tickers whose edges are fresh in the index
+# are not scraped at all. tickers that fail to scrape are treated as having no peers and are not indexed
+@traced('generate_peers', args=('ticker', 'depth'))
+def discover_peers(ticker, depth, driver=None, workers=4, fan_out=FAN_OUT, max_peers=MAX_PEERS, index=..., scrape=scrape_peers):
+    index = get_peer_index() if index is ... else index
+
+    def crawl(t):
+        if index is not None and (peers := index.get(t)) is not None:
+            return peers
+        try:
+            peers = scrape(t, driver)
+        except Exception:
+            return []
+        if index is not None:
+            index.put(t, peers)
+        return peers
+
+    def neighbours(tickers):
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(tickers)))) as executor:
+            return dict(zip(tickers, executor.map(in_current_span(crawl), tickers)))
+
+    return breadth_first(ticker, depth, neighbours, fan_out, max_peers)
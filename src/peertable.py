@@ -0,0 +1,85 @@
+from src.lazy import lazy_import
+from src.valuation import to_array
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+# the peers sheet as one table: the main ticker's row and its peers' rows are collected as small records while they
+# are scraped, and put together all at once, with the derived columns (market cap, enterprise value, debt/equity,
+# unlevered beta and the multiples) calculated for every row in one go rather than a row at a time
+
+# the columns of the peers sheet, in order
+LABELS = ['Peer', 'P/E Ratio', 'EV/Sales', 'EV/EBITDA', 'Market Cap', 'Total Debt', 'Cash and Equivalents',
+          'Enterprise Value', 'Debt/Equity', 'Bond Rating (S&P)', 'Bond Spread (10Y)', 'Bond Spread (30Y)',
+          'LTM Sales', 'LTM EBITDA', 'LTM Earnings', 'Share Price', 'Shares Outstanding', 'Equity Beta',
+          'Unlevered Beta', 'Profit Margin', 'Operating Margin', 'Return on Assets', 'Return on Equity',
+          'Revenue Growth (1Y)', 'Earnings Growth (1Y)', 'Key Notes']
+COLUMNS = {l: i for i, l in enumerate(LABELS)}
+
+# the columns which are derived from the scraped values rather than scraped themselves
+DERIVED_LABELS = ['P/E Ratio', 'EV/Sales', 'EV/EBITDA', 'Market Cap', 'Enterprise Value', 'Debt/Equity', 'Unlevered Beta']
+
+
+# a row of the peers sheet as it was scraped (see src.makeTemplate.get_peer_data), with blank strings for the values
+# that are missing. the derived values are left to the PeerTable it is put in
+class PeerRecord:
+    __slots__ = ('ticker', 'values', 'complete')
+
+    def __init__(self, ticker, data):
+        self.ticker = ticker
+        self.values = tuple('' if (v := data.get(l, '')) is None else v for l in LABELS)
+        # the derived values can only be calculated if the whole key statistics page was read
+        self.complete = 'Total Debt' in data
+
+
+# the rows of the peers sheet, the main ticker's first. "values" holds every cell as it is written to the sheet (blank
+# strings for missing values) and "numbers" the same cells as floats (NaN for blanks and text). the unlevered betas
+# depend on the valued company's "tax_rate"
+class PeerTable:
+    def __init__(self, records, tax_rate):
+        self.tickers = [r.ticker for r in records]
+        self.values = np.empty((len(records), len(LABELS)), dtype=object)
+        self.values[:] = [r.values for r in records] if records else []
+        self.numbers = to_array(self.values.ravel()).reshape(self.values.shape)
+        complete = np.array([r.complete for r in records], dtype=bool)
+
+        price, shares, debt, cash, beta, sales, ebitda, earnings = (self.column(l) for l in [
+            'Share Price', 'Shares Outstanding', 'Total Debt', 'Cash and Equivalents', 'Equity Beta', 'LTM Sales', 'LTM EBITDA', 'LTM Earnings'])
+        with np.errstate(all='ignore'):
+            market_cap = price * shares
+            enterprise_value = market_cap + debt - cash
+            debt_to_equity = debt / market_cap
+            unlevered_beta = beta / (1 + (1 - tax_rate) * debt_to_equity)
+            derived = {
+                'Market Cap': market_cap,
+                'Enterprise Value': enterprise_value,
+                'Debt/Equity': debt_to_equity,
+                # a beta of 0 means the peer's beta is not known
+                'Unlevered Beta': np.where(unlevered_beta == 0, np.nan, unlevered_beta),
+                'P/E Ratio': np.maximum(market_cap / earnings, 0.),
+                'EV/Sales': np.maximum(enterprise_value / sales, 0.),
+                'EV/EBITDA': np.maximum(enterprise_value / ebitda, 0.),
+            }
+        for label, column in derived.items():
+            column = np.where(complete & np.isfinite(column), column, np.nan)
+            self.numbers[:, COLUMNS[label]] = column
+            self.values[:, COLUMNS[label]] = np.where(np.isnan(column), '', column.astype(object))
+
+    def __len__(self):
+        return len(self.tickers)
+
+    # a column as floats, one per row
+    def column(self, label):
+        return self.numbers[:, COLUMNS[label]]
+
+    # a cell as it is written to the sheet
+    def get(self, row, label):
+        return self.values[row, COLUMNS[label]]
+
+    # a row as a dict keyed by label, without the labels in "exclude"
+    def record(self, row, exclude=()):
+        return {l: v for l, v in zip(LABELS, self.values[row].tolist()) if l not in exclude}
+
+    # the table as a frame with one row per ticker
+    def frame(self):
+        return pd.DataFrame(self.values, index=pd.Index(self.tickers, dtype=object), columns=pd.Index(LABELS, dtype=object), dtype=object)
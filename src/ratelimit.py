@@ -0,0 +1,54 @@
+import threading
+import time
+from urllib.parse import urlparse
+
+# the sustained number of requests per second and the size of the burst allowed for each host that gets scraped.
+# hosts that are not listed fall back to "DEFAULT_RATE"
+RATES = {
+    'finance.yahoo.com': (4., 4),
+    'query1.finance.yahoo.com': (4., 4),
+    'www.macroaxis.com': (2., 2),
+}
+DEFAULT_RATE = (1., 1)
+
+
+# a token bucket which refills at "rate" tokens per second up to "capacity" tokens. every request takes a token,
+# blocking until one is available, so any number of threads can share it without going over the rate
+class TokenBucket:
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+# hands out one token bucket per host
+class HostRateLimiter:
+    def __init__(self, rates=None, default_rate=DEFAULT_RATE):
+        self.rates = dict(RATES, **(rates or {}))
+        self.default_rate = default_rate
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, host):
+        with self._lock:
+            if host not in self._buckets:
+                self._buckets[host] = TokenBucket(*self.rates.get(host, self.default_rate))
+            return self._buckets[host]
+
+    # blocks until a request may be sent to the host of the given url
+    def acquire(self, url):
+        self.bucket(urlparse(url).netloc).acquire()
@@ -0,0 +1,137 @@
+import json
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from src.fetch import BASE_URLS, fetch
+from src.inputs import column_from_json, frame_from_json, load_inputs
+from src.makeTemplate import make_template
+from src.trace import in_current_span, traced
+
+# share prices move every day while statements only change every quarter, so a template can be refreshed from the
+# inputs saved next to it (see src.inputs) by downloading nothing but the latest share price of the company and of
+# each of its peers, and rebuilding the workbook with the values derived from the share price recalculated
+
+# a small json document with the latest price of a ticker, instead of a whole quote page
+CHART_PATH = '/v8/finance/chart/{}?range=1d&interval=1d'
+
+
+def parse_share_price(text):
+    return float(json.loads(text)['chart']['result'][0]['meta']['regularMarketPrice'])
+
+
+@traced(args=('ticker',))
+def get_share_price(ticker):
+    return parse_share_price(fetch(BASE_URLS['yahoo-query'] + CHART_PATH.format(ticker), 'quote'))
+
+
+# gets the latest share price of every ticker, "workers" at a time. tickers whose price could not be read are left out
+def get_share_prices(tickers, workers=4):
+    def get(ticker):
+        try:
+            return get_share_price(ticker)
+        except Exception:
+            print(f'Failed to get the share price of {ticker}:\n{traceback.format_exc()}')
+            return None
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        prices = dict(zip(tickers, executor.map(in_current_span(get), tickers)))
+    return {t: p for t, p in prices.items() if p is not None}
+
+
+# serves the peer data saved with a template to "make_peers" (like src.batch.PeerData does for scrapes), with the
+# share prices replaced by "prices" where they are given
+class SavedPeerData:
+    def __init__(self, peer_data, summaries, prices):
+        self.peer_data = peer_data
+        self.summaries = summaries
+        self.prices = prices
+
+    def peer(self, ticker):
+        data = dict(self.peer_data.get(ticker, {}))
+        if ticker in self.prices:
+            data['Share Price'] = self.prices[ticker]
+        # a missing EBITDA is constructed from the company's statements again (see "get_peer")
+        if 'Total Debt' in data:
+            data.setdefault('LTM EBITDA', None)
+        return data
+
+    def summary(self, ticker):
+        return column_from_json(self.summaries.get(ticker, {}))
+
+
+# rebuilds the workbook at "path" (or the one whose inputs were saved at "path") with the latest share prices, in the
+# format it was made in (see src.output). the prices are downloaded unless they are passed, and the risk-free rate the
+# workbook was made with is kept unless "rfr" is given. the workbook is overwritten unless "outfile" is set. returns
+# the new valuation (see make_template)
+@traced(args=('path',))
+def refresh_template(path, rfr=None, workers=4, prices=None, outfile=None):
+    saved = load_inputs(path)
+    tickers = [saved['ticker']] + saved['peers']
+    if prices is None:
+        prices = get_share_prices(tickers, workers)
+    if outfile is None:
+        # the workbook may have been moved since it was made
+        outfile = saved['outfile'] if path.endswith('.inputs.json') else path
+
+    return make_template(saved['ticker'], list(saved['peers']), saved['rfr'] if rfr is None else rfr, saved['mrp'], saved['terminal_growth'],
+                         saved['forecast_years'], saved['min_tax_rate'], outfile=outfile, workers=workers,
+                         peer_data=SavedPeerData(saved['peer_data'], saved['summaries'], prices), simulations=saved['simulations'],
+                         dfs={k: frame_from_json(v) for k, v in saved['statements'].items()}, inputs=saved['inputs'],
+                         output_format=saved.get('output_format', 'xlsx'))
+
+
+# reads a watchlist file with the path of one workbook (or saved inputs) per line. "#" starts a comment
+def read_watchlist(path):
+    paths = []
+    with open(path) as f:
+        for line in f:
+            line = line.split('#')[0].strip()
+            if line:
+                paths.append(line)
+    return paths
+
+
+# refreshes every workbook in "paths", downloading the share price of each distinct ticker only once. returns a
+# summary of the run
+def refresh_watchlist(paths, rfr=None, workers=4):
+    start = time.perf_counter()
+    saved, failed = {}, []
+    for path in paths:
+        try:
+            saved[path] = load_inputs(path)
+        except (OSError, ValueError) as e:
+            print(f'Failed to load the inputs of {path}: {e}')
+            failed.append(path)
+
+    tickers = list(dict.fromkeys(t for s in saved.values() for t in [s['ticker']] + s['peers']))
+    prices = get_share_prices(tickers, workers)
+
+    values = {}
+    for path in saved:
+        try:
+            valuation = refresh_template(path, rfr, workers, prices)
+            values[path] = float(valuation['value_per_share'][0])
+        except Exception:
+            print(f'Failed to refresh {path}:\n{traceback.format_exc()}')
+            failed.append(path)
+
+    return {
+        'values': values,
+        'failed': failed,
+        'tickers': len(tickers),
+        'prices': len(prices),
+        'seconds': time.perf_counter() - start,
+    }
+
+
+# refreshes the watchlist every "every" seconds (measured from the start of one refresh to the start of the next),
+# "runs" times or forever. "report" is called with the summary of every refresh
+def run_schedule(paths, every, runs=None, rfr=None, workers=4, report=print):
+    run = 0
+    while runs is None or run < runs:
+        start = time.monotonic()
+        report(refresh_watchlist(paths, rfr, workers))
+        run += 1
+        if runs is None or run < runs:
+            time.sleep(max(0., every - (time.monotonic() - start)))
@@ -0,0 +1,166 @@
+import random
+import threading
+import time
+from collections import deque
+from urllib.parse import urlparse
+
+# how the fetcher (see src.fetch) copes with slow and failing hosts: every request has a timeout, responses that say
+# the host is overloaded or broken (429 and 5xx) and requests that time out or lose their connection are retried after
+# a jittered, exponentially growing wait, a host that keeps failing has its circuit opened so requests to it fail at
+# once instead of piling up, and a request that is slower than usual can be hedged by sending it again. the outcome of
+# every request is recorded per host
+
+# the statuses that are worth retrying
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# the most recent download times kept for each host
+LATENCY_WINDOW = 4096
+
+
+# a page could not be downloaded, even after retrying
+class FetchError(Exception):
+    def __init__(self, url, reason, attempts=0):
+        super().__init__(f'{reason} ({url}, {attempts} attempt{"s" * (attempts != 1)})')
+        self.url = url
+        self.reason = reason
+        self.attempts = attempts
+
+
+# the host of the url has failed too often lately to be sent any more requests (see CircuitBreaker)
+class CircuitOpen(FetchError):
+    pass
+
+
+# how every request is made. "timeout" is the (connect, read) timeout of a request in seconds and "deadline" the most
+# seconds spent on a page including its retries. a failed request is retried up to "retries" times, waiting a random
+# time of up to "backoff" seconds before the first retry, doubling every retry up to "max_backoff". if "hedge_after" is
+# set, a request that has not been answered after that many seconds is sent a second time and the first answer is used
+class RetryPolicy:
+    def __init__(self, timeout=(5., 20.), deadline=60., retries=4, backoff=0.5, max_backoff=16., hedge_after=None):
+        self.timeout = timeout
+        self.deadline = deadline
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.hedge_after = hedge_after
+
+    # how long to wait before retry number "attempt" (counted from 1), using "full jitter" so that the threads that
+    # failed together don't all retry together. a host asking to be left alone for longer (a Retry-After header) is
+    # given at least that long
+    def delay(self, attempt, retry_after=None):
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** (attempt - 1)))
+        return max(delay, retry_after or 0.)
+
+
+# the seconds of a Retry-After header, or None if it is missing or a date
+def retry_after(response):
+    try:
+        return float(response.headers['Retry-After'])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+# opens after "threshold" failures in a row (pages that could not be downloaded, not the requests made for them), after
+# which every request is refused for "reset_after" seconds. the first page after that is let through to see if the host
+# has recovered: the circuit closes if it arrives and opens again if it fails
+class CircuitBreaker:
+    def __init__(self, threshold=5, reset_after=30.):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self._opened = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    # whether a request may be sent now
+    def allow(self):
+        with self._lock:
+            if self._opened is None:
+                return True
+            if self._trial or time.monotonic() - self._opened < self.reset_after:
+                return False
+            self._trial = True
+            return True
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self._opened = None
+            self._trial = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.threshold:
+                self._opened = time.monotonic()
+            self._trial = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened is None:
+                return 'closed'
+            return 'half-open' if self._trial or time.monotonic() - self._opened >= self.reset_after else 'open'
+
+
+# hands out one circuit breaker per host
+class HostCircuitBreaker:
+    def __init__(self, threshold=5, reset_after=30.):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def breaker(self, host):
+        with self._lock:
+            if host not in self._breakers:
+                self._breakers[host] = CircuitBreaker(self.threshold, self.reset_after)
+            return self._breakers[host]
+
+    def __call__(self, url):
+        return self.breaker(urlparse(url).netloc)
+
+    def states(self):
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {host: b.state for host, b in breakers.items()}
+
+
+# the outcome of every page downloaded ("ok", "error" for a response that is not worth retrying like a 404, or
+# "failed" if it could not be downloaded), with how many requests it took, whether it was hedged and how long it took
+# in total, kept per host so the slowest hosts and the tail of their latencies can be told apart. the percentiles are of
+# the last LATENCY_WINDOW downloads
+class FetchOutcomes:
+    def __init__(self):
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def record(self, url, outcome, attempts, seconds, hedged=False):
+        host = urlparse(url).netloc
+        with self._lock:
+            row = self._hosts.setdefault(host, {'ok': 0, 'error': 0, 'failed': 0, 'retries': 0, 'hedged': 0, 'seconds': deque(maxlen=LATENCY_WINDOW)})
+            row[outcome] += 1
+            row['retries'] += max(attempts - 1, 0)
+            row['hedged'] += hedged
+            row['seconds'].append(seconds)
+
+    # the outcomes of each host, with the median, 95th and 99th percentile and slowest time a page took
+    def stats(self):
+        with self._lock:
+            hosts = {host: dict(row, seconds=sorted(row['seconds'])) for host, row in self._hosts.items()}
+        for row in hosts.values():
+            seconds = row.pop('seconds')
+            for name, q in [('p50_s', 0.5), ('p95_s', 0.95), ('p99_s', 0.99), ('max_s', 1.)]:
+                row[name] = seconds[min(len(seconds) - 1, int(q * len(seconds)))] if seconds else 0.
+        return hosts
+
+    def format_stats(self):
+        lines = [f"{'host':<28}{'ok':>6}{'error':>7}{'failed':>8}{'retries':>9}{'hedged':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}"]
+        for host, r in sorted(self.stats().items()):
+            lines.append(f"{host:<28}{r['ok']:>6}{r['error']:>7}{r['failed']:>8}{r['retries']:>9}{r['hedged']:>8}{r['p50_s'] * 1000:>9.0f}"
+                         f"{r['p95_s'] * 1000:>9.0f}{r['p99_s'] * 1000:>9.0f}{r['max_s'] * 1000:>9.0f}")
+        return '\n'.join(lines)
+
+    def clear(self):
+        with self._lock:
+            self._hosts.clear()
@@ -0,0 +1,321 @@
+import asyncio
+import json
+import threading
+import time
+import traceback
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from src.batch import PeerData
+from src.fetch import breakers, outcomes
+from src.makeTemplate import LazyChrome, get_dcf_inputs, get_risk_free_rate, make_financials, make_peers
+from src.montecarlo import simulate
+from src.output import collect_results, peer_tables, results_to_json, table_to_json
+from src.peers import FAN_OUT, MAX_PEERS
+from src.resilience import FetchError
+from src.trace import in_current_span
+from src.valuation import value_company
+
+# a long-running http service that values companies on demand, so a dashboard doesn't pay for starting python, importing
+# the dependencies and launching a browser on every request. the browser, the http connections of the fetcher and the
+# statements, DCF inputs and peer scrapes it has already parsed are kept between requests (the parsed data for "ttl"
+# seconds). identical requests that arrive while one is being worked on wait for its result instead of starting
+# another, and requests are turned away with a 503 once "max_pending" distinct jobs are queued or running.
+#
+#   GET /valuation/<ticker>?peers=A,B&generate_peers=1&rfr=&mrp=&terminal_growth=&forecast_years=&simulations=
+#       the results of the DCF, as written by the "json" output format (see src.output)
+#   GET /peers/<ticker>?peers=A,B&generate_peers=1    the peer table and the peer summaries
+#   GET /statements/<ticker>                          the parsed statements and the tax rate used for them
+#   GET /stats                                        latency and throughput of every endpoint, and the outcomes of the
+#                                                     pages downloaded from each host (see src.fetch.download)
+#   GET /health
+
+ENDPOINTS = ['valuation', 'peers', 'statements', 'stats', 'health']
+
+# the most recent latencies kept for each endpoint
+LATENCY_WINDOW = 1024
+
+# the largest request body read (and ignored, since only GET requests are served)
+MAX_BODY = 64 * 1024
+
+
+# values computed on demand and kept for "ttl" seconds. a key asked for by several threads at once is only computed by
+# the first one, and the others wait for its result. failures are not kept
+class TimedMemo:
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, compute):
+        with self._lock:
+            future, expires = self._values.get(key, (None, 0.))
+            owner = future is None or time.monotonic() >= expires
+            if owner:
+                # drop whatever expired, so values of tickers that are no longer asked for don't pile up
+                now = time.monotonic()
+                self._values = {k: v for k, v in self._values.items() if v[1] > now}
+                future = Future()
+                self._values[key] = (future, now + self.ttl)
+        if owner:
+            try:
+                future.set_result(compute())
+            except Exception as e:
+                future.set_exception(e)
+                with self._lock:
+                    if self._values.get(key, (None,))[0] is future:
+                        del self._values[key]
+        return future.result()
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+# the latency of every request by endpoint, and how many requests were served, failed, coalesced and turned away
+class ServiceStats:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.coalesced = 0
+        self.rejected = 0
+        self._endpoints = {}
+
+    def record(self, endpoint, seconds, status):
+        e = self._endpoints.setdefault(endpoint, {'count': 0, 'errors': 0, 'latencies': deque(maxlen=LATENCY_WINDOW)})
+        e['count'] += 1
+        e['errors'] += status >= 500
+        e['latencies'].append(seconds)
+
+    def summary(self, pending=0):
+        uptime = time.monotonic() - self.started
+        endpoints = {}
+        for name, e in self._endpoints.items():
+            latencies = sorted(e['latencies'])
+            endpoints[name] = {
+                'count': e['count'],
+                'errors': e['errors'],
+                'mean_ms': 1000 * sum(latencies) / len(latencies),
+                **{f'p{p}_ms': 1000 * latencies[min(len(latencies) - 1, len(latencies) * p // 100)] for p in [50, 95, 99]},
+            }
+        requests = sum(e['count'] for e in self._endpoints.values())
+        return {
+            'uptime_s': uptime,
+            'requests': requests,
+            'requests_per_s': requests / uptime if uptime else 0.,
+            'pending': pending,
+            'coalesced': self.coalesced,
+            'rejected': self.rejected,
+            'endpoints': endpoints,
+        }
+
+
+class BadRequest(ValueError):
+    pass
+
+
+class ValuationService:
+    def __init__(self, rfr=None, mrp=0.055, terminal_growth=0.018050372, forecast_years=5, min_tax_rate=0.2, workers=4, threads=4,
+                 max_pending=32, ttl=900, statement_backend='http', peer_fan_out=FAN_OUT, max_peers=MAX_PEERS):
+        self.rfr = rfr
+        self.mrp = mrp
+        self.terminal_growth = terminal_growth
+        self.forecast_years = forecast_years
+        self.min_tax_rate = min_tax_rate
+        self.workers = workers
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self.statement_backend = statement_backend
+        self.peer_fan_out = peer_fan_out
+        self.max_peers = max_peers
+
+        self.driver = LazyChrome()
+        self.executor = ThreadPoolExecutor(max_workers=max(1, threads), thread_name_prefix='valuation')
+        self.stats = ServiceStats()
+        self._memo = TimedMemo(ttl)
+        self._peer_data = None
+        self._peer_data_expires = 0.
+        self._peer_data_lock = threading.Lock()
+        # the jobs being worked on, by their request, so identical requests can wait for the same job
+        self._jobs = {}
+
+    # the peer scrapes shared by every request (see src.batch.PeerData), started afresh every "ttl" seconds so share
+    # prices don't go stale
+    def peer_data(self):
+        with self._peer_data_lock:
+            if self._peer_data is None or time.monotonic() >= self._peer_data_expires:
+                self._peer_data = PeerData()
+                self._peer_data_expires = time.monotonic() + self.ttl
+            return self._peer_data
+
+    def statements(self, ticker):
+        return self._memo.get(('statements', ticker), lambda: make_financials(ticker, None, self.driver, self.min_tax_rate, self.statement_backend))
+
+    def risk_free_rate(self):
+        return self.rfr if self.rfr is not None else self._memo.get(('rfr',), get_risk_free_rate)
+
+    # the peer table with the main ticker's row first, the summaries and the list of peers (see
+    # src.makeTemplate.make_peers). the table is shared by every request for the same peers, so it must not be changed
+    def peers(self, ticker, peers, generate_peers):
+        def make():
+            dfs, tax_rate = self.statements(ticker)
+            peers_ = list(peers)
+            table, summary_dfs = make_peers(ticker, peers_, tax_rate, dfs, None, 2 if generate_peers else 0, self.driver, self.workers,
+                                            self.peer_data(), self.peer_fan_out, self.max_peers)
+            return table, summary_dfs, peers_
+        return self._memo.get(('peers', ticker, tuple(peers), generate_peers), make)
+
+    def valuation(self, ticker, peers, generate_peers, rfr, mrp, terminal_growth, forecast_years, simulations):
+        dfs, tax_rate = self.statements(ticker)
+        table, summary_dfs, peers = self.peers(ticker, peers, generate_peers)
+        inputs = self._memo.get(('inputs', ticker), lambda: get_dcf_inputs(dfs, ticker))
+        valuation = value_company(inputs, table, tax_rate, rfr, mrp, terminal_growth, forecast_years)
+        if simulations:
+            total_debt, cash, shares_outstanding = (table.column(l)[0] for l in ['Total Debt', 'Cash and Equivalents', 'Shares Outstanding'])
+            valuation['simulation'] = simulate(inputs, valuation['wacc'][0], tax_rate, terminal_growth, forecast_years, total_debt, cash,
+                                               shares_outstanding, simulations)
+        return results_to_json(collect_results(ticker, peers, dfs, tax_rate, rfr, mrp, terminal_growth, forecast_years, inputs, table,
+                                               summary_dfs, valuation))
+
+    # the job that answers a request, as (key, function). requests with the same key get the same answer
+    def job(self, endpoint, ticker, query):
+        def number(name, default, kind=float):
+            try:
+                return kind(query[name][-1]) if name in query else default
+            except ValueError:
+                raise BadRequest(f'{name} must be a number')
+
+        peers = tuple(p for arg in query.get('peers', []) for p in arg.split(',') if p and p != ticker)
+        generate_peers = query.get('generate_peers', ['0'])[-1] not in ('0', 'false', '')
+        if endpoint in ('valuation', 'peers') and not peers and not generate_peers:
+            raise BadRequest('pass a list of peers (e.g. "?peers=MSFT,GOOG") or set "generate_peers=1"')
+
+        if endpoint == 'statements':
+            def statements():
+                dfs, tax_rate = self.statements(ticker)
+                return {'ticker': ticker, 'tax_rate': float(tax_rate), 'statements': {k: table_to_json(df) for k, df in dfs.items()}}
+            return ('statements', ticker), statements
+        if endpoint == 'peers':
+            def peer_table():
+                table, summary_dfs, peers_ = self.peers(ticker, peers, generate_peers)
+                tables = peer_tables(ticker, peers_, table, summary_dfs)
+                return {'ticker': ticker, 'peers': peers_, **{k: table_to_json(df) for k, df in tables.items()}}
+            return ('peers', ticker, peers, generate_peers), peer_table
+
+        rfr = number('rfr', None)
+        mrp = number('mrp', self.mrp)
+        terminal_growth = number('terminal_growth', self.terminal_growth)
+        forecast_years = number('forecast_years', self.forecast_years, int)
+        simulations = number('simulations', 0, int)
+        if not 0 < forecast_years <= 50 or not 0 <= simulations <= 1_000_000:
+            raise BadRequest('forecast_years must be between 1 and 50, and simulations between 0 and 1,000,000')
+
+        def valuation():
+            return self.valuation(ticker, peers, generate_peers, self.risk_free_rate() if rfr is None else rfr, mrp, terminal_growth, forecast_years,
+                                  simulations)
+        return ('valuation', ticker, peers, generate_peers, rfr, mrp, terminal_growth, forecast_years, simulations), valuation
+
+    # runs the job for "key" in the thread pool, or waits for the one already running. raises OverflowError if too
+    # many jobs are pending to start another
+    async def run(self, key, func):
+        task = self._jobs.get(key)
+        if task is not None:
+            self.stats.coalesced += 1
+        else:
+            if len(self._jobs) >= self.max_pending:
+                self.stats.rejected += 1
+                raise OverflowError(f'{len(self._jobs)} requests are already pending')
+            task = self._jobs[key] = asyncio.get_running_loop().run_in_executor(self.executor, in_current_span(func))
+            task.add_done_callback(lambda _: self._jobs.pop(key, None))
+        # a client that goes away must not cancel the job for the others waiting on it
+        return await asyncio.shield(task)
+
+    # answers a request, returning (status, document)
+    async def respond(self, method, target):
+        path = urlsplit(target)
+        parts = [unquote(p) for p in path.path.split('/') if p]
+        query = parse_qs(path.query)
+        if method != 'GET':
+            return HTTPStatus.METHOD_NOT_ALLOWED, {'error': 'only GET requests are served'}
+        if parts == ['health']:
+            return HTTPStatus.OK, {'status': 'ok'}
+        if parts == ['stats']:
+            return HTTPStatus.OK, dict(self.stats.summary(len(self._jobs)), fetches=outcomes.stats(), circuits=breakers.states())
+        if len(parts) != 2 or parts[0] not in ('valuation', 'peers', 'statements'):
+            return HTTPStatus.NOT_FOUND, {'error': f'no such endpoint: {path.path}'}
+
+        endpoint, ticker = parts[0], parts[1].upper()
+        try:
+            return HTTPStatus.OK, await self.run(*self.job(endpoint, ticker, query))
+        except BadRequest as e:
+            return HTTPStatus.BAD_REQUEST, {'error': str(e)}
+        except OverflowError as e:
+            return HTTPStatus.SERVICE_UNAVAILABLE, {'error': str(e)}
+        except FetchError as e:
+            # a page could not be downloaded even after retrying, which is the scraped site's fault rather than ours
+            return HTTPStatus.BAD_GATEWAY, {'error': str(e)}
+        except Exception as e:
+            print(f'Failed to answer {target}:\n{traceback.format_exc()}')
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {'error': f'{type(e).__name__}: {e}'}
+
+    async def handle(self, reader, writer):
+        try:
+            while line := await reader.readline():
+                try:
+                    method, target, version = line.decode('latin-1').split()
+                except ValueError:
+                    break
+                headers = {}
+                while (header := await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    name, _, value = header.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                # a request whose body can't be read is answered without reading it, and the connection closed since
+                # the next request can't be found after it
+                try:
+                    length = int(headers.get('content-length', 0) or 0)
+                except ValueError:
+                    length = -1
+                rejected = length < 0 or length > MAX_BODY
+                if 0 < length <= MAX_BODY:
+                    await reader.readexactly(length)
+
+                start = time.perf_counter()
+                if length < 0:
+                    status, document = HTTPStatus.BAD_REQUEST, {'error': f"invalid Content-Length: {headers['content-length']}"}
+                elif length > MAX_BODY:
+                    status, document = HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {'error': f'request bodies are limited to {MAX_BODY} bytes'}
+                else:
+                    status, document = await self.respond(method, target)
+                endpoint = urlsplit(target).path.strip('/').split('/')[0]
+                # anything else is counted together, so made-up paths can't grow the stats without bound
+                endpoint = endpoint if endpoint in ENDPOINTS else 'other'
+                self.stats.record(endpoint, time.perf_counter() - start, status)
+
+                body = json.dumps(document, default=str).encode()
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close' and not rejected
+                lines = [f'{version} {status.value} {status.phrase}', 'Content-Type: application/json', f'Content-Length: {len(body)}',
+                         f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+                if status == HTTPStatus.SERVICE_UNAVAILABLE:
+                    # tell the client when to try again, instead of letting the queue grow
+                    lines.append('Retry-After: 1')
+                writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=8750, ready=None):
+        server = await asyncio.start_server(self.handle, host, port)
+        if ready is not None:
+            ready(server.sockets[0].getsockname())
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.driver.close()
+
@@ -0,0 +1,172 @@
+import datetime as dt
+import json
+import re
+
+from src.lazy import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+bs4 = lazy_import('bs4')
+
+# the statement pages yahoo serves embed the data behind the table as json, assigned to this variable
+APP_DATA = 'root.App.main = '
+
+# labels that don't follow from splitting the camel-cased names of the embedded data
+LABELS = {
+    'ChangeInWorkingCapital': 'Change in working capital',
+    'TaxRateForCalcs': 'Tax Rate for Calcs',
+}
+
+# the order yahoo shows the line items of each statement in, with every row expanded (which is how the selenium
+# backend reads them). the embedded data lists them in no particular order
+DISPLAY_ORDER = {
+    'financials': [
+        'TotalRevenue', 'OperatingRevenue', 'CostOfRevenue', 'GrossProfit', 'OperatingExpense', 'SellingGeneralAndAdministration',
+        'GeneralAndAdministrativeExpense', 'SellingAndMarketingExpense', 'ResearchAndDevelopment', 'OtherOperatingExpenses',
+        'OperatingIncome', 'NetNonOperatingInterestIncomeExpense', 'InterestIncomeNonOperating', 'InterestExpenseNonOperating',
+        'OtherIncomeExpense', 'SpecialIncomeCharges', 'OtherNonOperatingIncomeExpenses', 'PretaxIncome', 'TaxProvision',
+        'NetIncomeCommonStockholders', 'NetIncome', 'NetIncomeIncludingNoncontrollingInterests', 'NetIncomeContinuousOperations',
+        'MinorityInterests', 'DilutedNIAvailtoComStockholders', 'BasicEPS', 'DilutedEPS', 'BasicAverageShares', 'DilutedAverageShares',
+        'TotalOperatingIncomeAsReported', 'TotalExpenses', 'NetIncomeFromContinuingAndDiscontinuedOperation', 'NormalizedIncome',
+        'InterestIncome', 'InterestExpense', 'NetInterestIncome', 'EBIT', 'EBITDA', 'ReconciledCostOfRevenue', 'ReconciledDepreciation',
+        'NetIncomeFromContinuingOperationNetMinorityInterest', 'TotalUnusualItemsExcludingGoodwill', 'TotalUnusualItems',
+        'NormalizedEBITDA', 'TaxRateForCalcs', 'TaxEffectOfUnusualItems',
+    ],
+    'balance-sheet': [
+        'TotalAssets', 'CurrentAssets', 'CashCashEquivalentsAndShortTermInvestments', 'CashAndCashEquivalents', 'OtherShortTermInvestments',
+        'Receivables', 'AccountsReceivable', 'OtherReceivables', 'Inventory', 'OtherCurrentAssets', 'TotalNonCurrentAssets', 'NetPPE',
+        'GrossPPE', 'AccumulatedDepreciation', 'GoodwillAndOtherIntangibleAssets', 'Goodwill', 'OtherIntangibleAssets',
+        'InvestmentsAndAdvances', 'OtherNonCurrentAssets', 'TotalLiabilitiesNetMinorityInterest', 'CurrentLiabilities',
+        'PayablesAndAccruedExpenses', 'AccountsPayable', 'CurrentDebtAndCapitalLeaseObligation', 'CurrentDebt', 'OtherCurrentLiabilities',
+        'TotalNonCurrentLiabilitiesNetMinorityInterest', 'LongTermDebtAndCapitalLeaseObligation', 'LongTermDebt',
+        'OtherNonCurrentLiabilities', 'TotalEquityGrossMinorityInterest', 'StockholdersEquity', 'CapitalStock', 'RetainedEarnings',
+        'GainsLossesNotAffectingRetainedEarnings', 'MinorityInterest', 'TotalCapitalization', 'CommonStockEquity', 'NetTangibleAssets',
+        'WorkingCapital', 'InvestedCapital', 'TangibleBookValue', 'TotalDebt', 'NetDebt', 'ShareIssued', 'OrdinarySharesNumber',
+    ],
+    'cash-flow': [
+        'OperatingCashFlow', 'CashFlowFromContinuingOperatingActivities', 'NetIncomeFromContinuingOperations', 'DepreciationAndAmortization',
+        'DeferredIncomeTax', 'StockBasedCompensation', 'ChangeInWorkingCapital', 'ChangeInReceivables', 'ChangeInInventory',
+        'ChangeInPayablesAndAccruedExpense', 'ChangeInOtherWorkingCapital', 'OtherNonCashItems', 'InvestingCashFlow', 'CapitalExpenditure',
+        'NetBusinessPurchaseAndSale', 'PurchaseOfBusiness', 'NetInvestmentPurchaseAndSale', 'OtherInvestingActivities', 'FinancingCashFlow',
+        'NetIssuancePaymentsOfDebt', 'IssuanceOfDebt', 'RepaymentOfDebt', 'NetCommonStockIssuance', 'CommonStockDividendPaid',
+        'OtherFinancingActivities', 'EndCashPosition', 'ChangesInCash', 'BeginningCashPosition', 'IncomeTaxPaidSupplementalData',
+        'InterestPaidSupplementalData', 'IssuanceOfCapitalStock', 'RepurchaseOfCapitalStock', 'FreeCashFlow',
+    ],
+}
+
+# the position of every line item in the table of its statement (no line item is in more than one statement)
+_display_rank = {name: i for order in DISPLAY_ORDER.values() for i, name in enumerate(order)}
+
+# line items which yahoo does not show in thousands
+UNSCALED = {'BasicEPS', 'DilutedEPS', 'TaxRateForCalcs'}
+
+_camel_boundary = re.compile(r'(?<=[a-z0-9])(?=[A-Z])|(?<=[A-Z])(?=[A-Z][a-z])')
+_small_words = re.compile(r' (In|Of|For|To|From) ')
+
+
+# raised when a page does not contain the statement data that was expected
+class StatementNotFound(Exception):
+    pass
+
+
+# turns the camel-cased name of a line item in the embedded data into the label yahoo shows in the table,
+# e.g. "NetIncomeCommonStockholders" -> "Net Income Common Stockholders"
+def to_label(name):
+    if name in LABELS:
+        return LABELS[name]
+    return _small_words.sub(lambda m: f' {m.group(1).lower()} ', _camel_boundary.sub(' ', name))
+
+
+# builds a statement frame in one go from a flat, row-major list of the values shown in the table. the values are
+# parsed into float64 in a single pass, with missing values ("-" or blank) as NaN. the line items are the index
+# and the periods are the columns (see "period_ends" for the dates they end on)
+def make_statement_frame(items, periods, values):
+    values = pd.to_numeric(pd.Series(values, dtype=object).str.replace(',', '', regex=False), errors='coerce').to_numpy(np.float64)
+    # a table with missing cells at the end is padded so its values still line up with the items
+    shape = (len(items), len(periods))
+    if values.size != shape[0] * shape[1]:
+        values = np.concatenate([values, np.full(max(shape[0] * shape[1] - values.size, 0), np.nan)])[:shape[0] * shape[1]]
+
+    return pd.DataFrame(values.reshape(shape), index=pd.Index(items, dtype=object), columns=pd.Index(periods, dtype=object))
+
+
+# the date each period of a statement frame ends on, or None for the ttm column
+def period_ends(df):
+    ends = []
+    for period in df.columns:
+        try:
+            ends.append(dt.datetime.strptime(period, '%d %B %Y').date())
+        except ValueError:
+            ends.append(None)
+    return ends
+
+
+# parses the statement table of a page rendered by a browser (with every row expanded) into a dataframe with one row
+# per line item and one column per period
+def parse_statement(html):
+    soup = bs4.BeautifulSoup(html, 'lxml')
+
+    table = soup.find('section', {'data-test': 'qsp-financial'})
+    if table is None:
+        raise StatementNotFound('The page has no financial statement table')
+
+    # the line items become the rows
+    items = [item.text for item in table.find_all('span', 'Va(m)')]
+
+    # the header cells (which have no "data-test") become the columns, and the rest of the cells are the values,
+    # read across each line item and wrapping to the next line item when all periods are filled out
+    periods, values = [], []
+    for data in table.find_all('div', 'Ta(c)'):
+        if data.has_attr('data-test'):
+            values.append(data.text.strip())
+            continue
+        try:
+            periods.append(dt.datetime.strptime(data.text, '%m/%d/%Y').strftime('%d %B %Y'))
+        except ValueError:
+            periods.append(data.text.upper().strip())
+
+    return make_statement_frame(items, periods, values)
+
+
+# reads the statement from the json embedded in the page as it is downloaded, without rendering it. the result has the
+# same layout as "parse_statement": the line items in the order the table shows them, a "TTM" column followed by the
+# annual periods (most recent first), in thousands, with NaN wherever yahoo has no value
+def parse_statement_data(html):
+    start = html.find(APP_DATA)
+    if start == -1:
+        raise StatementNotFound('The page has no embedded data')
+    try:
+        data, _ = json.JSONDecoder().raw_decode(html, start + len(APP_DATA))
+        series = data['context']['dispatcher']['stores']['QuoteTimeSeriesStore']['timeSeries']
+    except (ValueError, KeyError, TypeError) as e:
+        raise StatementNotFound(f'The embedded data has no statement: {e}')
+
+    rows = {}
+    dates = set()
+    for key, values in series.items():
+        for prefix in ('annual', 'trailing'):
+            if key.startswith(prefix) and isinstance(values, list):
+                name = key[len(prefix):]
+                scale = 1 if name in UNSCALED else 1000
+                row = rows.setdefault(name, {})
+                for v in values:
+                    if v is None or v.get('reportedValue') is None:
+                        continue
+                    period = 'TTM' if prefix == 'trailing' else v['asOfDate']
+                    row[period] = v['reportedValue']['raw'] / scale
+                    if prefix == 'annual':
+                        dates.add(v['asOfDate'])
+
+    if not rows:
+        raise StatementNotFound('The embedded data has no line items')
+
+    # the rows are put in the order of the table, with any line item it isn't known to show after the rest, in the
+    # order it was embedded in
+    names = sorted(rows, key=lambda name: _display_rank.get(name, len(_display_rank)))
+    dates = sorted(dates, reverse=True)
+    # only keep the ttm column if the page has one (the balance sheet does not)
+    periods = (['TTM'] if any('TTM' in row for row in rows.values()) else []) + dates
+    columns = [p if p == 'TTM' else dt.datetime.strptime(p, '%Y-%m-%d').strftime('%d %B %Y') for p in periods]
+
+    values = np.array([[rows[n].get(p, np.nan) for p in periods] for n in names], dtype=np.float64).reshape(len(names), len(periods))
+    return pd.DataFrame(values, index=pd.Index([to_label(n) for n in names], dtype=object), columns=pd.Index(columns, dtype=object))
@@ -0,0 +1,208 @@
+import datetime as dt
+import json
+import os
+import sqlite3
+import threading
+
+from src.cache import DEFAULT_DIR
+from src.inputs import column_from_json
+from src.lazy import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+# a local history of everything scraped about every ticker (its statements, key statistics, bond table, profile and
+# the analyst estimates of its DCF), kept by the date it was scraped on so a model can be rebuilt or compared with an
+# earlier quarter without scraping again. tables of numbers are saved as .npy files of float64, which are memory-mapped
+# when they are loaded instead of being read, while their labels and the other values are kept in an sqlite index
+
+# mapping a file costs more than reading it when it fits in a few pages, so smaller tables are read
+MMAP_MIN_BYTES = 64 * 1024
+
+# the statements kept for a ticker. its bond table is kept as "bonds", and its key statistics, profile and estimates
+# as the "peer", "summary" and "estimates" records (dicts of values)
+STATEMENTS = ['financials', 'balance-sheet', 'cash-flow']
+
+
+def today():
+    return dt.date.today().isoformat()
+
+
+# the columns of a table that can be kept as float64. dates are kept as days since 1970-01-01, durations as days and
+# columns of text are left out
+def numeric_frame(df):
+    columns = {}
+    for c in df.columns:
+        column = df[c]
+        if not (pd.api.types.is_numeric_dtype(column) or pd.api.types.is_datetime64_any_dtype(column)
+                or pd.api.types.is_timedelta64_dtype(column)):
+            try:
+                column = pd.to_numeric(column)
+            except (TypeError, ValueError):
+                continue
+        if pd.api.types.is_datetime64_any_dtype(column):
+            column = (column - pd.Timestamp('1970-01-01')) / pd.Timedelta(days=1)
+        elif pd.api.types.is_timedelta64_dtype(column):
+            column = column / pd.Timedelta(days=1)
+        columns[c] = column.to_numpy(dtype=np.float64, na_value=np.nan)
+    return pd.DataFrame(columns, index=pd.Index([str(i) for i in df.index], dtype=object))
+
+
+def _plain(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+class SnapshotStore:
+    def __init__(self, directory=os.path.join(DEFAULT_DIR, 'snapshots')):
+        self.directory = directory
+
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(directory, 'index.sqlite'), check_same_thread=False)
+        self._db.execute('CREATE TABLE IF NOT EXISTS frames (ticker TEXT, date TEXT, name TEXT, rows TEXT, columns TEXT, offset INTEGER, '
+                         'PRIMARY KEY (ticker, name, date))')
+        self._db.execute('CREATE TABLE IF NOT EXISTS records (ticker TEXT, date TEXT, name TEXT, data TEXT, PRIMARY KEY (ticker, name, date))')
+        self._db.commit()
+        # the labels of most tables are shared by many tickers, so each distinct set of labels is only built once
+        self._labels = {}
+
+    def _path(self, ticker, date, name):
+        return os.path.join(self.directory, ticker, date, name + '.npy')
+
+    # saves a table of the ticker as it was on "date" (today by default), replacing one saved earlier that day
+    def put_frame(self, ticker, name, df, date=None):
+        date = date or today()
+        path = self._path(ticker, date, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write to a temporary file first so a concurrent reader never maps a partially-written table
+        tmp = path + f'.{os.getpid()}.{threading.get_ident()}.tmp'
+        values = np.ascontiguousarray(df.to_numpy(dtype=np.float64, na_value=np.nan))
+        with open(tmp, 'wb') as f:
+            np.save(f, values)
+            # where the values start after the header, so they can be mapped without parsing it
+            offset = f.tell() - values.nbytes
+        os.replace(tmp, path)
+        with self._lock:
+            self._db.execute('INSERT OR REPLACE INTO frames VALUES (?, ?, ?, ?, ?, ?)',
+                             (ticker, date, name, json.dumps([str(i) for i in df.index]), json.dumps([str(c) for c in df.columns]), offset))
+            self._db.commit()
+
+    def put_record(self, ticker, name, record, date=None):
+        with self._lock:
+            self._db.execute('INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?)',
+                             (ticker, date or today(), name, json.dumps(record, default=_plain)))
+            self._db.commit()
+
+    def _index(self, labels):
+        index = self._labels.get(labels)
+        if index is None:
+            index = self._labels[labels] = pd.Index(json.loads(labels), dtype=object)
+        return index
+
+    # the frame backed by the saved table. it is memory-mapped (and read-only) if "mmap" is True, read if it is False,
+    # and mapped only if it is at least MMAP_MIN_BYTES if it is None
+    def _frame(self, ticker, date, name, rows, columns, offset, mmap=None):
+        index, columns = self._index(rows), self._index(columns)
+        shape = (len(index), len(columns))
+        path = self._path(ticker, date, name)
+        if mmap is None:
+            mmap = shape[0] * shape[1] * 8 >= MMAP_MIN_BYTES
+        if mmap and shape[0] and shape[1]:
+            values = np.memmap(path, dtype=np.float64, mode='r', offset=offset, shape=shape)
+        else:
+            values = np.fromfile(path, dtype=np.float64, offset=offset).reshape(shape)
+        return pd.DataFrame(values, index=index, columns=columns, copy=False)
+
+    # the table of the ticker saved on "date", or on the latest day before it. "date" may also be "latest" (or None).
+    # returns None if no such table was saved
+    def get_frame(self, ticker, name, date='latest', mmap=None):
+        return self.get_frames([ticker], name, date, mmap).get(ticker)
+
+    # the tables called "name" of many tickers at once (see "get_frame"), keyed by ticker
+    def get_frames(self, tickers, name, date='latest', mmap=None):
+        rows = self._latest('frames', 'rows, columns, offset', tickers, name, date)
+        return {t: self._frame(t, d, name, r, c, o, mmap) for t, d, r, c, o in rows}
+
+    def get_record(self, ticker, name, date='latest'):
+        return self.get_records([ticker], name, date).get(ticker)
+
+    def get_records(self, tickers, name, date='latest'):
+        return {t: json.loads(data) for t, d, data in self._latest('records', 'data', tickers, name, date)}
+
+    # the latest row of "table" for each ticker saved on or before "date"
+    def _latest(self, table, columns, tickers, name, date):
+        date = '9999-12-31' if date in (None, 'latest') else date
+        tickers = list(dict.fromkeys(tickers))
+        rows = []
+        with self._lock:
+            # sqlite limits how many values can be bound in one query
+            for i in range(0, len(tickers), 500):
+                chunk = tickers[i:i + 500]
+                rows += self._db.execute(
+                    f'SELECT ticker, MAX(date), {columns} FROM {table} WHERE name = ? AND date <= ? AND ticker IN ({", ".join("?" * len(chunk))}) '
+                    f'GROUP BY ticker', [name, date] + chunk).fetchall()
+        return rows
+
+    # the statements of the ticker as of "date" (see "get_frame"), leaving out any that were never saved
+    def get_statements(self, ticker, date='latest', mmap=None):
+        statements = {}
+        for name in STATEMENTS:
+            if (df := self.get_frame(ticker, name, date, mmap)) is not None:
+                statements[name] = df
+        return statements
+
+    # the dates anything was saved for the ticker on, oldest first
+    def dates(self, ticker):
+        with self._lock:
+            rows = self._db.execute('SELECT date FROM frames WHERE ticker = ? UNION SELECT date FROM records WHERE ticker = ? ORDER BY date',
+                                    (ticker, ticker)).fetchall()
+        return [d for (d,) in rows]
+
+    def tickers(self):
+        with self._lock:
+            rows = self._db.execute('SELECT ticker FROM frames UNION SELECT ticker FROM records ORDER BY ticker').fetchall()
+        return [t for (t,) in rows]
+
+    def stats(self):
+        with self._lock:
+            frames, = self._db.execute('SELECT COUNT(*) FROM frames').fetchone()
+            records, = self._db.execute('SELECT COUNT(*) FROM records').fetchone()
+            tickers, = self._db.execute('SELECT COUNT(*) FROM (SELECT ticker FROM frames UNION SELECT ticker FROM records)').fetchone()
+        return {'tickers': tickers, 'frames': frames, 'records': records}
+
+
+# serves the peer data saved in the store on or before "date" to "make_peers" (like src.batch.PeerData does for
+# scrapes). tickers that were never saved are scraped with the "peer" and "summary" functions instead
+class SnapshotPeerData:
+    def __init__(self, store, date, peer, summary):
+        self.store = store
+        self.date = date
+        self._peer = peer
+        self._summary = summary
+
+    def peer(self, ticker):
+        data = self.store.get_record(ticker, 'peer', self.date)
+        return data if data is not None else self._peer(ticker)
+
+    def summary(self, ticker):
+        data = self.store.get_record(ticker, 'summary', self.date)
+        return column_from_json(data) if data is not None else self._summary(ticker)
+
+
+# the store every scrape is saved to. like the page cache (see src.fetch), it is created on first use so it can be
+# replaced (or disabled by setting it to None) before anything is scraped
+_store = ...
+
+
+def get_store():
+    global _store
+    if _store is ...:
+        _store = SnapshotStore()
+    return _store
+
+
+def set_store(store):
+    global _store
+    _store = store
@@ -0,0 +1,287 @@
+import gc
+import os
+import queue
+import resource
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from src.batch import PeerData
+from src.fetch import TickerBundle
+from src.inputs import inputs_path, save_inputs
+from src.makeTemplate import LazyChrome, get_dcf_inputs, get_peer_data, get_summary, make_financials, make_peers, render_template, \
+    template_inputs, template_pages, value_template
+from src.output import output_file
+from src.peers import FAN_OUT, MAX_PEERS
+from src.store import SnapshotPeerData, get_store
+
+# makes the templates of a universe of tickers as a stream: every ticker goes through a fetch, a parse, a value and a
+# render stage, each a generator running in a thread of its own, with a bounded queue between one stage and the next.
+# a ticker's statements, peers and workbook are dropped as soon as it is rendered, so only the few tickers in the
+# queues are ever held at once and memory stays flat however many tickers are made, while the stages overlap (the
+# pages of the next ticker download while this one is valued and written)
+
+# the most peer scrapes (and as many summaries) kept for other tickers of the universe to reuse (see src.batch.PeerData)
+PEER_ENTRIES = 2000
+
+
+# the resident memory of the process in MB, or its peak where the current value can't be read
+def current_rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError):
+        return peak_rss_mb()
+
+
+# the peak resident memory of the process in MB
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+# holds tickers back from the stream while the process uses more than "limit_mb" of memory: once it does, the next
+# ticker only starts when the ones in flight are done, so a universe too big for the budget is made one ticker at a
+# time rather than running out of memory
+class MemoryBudget:
+    def __init__(self, limit_mb):
+        self.limit_mb = limit_mb
+        self.in_flight = 0
+        self.throttles = 0
+        self.throttled_seconds = 0.
+        self._condition = threading.Condition()
+
+    def admit(self):
+        with self._condition:
+            if self.in_flight and current_rss_mb() > self.limit_mb:
+                self.throttles += 1
+                start = time.perf_counter()
+                while self.in_flight:
+                    # what the tickers that are done left behind is freed before the memory is read again
+                    gc.collect()
+                    if current_rss_mb() <= self.limit_mb:
+                        break
+                    self._condition.wait(timeout=1.)
+                self.throttled_seconds += time.perf_counter() - start
+            self.in_flight += 1
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+
+_END = object()
+
+
+# runs the generator "items" in a thread of its own, keeping at most "size" of its items waiting to be taken, so a stage
+# works ahead of the next one without getting more than "size" tickers ahead. an error raised by the stage is raised
+# again where its items are taken, and the stage is closed once they stop being taken
+def _pipe(items, size, name):
+    buffer = queue.Queue(maxsize=max(1, size))
+    stop = threading.Event()
+
+    def put(entry):
+        while not stop.is_set():
+            try:
+                buffer.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not put((item, None)):
+                    return
+            put((_END, None))
+        except BaseException as e:
+            put((_END, e))
+        finally:
+            items.close()
+
+    thread = threading.Thread(target=produce, name=name, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = buffer.get()
+            if error is not None:
+                raise error
+            if item is _END:
+                return
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+
+# a ticker on its way through the stream. every stage fills in what it made, and a ticker that failed ("error" holds
+# the traceback) is passed along untouched so its result still comes out in order
+class Job:
+    __slots__ = ('ticker', 'peers', 'outfile', 'start', 'bundle', 'dfs', 'inputs', 'tax_rate', 'table', 'summary_dfs', 'valuation', 'error')
+
+    def __init__(self, ticker, peers, outfile):
+        self.ticker = ticker
+        self.peers = peers
+        self.outfile = outfile
+        self.start = time.perf_counter()
+        self.bundle = self.dfs = self.inputs = self.tax_rate = self.table = self.summary_dfs = self.valuation = self.error = None
+
+
+# the stages of the stream, sharing one browser, one pool of peer scrapes and one pool of threads for them between
+# every ticker (see "stream_templates" for the arguments)
+class TemplateStream:
+    def __init__(self, rfr, mrp, terminal_growth, forecast_years, min_tax_rate, peer_gen_depth, output_dir, workers, simulations,
+                 statement_backend, peer_fan_out, max_peers, snapshot, constant_memory, output_format, peer_data, budget):
+        self.rfr, self.mrp, self.terminal_growth, self.forecast_years = rfr, mrp, terminal_growth, forecast_years
+        self.min_tax_rate, self.peer_gen_depth, self.output_dir, self.workers = min_tax_rate, peer_gen_depth, output_dir, workers
+        self.simulations, self.statement_backend, self.peer_fan_out, self.max_peers = simulations, statement_backend, peer_fan_out, max_peers
+        self.snapshot, self.constant_memory, self.output_format = snapshot, constant_memory, output_format
+        self.store = get_store() if snapshot is not None else None
+        if peer_data is None:
+            source = SnapshotPeerData(self.store, snapshot, get_peer_data, get_summary) if self.store is not None else None
+            peer_data = PeerData(source, PEER_ENTRIES)
+        self.peer_data = peer_data
+        self.budget = budget
+        self.driver = LazyChrome()
+        self.executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='stream')
+
+    # downloads the pages of a ticker and the scrapes of its peers, while the tickers before it are parsed
+    def fetch(self, jobs):
+        for ticker, peers in jobs:
+            if self.budget is not None:
+                self.budget.admit()
+            job = Job(ticker, list(peers), os.path.join(self.output_dir, output_file(ticker, self.output_format)))
+            try:
+                if self.store is not None:
+                    job.dfs = self.store.get_statements(ticker, self.snapshot)
+                    job.inputs = self.store.get_record(ticker, 'estimates', self.snapshot)
+                pages = template_pages(ticker, self.statement_backend, job.dfs, job.inputs, self.peer_data)
+                job.bundle = TickerBundle(ticker, pages, self.workers).prefetch()
+                wait([self.executor.submit(self.peer_data.prefetch, t) for t in [ticker] + job.peers])
+                job.bundle.wait()
+            except Exception:
+                job.error = traceback.format_exc()
+                if job.bundle is not None:
+                    job.bundle.close()
+            yield job
+
+    # reads the statements, peers and DCF inputs of a ticker from the pages fetched for it
+    def parse(self, jobs):
+        for job in jobs:
+            if job.error is None:
+                job.bundle.start()
+                try:
+                    job.dfs, job.tax_rate = make_financials(job.ticker, None, self.driver, self.min_tax_rate, self.statement_backend, job.dfs)
+                    job.table, job.summary_dfs = make_peers(job.ticker, job.peers, job.tax_rate, job.dfs, None, self.peer_gen_depth, self.driver,
+                                                            self.workers, self.peer_data, self.peer_fan_out, self.max_peers)
+                    if job.inputs is None:
+                        job.inputs = get_dcf_inputs(job.dfs, job.ticker)
+                except Exception:
+                    job.error = traceback.format_exc()
+                finally:
+                    job.bundle.close()
+            job.bundle = None
+            yield job
+
+    def value(self, jobs):
+        for job in jobs:
+            if job.error is None:
+                try:
+                    job.valuation = value_template(job.inputs, job.table, job.tax_rate, self.rfr, self.mrp, self.terminal_growth,
+                                                   self.forecast_years, self.simulations)
+                except Exception:
+                    job.error = traceback.format_exc()
+            yield job
+
+    # saves a ticker's template and the inputs it was built from, and yields its result in place of the ticker, so
+    # nothing it was built from is kept past this stage
+    def render(self, jobs):
+        for job in jobs:
+            value_per_share = None
+            if job.error is None:
+                try:
+                    render_template(job.outfile, self.output_format, job.ticker, job.peers, job.dfs, job.tax_rate, self.rfr, self.mrp,
+                                    self.terminal_growth, self.forecast_years, job.inputs, job.table, job.summary_dfs, job.valuation,
+                                    self.constant_memory)
+                    save_inputs(inputs_path(job.outfile), template_inputs(
+                        job.ticker, job.peers, job.outfile, self.output_format, self.rfr, self.mrp, self.terminal_growth, self.forecast_years,
+                        self.min_tax_rate, self.simulations, job.dfs, job.inputs, job.table, job.summary_dfs))
+                    value_per_share = float(job.valuation['value_per_share'][0])
+                except Exception:
+                    job.error = traceback.format_exc()
+            result = {'ticker': job.ticker, 'outfile': job.outfile, 'value_per_share': value_per_share, 'error': job.error,
+                      'seconds': time.perf_counter() - job.start}
+            # the queues may still hold on to the ticker until the next one comes along, but not to what it was built from
+            job.dfs = job.inputs = job.table = job.summary_dfs = job.valuation = None
+            if self.budget is not None:
+                self.budget.release()
+            result['rss_mb'] = current_rss_mb()
+            yield result
+
+    def close(self):
+        self.executor.shutdown(cancel_futures=True)
+        self.driver.close()
+
+
+# makes a template for every (ticker, peers) pair in "jobs" (which can be any iterable, e.g. a file read a line at a
+# time) and yields the result of each one, in order, as soon as it is saved: its ticker, outfile, value per share (None
+# if it failed), error (the traceback if it failed), seconds from being fetched to being saved and the resident memory
+# (in MB) once it was. at most "queue_size" tickers wait between any two stages, and "budget" (a MemoryBudget) holds
+# tickers back while the process uses too much memory. the other arguments are those of src.batch.make_batch
+def stream_templates(jobs, rfr, mrp, terminal_growth, forecast_years, min_tax_rate=0.2, peer_gen_depth=0, output_dir='.', workers=4,
+                     simulations=0, statement_backend='http', peer_fan_out=FAN_OUT, max_peers=MAX_PEERS, snapshot=None, constant_memory=False,
+                     output_format='xlsx', queue_size=2, budget=None, peer_data=None):
+    os.makedirs(output_dir, exist_ok=True)
+    stream = TemplateStream(rfr, mrp, terminal_growth, forecast_years, min_tax_rate, peer_gen_depth, output_dir, workers, simulations,
+                            statement_backend, peer_fan_out, max_peers, snapshot, constant_memory, output_format, peer_data, budget)
+    results = iter(jobs)
+    try:
+        for stage in [stream.fetch, stream.parse, stream.value, stream.render]:
+            results = _pipe(stage(results), queue_size, stage.__name__)
+        yield from results
+    finally:
+        results.close()
+        stream.close()
+
+
+# makes a template for every (ticker, peers) pair in "jobs" like src.batch.make_batch, but as a stream (see
+# "stream_templates"), holding tickers back once the process uses more than "memory_budget" MB if it is set and keeping
+# at most "peer_entries" peer scrapes for the tickers after them. returns
+# the summary of make_batch, along with the peak, starting and final resident memory of the process in MB and how
+# long the memory budget held tickers back
+def make_stream(jobs, rfr, mrp, terminal_growth, forecast_years, min_tax_rate=0.2, peer_gen_depth=0, output_dir='.', workers=4, simulations=0,
+                statement_backend='http', peer_fan_out=FAN_OUT, max_peers=MAX_PEERS, snapshot=None, constant_memory=False,
+                output_format='xlsx', queue_size=2, memory_budget=None, peer_entries=PEER_ENTRIES):
+    store = get_store() if snapshot is not None else None
+    peer_data = PeerData(SnapshotPeerData(store, snapshot, get_peer_data, get_summary) if store is not None else None, peer_entries)
+    budget = MemoryBudget(memory_budget) if memory_budget is not None else None
+    done, failed, values = [], [], {}
+
+    start_rss = current_rss_mb()
+    start = time.perf_counter()
+    for result in stream_templates(jobs, rfr, mrp, terminal_growth, forecast_years, min_tax_rate, peer_gen_depth, output_dir, workers,
+                                   simulations, statement_backend, peer_fan_out, max_peers, snapshot, constant_memory, output_format,
+                                   queue_size, budget, peer_data):
+        if result['error'] is None:
+            values[result['ticker']] = result['value_per_share']
+            done.append(result['ticker'])
+        else:
+            print(f"Failed to make a DCF for {result['ticker']}:\n{result['error']}")
+            failed.append(result['ticker'])
+    elapsed = time.perf_counter() - start
+
+    return {
+        'done': done,
+        'failed': failed,
+        'values': values,
+        'seconds': elapsed,
+        'tickers_per_minute': 60 * len(done) / elapsed if elapsed else 0.,
+        'peer_fetches': peer_data.fetches,
+        'peer_fetches_avoided': peer_data.reuses - peer_data.prefetched,
+        'peak_rss_mb': peak_rss_mb(),
+        'start_rss_mb': start_rss,
+        'end_rss_mb': current_rss_mb(),
+        'throttled_seconds': budget.throttled_seconds if budget is not None else 0.,
+    }
@@ -0,0 +1,177 @@
+import contextlib
+import contextvars
+import functools
+import inspect
+import itertools
+import json
+import threading
+import time
+
+# spans time the stages of a run (fetching a page, scraping a peer, writing a sheet, ...), along with how many bytes
+# they fetched, how many of their pages came from the cache and the error they failed with, if any. a span's totals
+# include those of the spans opened inside it. nothing is recorded unless a tracer is set (see "set_tracer")
+
+_tracer = None
+_current = contextvars.ContextVar('span', default=None)
+_ids = itertools.count(1)
+# spans opened by a thread pool add their totals to a parent shared between threads
+_totals_lock = threading.Lock()
+
+
+class Span:
+    def __init__(self, name, parent, attrs):
+        self.name = name
+        self.id = next(_ids)
+        self.parent = parent
+        self.attrs = attrs
+        self.thread = threading.current_thread().name
+        self.start = time.time()
+        self.duration = 0.
+        self.children_duration = 0.
+        self.bytes = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.error = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'id': self.id,
+            'parent': self.parent.id if self.parent is not None else None,
+            'thread': self.thread,
+            'start': self.start,
+            'duration_ms': self.duration * 1000,
+            'bytes': self.bytes,
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'error': self.error,
+            **self.attrs,
+        }
+
+
+# the span handed out while tracing is off, which ignores everything
+class _NoSpan:
+    bytes = cache_hits = cache_misses = 0
+
+    def set(self, **attrs):
+        pass
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_no_span = _NoSpan()
+
+
+# collects finished spans, writing each one as a line of json to "path" if it is given
+class Tracer:
+    def __init__(self, path=None):
+        self.path = path
+        self.spans = []
+        self._lock = threading.Lock()
+        self._file = open(path, 'a', buffering=1) if path is not None else None
+
+    def record(self, span):
+        line = json.dumps(span.to_dict(), default=str) if self._file is not None else None
+        with self._lock:
+            self.spans.append(span)
+            if line is not None:
+                self._file.write(line + '\n')
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    # the spans grouped by name, with the time spent in each name's own code (not counting the spans opened inside
+    # it), the slowest first
+    def summary(self):
+        rows = {}
+        with self._lock:
+            spans = list(self.spans)
+        for s in spans:
+            row = rows.setdefault(s.name, {'name': s.name, 'count': 0, 'total_s': 0., 'self_s': 0., 'max_ms': 0., 'bytes': 0,
+                                           'cache_hits': 0, 'cache_misses': 0, 'errors': 0})
+            row['count'] += 1
+            row['total_s'] += s.duration
+            row['self_s'] += max(s.duration - s.children_duration, 0.)
+            row['max_ms'] = max(row['max_ms'], s.duration * 1000)
+            row['bytes'] += s.bytes
+            row['cache_hits'] += s.cache_hits
+            row['cache_misses'] += s.cache_misses
+            row['errors'] += s.error is not None
+        return sorted(rows.values(), key=lambda r: -r['self_s'])
+
+    def format_summary(self):
+        lines = [f"{'span':<22}{'count':>7}{'total s':>10}{'self s':>9}{'mean ms':>10}{'max ms':>10}{'KB':>10}{'cache':>12}{'errors':>8}"]
+        for r in self.summary():
+            lines.append(f"{r['name']:<22}{r['count']:>7}{r['total_s']:>10.2f}{r['self_s']:>9.2f}{r['total_s'] / r['count'] * 1000:>10.1f}"
+                         f"{r['max_ms']:>10.1f}{r['bytes'] / 1000:>10.1f}{str(r['cache_hits']) + '/' + str(r['cache_hits'] + r['cache_misses']):>12}"
+                         f"{r['errors']:>8}")
+        return '\n'.join(lines)
+
+
+def get_tracer():
+    return _tracer
+
+
+def set_tracer(tracer):
+    global _tracer
+    _tracer = tracer
+
+
+# times the code inside it as a span called "name", with "attrs" (e.g. the ticker) recorded alongside. an exception
+# raised inside it is recorded as the span's error and raised again
+@contextlib.contextmanager
+def span(name, **attrs):
+    tracer = _tracer
+    if tracer is None:
+        yield _no_span
+        return
+
+    parent = _current.get()
+    s = Span(name, parent, attrs)
+    token = _current.set(s)
+    start = time.perf_counter()
+    try:
+        yield s
+    except BaseException as e:
+        s.error = f'{type(e).__name__}: {e}'
+        raise
+    finally:
+        s.duration = time.perf_counter() - start
+        _current.reset(token)
+        if parent is not None:
+            with _totals_lock:
+                parent.children_duration += s.duration
+                parent.bytes += s.bytes
+                parent.cache_hits += s.cache_hits
+                parent.cache_misses += s.cache_misses
+        tracer.record(s)
+
+
+# wraps a function in a span named after it (or "name"), recording the values of the arguments named in "args"
+def traced(name=None, args=()):
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*a, **kw):
+            if _tracer is None:
+                return func(*a, **kw)
+            bound = signature.bind_partial(*a, **kw).arguments
+            with span(name or func.__name__, **{k: bound[k] for k in args if k in bound}):
+                return func(*a, **kw)
+        return wrapper
+    return decorator
+
+
+# makes "func" run inside the span that is open now, even when it is called from another thread (e.g. by a thread
+# pool), so the spans it opens are recorded as children of that span
+def in_current_span(func):
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.copy().run(func, *args, **kwargs)
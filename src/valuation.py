@@ -0,0 +1,216 @@
+from src.lazy import lazy_import
+from src.workbook import colnum_string
+
+np = lazy_import('numpy')
+
+# a vectorized version of the valuation done by the formulas "make_dcf" writes into the DCF sheet, so models can be
+# valued (and ranked) without opening them in Excel. every input is an array with one entry per company, or a
+# scalar shared by all companies; peer values are 2D arrays with one row per company and one column per peer,
+# where missing values (blank cells in the peers sheet) are NaN. the cell each value ends up in is noted alongside
+
+
+def _float(a):
+    return np.asarray(a, dtype=np.float64)
+
+
+# converts scraped values (which are blank strings when they could not be read) to a float array with NaN for blanks
+def to_array(values):
+    return np.array([v if isinstance(v, (int, float, np.number)) and not isinstance(v, bool) else np.nan for v in values], dtype=np.float64)
+
+
+# builds a (companies x forecast_years) matrix of growth rates, which uses the first two analyst estimates for the
+# first two years and the average growth rate for every year after (row 25)
+def growth_schedule(growth_rate_1, growth_rate_2, growth_rate_f, forecast_years):
+    g1, g2, gf = np.broadcast_arrays(_float(growth_rate_1), _float(growth_rate_2), _float(growth_rate_f))
+    growth = np.repeat(gf[..., None], forecast_years, axis=-1)
+    growth[..., 0] = g1
+    if forecast_years > 1:
+        growth[..., 1] = g2
+    return growth
+
+
+# the average, minimum and maximum of every company's peer multiples, like the "AVERAGEIF", "MINIFS" and "MAX"
+# formulas in rows 50 to 52. only positive multiples are averaged and used for the minimum. like Excel, the
+# minimum and maximum are 0 when there is nothing to take them of, while the average is NaN (#DIV/0!)
+def peer_stats(multiples):
+    multiples = np.atleast_2d(_float(multiples))
+    positive = multiples > 0
+    count = positive.sum(axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        average = np.where(positive, multiples, 0.).sum(axis=-1) / count
+    minimum = np.where(count > 0, np.where(positive, multiples, np.inf).min(axis=-1, initial=np.inf), 0.)
+    present = ~np.isnan(multiples)
+    maximum = np.where(present.any(axis=-1), np.where(present, multiples, -np.inf).max(axis=-1, initial=-np.inf), 0.)
+    return average, minimum, maximum
+
+
+# the cost of capital section of the DCF sheet (rows 3 to 6)
+def cost_of_capital(rfr, mrp, peer_unlevered_betas, tax_rate, debt_to_equity, bond_spread_10y, bond_spread_30y, market_cap, total_debt):
+    betas = np.atleast_2d(_float(peer_unlevered_betas))
+    present = ~np.isnan(betas)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # relever the average unlevered peer beta using the company's own capital structure (B6)
+        beta = np.where(present, betas, 0.).sum(axis=-1) / present.sum(axis=-1) * (1 + (1 - _float(tax_rate)) * _float(debt_to_equity))
+        cost_of_equity = _float(rfr) + _float(mrp) * beta  # B7
+        # use the 30Y spread, falling back to the 10Y spread if no 30Y bonds were found (E5)
+        spread = np.where(np.isnan(_float(bond_spread_30y)), _float(bond_spread_10y), _float(bond_spread_30y))
+        cost_of_debt = _float(rfr) + spread  # E6
+        weight_of_equity = _float(market_cap) / (_float(market_cap) + _float(total_debt))  # H4
+        weight_of_debt = _float(total_debt) / (_float(market_cap) + _float(total_debt))  # H5
+    return {
+        'beta': beta,
+        'cost_of_equity': cost_of_equity,
+        'bond_spread': spread,
+        'cost_of_debt': cost_of_debt,
+        'weight_of_equity': weight_of_equity,
+        'weight_of_debt': weight_of_debt,
+        'wacc': cost_of_equity * weight_of_equity + cost_of_debt * weight_of_debt,  # H6
+    }
+
+
+# the DCF model and its outputs (rows 25 to 44). "growth" is a (companies x forecast_years) matrix as made by
+# "growth_schedule", and "ebit_margin" may either be one margin per company or one per company and year
+def discounted_cash_flow(revenue_actual, growth, ebit_margin, tax_rate, depr_amort_pct, capex_pct, nwc_pct, wacc, terminal_growth,
+                         total_debt, cash, shares_outstanding):
+    growth = np.atleast_2d(_float(growth))
+    wacc = _float(wacc)[..., None]
+    ebit_margin = _float(ebit_margin)
+    if ebit_margin.ndim < growth.ndim:
+        ebit_margin = ebit_margin[..., None]
+
+    with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+        revenue = _float(revenue_actual)[..., None] * np.cumprod(growth + 1, axis=-1)  # row 28
+        ebit = revenue * ebit_margin  # row 29
+        tax = np.where(ebit > 0, ebit * _float(tax_rate)[..., None], 0.)  # row 30
+        nopat = ebit - tax  # row 31
+        depr_amort = revenue * _float(depr_amort_pct)[..., None]  # row 32
+        capex = revenue * _float(capex_pct)[..., None]  # row 33
+        nwc = revenue * _float(nwc_pct)[..., None]  # row 34
+        fcf = nopat + depr_amort - capex - nwc  # row 35
+        discounted_fcf = fcf / (1 + wacc) ** np.arange(1, growth.shape[-1] + 1)  # row 36
+        # the terminal value discounts the final discounted cash flow one more period (row 37)
+        terminal_value = discounted_fcf[..., -1] / (1 + wacc[..., 0]) / (wacc[..., 0] - _float(terminal_growth))
+
+        enterprise_value = discounted_fcf.sum(axis=-1) + terminal_value  # B42
+        equity_value = enterprise_value - _float(total_debt) + _float(cash)  # B43
+        value_per_share = equity_value / _float(shares_outstanding)  # B44
+
+    return {
+        'revenue': revenue,
+        'ebit': ebit,
+        'tax': tax,
+        'nopat': nopat,
+        'depr_amort': depr_amort,
+        'capex': capex,
+        'nwc': nwc,
+        'fcf': fcf,
+        'discounted_fcf': discounted_fcf,
+        'terminal_value': terminal_value,
+        'enterprise_value': enterprise_value,
+        'equity_value': equity_value,
+        'value_per_share': value_per_share,
+    }
+
+
+# the peer implied valuations per share (rows 50 to 52), as (implied, range minimum, range maximum) for each multiple.
+# as in the sheet, the P/E valuation is only shown when the average EV/Sales multiple is positive
+def implied_valuations(peer_pe, peer_ev_sales, peer_ev_ebitda, ltm_earnings, ltm_sales, ltm_ebitda, total_debt, cash, shares_outstanding):
+    pe = peer_stats(peer_pe)
+    ev_sales = peer_stats(peer_ev_sales)
+    ev_ebitda = peer_stats(peer_ev_ebitda)
+    net_cash = _float(cash) - _float(total_debt)
+    shares = _float(shares_outstanding)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return {
+            'pe': tuple(np.where(ev_sales[0] > 0, m * _float(ltm_earnings) / shares, np.nan) for m in pe),
+            'ev_sales': tuple(np.where(ev_sales[0] > 0, (net_cash + m * _float(ltm_sales)) / shares, np.nan) for m in ev_sales),
+            'ev_ebitda': tuple(np.where(ev_ebitda[0] > 0, (net_cash + m * _float(ltm_ebitda)) / shares, np.nan) for m in ev_ebitda),
+            'peer_stats': {'pe': pe, 'ev_sales': ev_sales, 'ev_ebitda': ev_ebitda},
+        }
+
+
+# values every company at once. "company" maps the labels of the peers sheet (e.g. "Market Cap", "Total Debt") to
+# one value per company, "peers" maps the peer columns that are used ("Unlevered Beta", "P/E Ratio", "EV/Sales",
+# "EV/EBITDA") to (companies x peers) matrices, and "inputs" maps the keys returned by "get_dcf_inputs" to one
+# value per company
+def value(inputs, company, peers, tax_rate, rfr, mrp, terminal_growth, forecast_years):
+    capital = cost_of_capital(rfr, mrp, peers['Unlevered Beta'], tax_rate, company['Debt/Equity'], company['Bond Spread (10Y)'],
+                              company['Bond Spread (30Y)'], company['Market Cap'], company['Total Debt'])
+    growth = growth_schedule(inputs['growth_rate_1'], inputs['growth_rate_2'], inputs['growth_rate_f'], forecast_years)
+    dcf = discounted_cash_flow(inputs['revenue_actual'], growth, inputs['ebit_margin'], tax_rate, inputs['depr_amort_pct'],
+                               inputs['capex_pct'], inputs['nwc_pct'], capital['wacc'], terminal_growth, company['Total Debt'],
+                               company['Cash and Equivalents'], company['Shares Outstanding'])
+    implied = implied_valuations(peers['P/E Ratio'], peers['EV/Sales'], peers['EV/EBITDA'], company['LTM Earnings'], company['LTM Sales'],
+                                 company['LTM EBITDA'], company['Total Debt'], company['Cash and Equivalents'], company['Shares Outstanding'])
+    return dict(capital, **dcf, growth=growth, implied=implied)
+
+
+# values a single company from its peers sheet (see src.peertable.PeerTable), whose first row is the company's own
+def value_company(inputs, table, tax_rate, rfr, mrp, terminal_growth, forecast_years):
+    labels = ['Debt/Equity', 'Bond Spread (10Y)', 'Bond Spread (30Y)', 'Market Cap', 'Total Debt', 'Cash and Equivalents',
+              'Shares Outstanding', 'LTM Earnings', 'LTM Sales', 'LTM EBITDA']
+    company = {l: table.column(l)[:1] for l in labels}
+    peers = {l: table.column(l)[None, 1:] for l in ['Unlevered Beta', 'P/E Ratio', 'EV/Sales', 'EV/EBITDA']}
+    return value({k: to_array([v]) for k, v in inputs.items()}, company, peers, tax_rate, rfr, mrp, terminal_growth, forecast_years)
+
+
+# the error a formula that can't be evaluated shows, e.g. an average of no peers or a WACC equal to the terminal growth
+DIV_ZERO = '#DIV/0!'
+
+
+# non-finite values can't be written to a sheet, so they end up as blank cells
+def _blank(a):
+    return np.where(np.isfinite(a), a, np.nan)
+
+
+def _cell(v):
+    v = float(np.asarray(v).reshape(-1)[0])
+    return v if np.isfinite(v) else DIV_ZERO
+
+
+# what every formula of the DCF sheet of a single company evaluates to, given its peers sheet, by cell (e.g. "H6"). these are written along
+# with the formulas as their cached results, which is what is shown by anything that reads the workbook without
+# recalculating it (pandas, openpyxl, file previews). unlike "value_company", this follows the sheet to the letter:
+# blank cells count as 0 where they are used in arithmetic, and formulas that fail give DIV_ZERO instead of NaN
+def sheet_values(inputs, table, tax_rate, rfr, mrp, terminal_growth, forecast_years):
+    labels = ['P/E Ratio', 'EV/Sales', 'EV/EBITDA', 'Debt/Equity', 'Bond Spread (10Y)', 'Bond Spread (30Y)', 'Market Cap', 'Total Debt',
+              'Cash and Equivalents', 'Shares Outstanding', 'LTM Earnings', 'LTM Sales', 'LTM EBITDA']
+    blank = {l: _blank(table.column(l)[:1]) for l in labels}
+    company = {l: np.nan_to_num(v, nan=0.) for l, v in blank.items()}
+    # the 30Y spread is only used when its cell isn't blank (E5)
+    company['Bond Spread (30Y)'] = blank['Bond Spread (30Y)']
+    peers = {l: _blank(table.column(l))[None, 1:] for l in ['Unlevered Beta', 'P/E Ratio', 'EV/Sales', 'EV/EBITDA']}
+    v = value({k: np.nan_to_num(_blank(to_array([i])), nan=0.) for k, i in inputs.items()}, company, peers, tax_rate, rfr, mrp,
+              terminal_growth, forecast_years)
+
+    if not np.isnan(blank['Bond Spread (30Y)'][0]):
+        spread_used = '30Y spread'
+    elif not np.isnan(blank['Bond Spread (10Y)'][0]):
+        spread_used = '10Y spread'
+    else:
+        spread_used = 'NEEDS TO BE UPDATED'
+    cells = {
+        'H4': _cell(v['weight_of_equity']), 'H5': _cell(v['weight_of_debt']), 'E5': _cell(v['bond_spread']), 'F5': spread_used,
+        'B6': _cell(v['beta']), 'E6': _cell(v['cost_of_debt']), 'H6': _cell(v['wacc']), 'B7': _cell(v['cost_of_equity']),
+        'B12': _cell(v['wacc']), 'B18': _cell(company['Total Debt']), 'B19': _cell(company['Cash and Equivalents']),
+        'B20': _cell(company['Shares Outstanding']),
+    }
+    rows = ['revenue', 'ebit', 'tax', 'nopat', 'depr_amort', 'capex', 'nwc', 'fcf', 'discounted_fcf']
+    for row, key in enumerate(rows, 28):
+        for i in range(forecast_years):
+            cells[f'{colnum_string(i + 2)}{row}'] = _cell(v[key][0, i])
+    cells[f'{colnum_string(forecast_years + 1)}37'] = _cell(v['terminal_value'])
+    cells['B42'], cells['B43'], cells['B44'] = _cell(v['enterprise_value']), _cell(v['equity_value']), _cell(v['value_per_share'])
+
+    # the peer implied valuations are blank unless the average multiple they are conditioned on is positive
+    stats = v['implied']['peer_stats']
+    for row, (multiple, label, condition) in enumerate([('pe', 'P/E Ratio', 'ev_sales'), ('ev_sales', 'EV/Sales', 'ev_sales'),
+                                                        ('ev_ebitda', 'EV/EBITDA', 'ev_ebitda')], 50):
+        cells[f'B{row}'] = _cell(company[label])
+        for col, stat in zip('CDE', stats[multiple]):
+            cells[f'{col}{row}'] = _cell(stat)
+        average = stats[condition][0][0]
+        for col, implied in zip('GHI', v['implied'][multiple]):
+            cells[f'{col}{row}'] = DIV_ZERO if np.isnan(average) else _cell(implied) if average > 0 else ''
+    return cells
@@ -0,0 +1,59 @@
+import threading
+import weakref
+
+from src.lazy import lazy_import
+
+xls = lazy_import('xlsxwriter')
+
+# a workbook can be written in "constant memory" mode, where each row of a sheet is flushed to a temporary file as
+# soon as a later row is written instead of every cell being kept until the workbook is closed. the sheets must then
+# be written one row after another, since anything written to a row that was already flushed is lost
+
+
+def open_workbook(path, constant_memory=False):
+    return xls.Workbook(path, {'constant_memory': constant_memory})
+
+
+# get the col letter from its int value
+def colnum_string(n):
+    n += 1
+    string = ""
+    while n > 0:
+        n, remainder = divmod(n - 1, 26)
+        string = chr(65 + remainder) + string
+    return string
+
+
+# the formats of every workbook, so each distinct set of format properties is only made once per workbook however many
+# sheets (or functions) ask for it. formats belong to the workbook they were made by, so a set of properties asked for
+# by several workbooks is turned into a key once and made once for each of them
+class FormatRegistry:
+    def __init__(self):
+        self._books = weakref.WeakKeyDictionary()
+        self._keys = {}
+        self._lock = threading.Lock()
+
+    def _key(self, properties):
+        key = tuple(sorted(properties.items()))
+        return self._keys.setdefault(key, key)
+
+    def get(self, book, properties):
+        key = self._key(properties)
+        with self._lock:
+            formats = self._books.setdefault(book, {})
+            format = formats.get(key)
+            if format is None:
+                format = formats[key] = book.add_format(properties)
+            return format
+
+    # how many formats were made for the workbook
+    def count(self, book):
+        with self._lock:
+            return len(self._books.get(book, {}))
+
+
+formats = FormatRegistry()
+
+
+def get_format(book, properties):
+    return formats.get(book, properties)
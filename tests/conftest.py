@@ -0,0 +1,24 @@
+import pytest
+
+import src.bonds
+import src.fetch
+import src.store
+from benchmarks.fixtures import serve
+from src.ratelimit import HostRateLimiter
+
+
+# the scrapers use arguments newer versions of beautifulsoup warn about on every call
+def pytest_configure(config):
+    config.addinivalue_line('filterwarnings', "ignore:The 'text' argument:DeprecationWarning")
+
+
+# serves the fixture pages (see benchmarks.fixtures) for the tests of a module, which scrape them without caches,
+# snapshots or rate limits
+@pytest.fixture(scope='module')
+def fixture_server():
+    with pytest.MonkeyPatch.context() as patch, serve():
+        patch.setattr(src.fetch, '_cache', None)
+        patch.setattr(src.store, '_store', None)
+        patch.setattr(src.bonds, '_index', None)
+        patch.setattr(src.fetch, 'limiter', HostRateLimiter(default_rate=(1e9, 10 ** 9)))
+        yield
@@ -0,0 +1,18 @@
+import pytest
+
+from benchmarks.fixtures import write_fixtures
+from src.batch import make_batch
+from src.stream import make_stream
+
+RFR, MRP, TERMINAL_GROWTH, FORECAST_YEARS = 0.04, 0.055, 0.018050372, 5
+
+
+# a ticker whose pages can't be found fails without stopping the others, and only the tickers that were made count
+# towards the throughput, whether they are made one after another or as a stream
+@pytest.mark.parametrize('make', [make_batch, make_stream])
+def test_failed_tickers_are_not_counted(fixture_server, tmp_path, make):
+    write_fixtures(['T000', 'T001', 'T002'])
+    jobs = [('T000', ['T001', 'T002']), ('NOPAGES', ['T001'])]
+    summary = make(jobs, RFR, MRP, TERMINAL_GROWTH, FORECAST_YEARS, output_dir=str(tmp_path), output_format='json')
+    assert summary['done'] == ['T000'] and summary['failed'] == ['NOPAGES']
+    assert summary['tickers_per_minute'] == pytest.approx(60 / summary['seconds'])
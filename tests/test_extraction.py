@@ -0,0 +1,15 @@
+from benchmarks.extraction import soup_profile, summary_frame
+from benchmarks.fixtures import profile_page, write_fixtures
+from src.makeTemplate import get_summary
+
+
+# the summary read from a profile page laid out like yahoo's is the one the BeautifulSoup reader it replaced read
+def test_summary_matches_soup_reader(fixture_server):
+    tickers = ['T000', 'T001', 'T002', 'T003']
+    write_fixtures(tickers)
+    for ticker in tickers:
+        expected = soup_profile(profile_page(ticker), summary_frame())
+        summary = get_summary(ticker)
+        assert list(summary.index) == list(expected.index)
+        assert all(summary.loc[l, 'Data'] == expected.loc[l, 'Data'] for l in ['Peer', 'Sector', 'Industry', 'Employees', 'Summary'])
+        assert summary.loc['Sector', 'Data'] and summary.loc['Employees', 'Data']
@@ -0,0 +1,158 @@
+import math
+import re
+
+import numpy as np
+import openpyxl
+import pandas as pd
+import pytest
+
+from benchmarks.fixtures import write_fixtures
+from benchmarks.formulas import FORECAST_YEARS, MIN_TAX_RATE, MRP, RFR, TERMINAL_GROWTH, peer_table, write_dcf
+from src.makeTemplate import LazyChrome, get_dcf_inputs, get_peer_data, get_summary, make_financials, make_template
+from src.valuation import DIV_ZERO, sheet_values
+
+# checks the results cached with every formula of the DCF sheet (see src.valuation.sheet_values) against an
+# evaluation of the formulas themselves, read back from the workbook, for a template made from fixture pages served
+# from a local http server and for the same company with blank spreads, peer multiples and shares outstanding
+
+REFERENCE = r"(?:(\w+)!)?\$?([A-Z]+)\$?(\d+)"
+
+
+# turns a reference to a cell or range (optionally inside ISBLANK) into a call that reads it
+def reference(match, sheet):
+    is_blank, other, column, row, last_column, last_row = match.groups()
+    other = repr(other or sheet)
+    if last_column is not None:
+        return f"RANGE({other}, '{column}{row}', '{last_column}{last_row}')"
+    # the closing parenthesis of ISBLANK is left in the formula
+    return f"BLANK({other}, '{column}{row}'" if is_blank else f"NUMBER({other}, '{column}{row}')"
+
+
+# evaluates the formulas of a workbook the way Excel does, as far as the DCF sheet needs: blank cells are 0 in
+# arithmetic and skipped by the statistics, and errors (NaN) spread to every formula that uses them
+class Evaluator:
+    def __init__(self, path):
+        self.formulas = openpyxl.load_workbook(path)
+        self.results = {}
+
+    def cell(self, sheet, name):
+        key = (sheet, name)
+        if key not in self.results:
+            value = self.formulas[sheet][name].value
+            if isinstance(value, str) and value.startswith('='):
+                value = self.evaluate(sheet, value[1:])
+            self.results[key] = value
+        return self.results[key]
+
+    def number(self, sheet, name):
+        value = self.cell(sheet, name)
+        return np.float64(0. if value is None or value == '' else value)
+
+    def range(self, sheet, first, last):
+        cells = self.formulas[sheet][f'{first}:{last}']
+        return [self.cell(sheet, c.coordinate) for row in cells for c in row]
+
+    def evaluate(self, sheet, formula):
+        formula = formula.replace('_xlfn.', '').replace('^', '**')
+        formula = re.sub(r'IF\((\$?[A-Z]+\$?\d+) > 0,', r'IF(GT(\1, 0),', formula)
+        formula = re.sub(rf'(ISBLANK\()?{REFERENCE}(?::\$?([A-Z]+)\$?(\d+))?', lambda m: reference(m, sheet), formula)
+        numbers = lambda values: [v for v in values if isinstance(v, (int, float)) and not isinstance(v, bool)]
+        functions = {
+            'NUMBER': self.number,
+            'RANGE': self.range,
+            'BLANK': lambda s, name: self.cell(s, name) in (None, ''),
+            'GT': lambda a, b: a if np.isnan(a) else a > b,
+            'IF': lambda c, a, b: c if isinstance(c, float) and np.isnan(c) else a if c else b,
+            'SUM': lambda values: np.float64(sum(numbers(values))),
+            'AVERAGE': lambda values: np.float64(np.mean(numbers(values))) if numbers(values) else np.float64('nan'),
+            'AVERAGEIF': lambda values, _, __: np.float64(np.mean(p)) if (p := [v for v in numbers(values) if v > 0]) else np.float64('nan'),
+            'MINIFS': lambda values, _, __: np.float64(min([v for v in numbers(values) if v > 0], default=0.)),
+            'MAX': lambda values: np.float64(max(numbers(values), default=0.)),
+        }
+        with np.errstate(all='ignore'):
+            return eval(formula, {'__builtins__': {}}, functions)
+
+
+# every cell of the DCF sheet whose cached result differs from what its formula evaluates to
+def mismatches(path):
+    cached = openpyxl.load_workbook(path, data_only=True)['DCF']
+    reference = Evaluator(path)
+    wrong = []
+    for row in reference.formulas['DCF'].iter_rows():
+        for c in row:
+            if not (isinstance(c.value, str) and c.value.startswith('=')):
+                continue
+            expected, got = reference.cell('DCF', c.coordinate), cached[c.coordinate].value
+            if isinstance(expected, str):
+                ok = got == expected or (expected == '' and got is None)
+            elif not np.isfinite(expected):
+                ok = got == DIV_ZERO
+            else:
+                ok = isinstance(got, (int, float)) and math.isclose(got, expected, rel_tol=1e-9, abs_tol=1e-9)
+            if not ok:
+                wrong.append((c.coordinate, c.value, expected, got))
+    return wrong
+
+
+# a template made from the fixture pages of a company and its peers, and the data it was made from
+@pytest.fixture(scope='module')
+def company(fixture_server, tmp_path_factory):
+    ticker, *peers = [f'T{i:03d}' for i in range(6)]
+    write_fixtures([ticker] + peers)
+    outfile = str(tmp_path_factory.mktemp('formulas') / f'{ticker}.xlsx')
+    valuation = make_template(ticker, peers, RFR, MRP, TERMINAL_GROWTH, FORECAST_YEARS, MIN_TAX_RATE, outfile=outfile, keep_inputs=False)
+
+    driver = LazyChrome()
+    dfs, tax_rate = make_financials(ticker, None, driver, MIN_TAX_RATE)
+    data = {t: get_peer_data(t) for t in [ticker] + peers}
+    summary_dfs = [get_summary(t) for t in [ticker] + peers]
+    driver.close()
+    return {'ticker': ticker, 'peers': peers, 'outfile': outfile, 'valuation': valuation, 'dfs': dfs, 'tax_rate': tax_rate,
+            'data': data, 'summary_dfs': summary_dfs, 'inputs': get_dcf_inputs(dfs, ticker)}
+
+
+# what a reader that doesn't recalculate (pandas) gets from the sheet is the valuation itself
+def test_template_caches_formula_results(company):
+    assert not (wrong := mismatches(company['outfile'])), wrong
+    sheet = pd.read_excel(company['outfile'], 'DCF', header=None)
+    assert math.isclose(sheet.iloc[43, 1], company['valuation']['value_per_share'][0], rel_tol=1e-12)
+    assert math.isclose(sheet.iloc[5, 7], company['valuation']['wacc'][0], rel_tol=1e-12)
+
+
+CASES = {
+    'only a 10Y spread': {'company': {'Bond Spread (30Y)': ''}},
+    'no spreads': {'company': {'Bond Spread (30Y)': '', 'Bond Spread (10Y)': ''}},
+    'no shares outstanding': {'company': {'Shares Outstanding': ''}},
+    'some peers blank': {'peer': {'Equity Beta': '', 'LTM Earnings': ''}, 'every': 2},
+    'no positive multiples': {'peer': {'LTM Sales': -1., 'LTM EBITDA': ''}},
+    'no peer betas': {'peer': {'Equity Beta': ''}},
+}
+
+
+# blank cells and formulas that fail are cached the way Excel evaluates them
+@pytest.mark.parametrize('forecast_years', [1, 5, 30])
+@pytest.mark.parametrize('case', CASES)
+def test_blank_cells_cache_formula_results(company, tmp_path, case, forecast_years):
+    table = peer_table(company['data'], company['dfs'], company['tax_rate'], **CASES[case])
+    path = str(tmp_path / 'case.xlsx')
+    write_dcf(path, company['ticker'], company['peers'], company['dfs'], company['inputs'], company['tax_rate'], table,
+              company['summary_dfs'], forecast_years)
+    assert not (wrong := mismatches(path)), wrong
+
+
+def test_sheet_values_without_spreads_or_betas(company):
+    table = peer_table(company['data'], company['dfs'], company['tax_rate'], **CASES['no spreads'])
+    values = sheet_values(company['inputs'], table, company['tax_rate'], RFR, MRP, TERMINAL_GROWTH, FORECAST_YEARS)
+    assert values['F5'] == 'NEEDS TO BE UPDATED' and values['E5'] == 0. and values['E6'] == RFR
+    table = peer_table(company['data'], company['dfs'], company['tax_rate'], **CASES['no peer betas'])
+    values = sheet_values(company['inputs'], table, company['tax_rate'], RFR, MRP, TERMINAL_GROWTH, FORECAST_YEARS)
+    assert values['B6'] == DIV_ZERO and values['B44'] == DIV_ZERO
+
+
+# without cached results, a reader that doesn't recalculate gets 0 for every formula
+def test_uncached_formulas_read_as_zero(company, tmp_path):
+    table = peer_table(company['data'], company['dfs'], company['tax_rate'])
+    path = str(tmp_path / 'uncached.xlsx')
+    write_dcf(path, company['ticker'], company['peers'], company['dfs'], company['inputs'], company['tax_rate'], table,
+              company['summary_dfs'], cached=False)
+    assert pd.read_excel(path, 'DCF', header=None).iloc[43, 1] == 0
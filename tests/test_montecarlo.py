@@ -0,0 +1,43 @@
+import math
+
+import openpyxl
+
+from src.montecarlo import make_simulation, simulate
+from src.workbook import open_workbook
+
+INPUTS = {'revenue_actual': 1e6, 'ebit_actual': 1.5e5, 'ebit_margin': 0.15, 'depr_amort_pct': 0.03, 'capex_pct': 0.04, 'nwc_pct': 0.01,
+          'growth_rate_1': 0.08, 'growth_rate_2': 0.06, 'growth_rate_f': 0.04}
+TERMINAL_GROWTH, FORECAST_YEARS = 0.018, 5
+
+
+def write(tmp_path, result):
+    path = tmp_path / 'simulation.xlsx'
+    book = open_workbook(str(path))
+    make_simulation(result, book)
+    book.close()
+    return openpyxl.load_workbook(path)['Simulation']
+
+
+def test_simulation_is_written(tmp_path):
+    result = simulate(INPUTS, 0.09, 0.21, TERMINAL_GROWTH, FORECAST_YEARS, 1e5, 1e4, 1e4, paths=2000, seed=0)
+    assert result['valid_paths'] == 2000
+    sheet = write(tmp_path, result)
+    assert math.isclose(sheet['B16'].value, result['mean'])
+
+
+# a cost of capital that couldn't be calculated (e.g. no peer had a beta) leaves no valid path, and the results that
+# are NaN are left blank instead of failing the whole template
+def test_simulation_without_valid_paths(tmp_path):
+    result = simulate(INPUTS, float('nan'), 0.21, TERMINAL_GROWTH, FORECAST_YEARS, 1e5, 1e4, 1e4, paths=2000, seed=0)
+    assert result['valid_paths'] == 0 and math.isnan(result['mean'])
+    sheet = write(tmp_path, result)
+    assert sheet['B16'].value is None and sheet['B12'].value is None
+    assert sheet['A16'].value == 'Mean' and sheet['C31'].value == 0
+
+
+# every path with a cost of capital at or below the terminal growth rate is left out
+def test_simulation_with_wacc_below_terminal_growth(tmp_path):
+    result = simulate(INPUTS, -1., 0.21, TERMINAL_GROWTH, FORECAST_YEARS, 1e5, 1e4, 1e4, paths=2000, seed=0)
+    assert result['valid_paths'] == 0
+    sheet = write(tmp_path, result)
+    assert sheet['B16'].value is None and math.isclose(sheet['B12'].value, -1.)
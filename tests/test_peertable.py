@@ -0,0 +1,23 @@
+import numpy as np
+import pytest
+
+from benchmarks.fixtures import STATEMENTS, statement_page
+from benchmarks.peertable import after, before, cells_after, cells_before, peer_data, value_after, value_before
+from src.statements import parse_statement_data
+
+
+@pytest.fixture(scope='module')
+def dfs():
+    return {s: parse_statement_data(statement_page('T0000', s)) for s in STATEMENTS}
+
+
+# the peer table writes the same cells of the peers sheet, and gives the same valuation, as the data frame per peer
+# "get_peer" used to build. the peers include some without an EBITDA, a beta or a complete key statistics page
+@pytest.mark.parametrize('peers', [1, 30])
+def test_peer_table_matches_data_frames(dfs, peers):
+    data = peer_data(peers)
+    frames, table = before(data, dfs), after(data, dfs)
+    assert cells_before(frames) == cells_after(table)
+    frames_value, table_value = value_before(frames), value_after(table)
+    for key in ['wacc', 'value_per_share', 'beta']:
+        assert np.array_equal(frames_value[key], table_value[key], equal_nan=True), key
@@ -0,0 +1,42 @@
+import socket
+
+import pytest
+
+from benchmarks.service import start
+from src.service import MAX_BODY, ValuationService
+
+
+@pytest.fixture(scope='module')
+def port():
+    service = ValuationService(0.04)
+    yield start(service)
+    service.close()
+
+
+# sends a raw request, returning the status of the response and whether the connection was left open
+def send(port, request):
+    with socket.create_connection(('127.0.0.1', port), timeout=10) as connection:
+        connection.sendall(request)
+        response = b''
+        while b'\r\n\r\n' not in response or not response.endswith(b'}'):
+            response += connection.recv(65536)
+        status = int(response.split()[1])
+        connection.sendall(b'GET /health HTTP/1.1\r\n\r\n')
+        try:
+            kept_open = bool(connection.recv(65536))
+        except ConnectionError:
+            kept_open = False
+        return status, kept_open
+
+
+def test_body_is_read_and_ignored(port):
+    assert send(port, b'GET /health HTTP/1.1\r\nContent-Length: 5\r\n\r\nhello') == (200, True)
+
+
+@pytest.mark.parametrize('length', [b'abc', b'-5', b'1.5'])
+def test_invalid_content_length(port, length):
+    assert send(port, b'GET /health HTTP/1.1\r\nContent-Length: ' + length + b'\r\n\r\n') == (400, False)
+
+
+def test_body_over_the_limit(port):
+    assert send(port, b'GET /health HTTP/1.1\r\nContent-Length: %d\r\n\r\n' % (MAX_BODY + 1)) == (413, False)
@@ -0,0 +1,83 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+import src.makeTemplate
+import src.store
+from benchmarks.fixtures import STATEMENTS, rendered_statement_page, statement_page
+from src.fetch import page_url
+from src.makeTemplate import get_statement
+from src.statements import APP_DATA, parse_statement, parse_statement_data
+
+
+# the embedded data gives the same frame as the table the selenium backend reads, rows in the same order
+@pytest.mark.parametrize('statement', STATEMENTS)
+def test_embedded_data_matches_rendered_table(statement):
+    embedded = parse_statement_data(statement_page('AAPL', statement))
+    rendered = parse_statement(rendered_statement_page('AAPL', statement))
+    assert list(embedded.index) == list(rendered.index)
+    assert list(embedded.columns) == list(rendered.columns)
+    assert np.allclose(embedded.to_numpy(), rendered.to_numpy(), equal_nan=True)
+
+
+# line items the table isn't known to show come after the rest, in the order they were embedded in
+def test_unknown_line_items_come_last():
+    value = [{'asOfDate': '2023-09-30', 'reportedValue': {'raw': 1000.}}]
+    series = {'annualSomethingNew': value, 'annualEBIT': value, 'annualAnotherThing': value, 'annualTotalRevenue': value}
+    data = {'context': {'dispatcher': {'stores': {'QuoteTimeSeriesStore': {'timeSeries': series}}}}}
+    df = parse_statement_data(f'<script>{APP_DATA}{json.dumps(data)};</script>')
+    assert list(df.index) == ['Total Revenue', 'EBIT', 'Something New', 'Another Thing']
+
+
+# a browser that renders the fixture pages, slowly enough that two threads using it at once would read each other's
+# page, and that counts how many threads use it at once
+class FakeDriver:
+    def __init__(self, pages):
+        self.pages = pages
+        self.url = None
+        self.users = 0
+        self.most_users = 0
+        self.lock = threading.Lock()
+
+    def get(self, url):
+        with self.lock:
+            self.users += 1
+            self.most_users = max(self.most_users, self.users)
+        self.url = url
+        time.sleep(0.05)
+
+    def find_element(self, by, value):
+        return self
+
+    def is_displayed(self):
+        return True
+
+    def is_enabled(self):
+        return True
+
+    def click(self):
+        time.sleep(0.05)
+
+    def execute_script(self, script):
+        page = self.pages[self.url]
+        with self.lock:
+            self.users -= 1
+        return page
+
+
+# statements that fall back to the browser in several threads at once render one page at a time, each reading its own
+def test_concurrent_renders_take_turns(monkeypatch):
+    jobs = [('T000', 'financials'), ('T001', 'balance-sheet'), ('T002', 'cash-flow'), ('T003', 'financials')]
+    driver = FakeDriver({page_url(t, s): rendered_statement_page(t, s) for t, s in jobs})
+    # no page has embedded data, so every statement is rendered
+    monkeypatch.setattr(src.makeTemplate, 'fetch', lambda url, page_type, render=None: render(url) if render else '<html></html>')
+    monkeypatch.setattr(src.store, '_store', None)
+    with ThreadPoolExecutor(len(jobs)) as executor:
+        frames = list(executor.map(lambda job: get_statement(*job, driver), jobs))
+    assert driver.most_users == 1
+    for (ticker, statement), df in zip(jobs, frames):
+        assert df.equals(parse_statement(rendered_statement_page(ticker, statement)))
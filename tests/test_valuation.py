@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from benchmarks.valuation import random_universe
+from src.valuation import value
+
+TAX_RATE, RFR, MRP, TERMINAL_GROWTH = 0.21, 0.04, 0.055, 0.018050372
+
+
+# a direct, one-company-at-a-time transcription of the formulas "make_dcf" writes into the DCF sheet, which the
+# vectorized engine is checked against. cell references are given alongside each formula
+def reference_value(inputs, company, peers, tax_rate, rfr, mrp, terminal_growth, forecast_years):
+    betas = [b for b in peers['Unlevered Beta'] if not np.isnan(b)]
+    beta = sum(betas) / len(betas) * (1 + (1 - tax_rate) * company['Debt/Equity'])  # =AVERAGE(Peers!$W$5:$W$n) * (1 + (1-$B$14) * Peers!$K$4)
+    cost_of_equity = rfr + mrp * beta  # =B4+B5*B6
+    spread = company['Bond Spread (10Y)'] if np.isnan(company['Bond Spread (30Y)']) else company['Bond Spread (30Y)']  # =IF(ISBLANK(Peers!$N$4), Peers!$M$4, Peers!$N$4)
+    cost_of_debt = rfr + spread  # =E4+E5
+    weight_of_equity = company['Market Cap'] / (company['Market Cap'] + company['Total Debt'])  # =Peers!$F$4/(Peers!$F$4 + Peers!$G$4)
+    weight_of_debt = company['Total Debt'] / (company['Market Cap'] + company['Total Debt'])  # =Peers!$G$4/(Peers!$F$4 + Peers!$G$4)
+    wacc = cost_of_equity * weight_of_equity + cost_of_debt * weight_of_debt  # =B7 * H4 + E6 * H5
+
+    revenue = inputs['revenue_actual']
+    discounted = []
+    for i in range(forecast_years):
+        growth = inputs['growth_rate_1'] if i == 0 else (inputs['growth_rate_2'] if i == 1 else inputs['growth_rate_f'])
+        revenue = revenue * (growth + 1)  # ={p}28 * ({c}25 + 1)
+        ebit = revenue * inputs['ebit_margin']  # ={c}28 * {c}26
+        tax = ebit * tax_rate if ebit > 0 else 0  # =IF({c}29 > 0, {c}29 * $B$14, 0)
+        nopat = ebit - tax  # ={c}29 - {c}30
+        fcf = nopat + revenue * inputs['depr_amort_pct'] - revenue * inputs['capex_pct'] - revenue * inputs['nwc_pct']  # ={c}31 + {c}32 - {c}33 - {c}34
+        discounted.append(fcf / ((1 + wacc) ** (i + 1)))  # ={c}35 / ((1+$B$12) ^ {i + 1})
+    terminal_value = discounted[-1] / (1 + wacc) / (wacc - terminal_growth)  # ={last}36 / (1+$B$12) / ($B$12 - $B$13)
+
+    enterprise_value = sum(discounted) + terminal_value  # =SUM($C$36:${last}$37)
+    equity_value = enterprise_value - company['Total Debt'] + company['Cash and Equivalents']  # =$B$42 - $B$18 + $B$19
+    return {'wacc': wacc, 'enterprise_value': enterprise_value, 'value_per_share': equity_value / company['Shares Outstanding']}  # =$B$43 / $B$20
+
+
+# the vectorized engine values every company like the sheet's formulas would
+@pytest.mark.parametrize('forecast_years', [1, 5, 30])
+def test_value_matches_sheet_formulas(forecast_years):
+    inputs, company, peers = random_universe(300, 20)
+    result = value(inputs, company, peers, TAX_RATE, RFR, MRP, TERMINAL_GROWTH, forecast_years)
+    for i in range(300):
+        expected = reference_value({k: v[i] for k, v in inputs.items()}, {k: v[i] for k, v in company.items()},
+                                   {k: v[i] for k, v in peers.items()}, TAX_RATE, RFR, MRP, TERMINAL_GROWTH, forecast_years)
+        for key, v in expected.items():
+            assert np.isclose(result[key][i], v, rtol=1e-12, equal_nan=True), (i, key, result[key][i], v)